@@ -1,15 +1,49 @@
 import pygame
+import argparse
 import sys
 import random
-
-# Initialize Pygame
-pygame.init()
+import time
+import numpy as np
+import game_engine
+import mapgen
+import save_game
+from asset_loader import AssetLoader
+from asset_manager import AssetManager
+from asset_requests import AssetRequestQueue
+from atlas import SpriteAtlas, choose_tier
+from audio import AudioManager
+from frame_cache import FrameCache
+from pacing import FramePacer
+from dirty_rects import DirtyRectRenderer
+from generate_image import HTTPImageClient, OpenAIImageClient
+from tilemap import Camera, Tilemap
+from text_cache import TextRenderer, ValueText
+from profiler import FrameProfiler
+from replay import InputRecorder, InputReplay
 
 # Constants
 WINDOW_SIZE = 600  # Window size (600x600 pixels)
-GRID_SIZE = 32     # Grid is 32x32
+GRID_SIZE = game_engine.GRID_SIZE  # Grid is 32x32
 CELL_SIZE = WINDOW_SIZE // GRID_SIZE  # Size of each cell
 FPS = 60           # Frames per second
+TICK_RATE = 60     # Simulation ticks per second (all animation speeds are per tick)
+FIXED_TIMESTEP = True  # Simulate at TICK_RATE whatever the render rate (or pass --no-fixed-step)
+MAX_TICKS_PER_FRAME = 8  # Catch-up limit; time beyond it is dropped instead of spiraling
+MAX_FRAME_SKIP = 4  # Most renders in a row skipped while the simulation catches up
+ADAPTIVE_PACING = True  # Drop to IDLE_FPS while nothing happens (or pass --no-adaptive-pacing)
+IDLE_FPS = 10      # Frame rate of a static scene; input still wakes the loop at once
+IDLE_DELAY = 0.5   # Seconds without input, game events or shakes before going idle
+PERCEPTIBLE_PIXELS = 3  # Idle frames are only redrawn once an animated sprite's size changed by this much
+ENEMY_MOVE_INTERVAL = 20  # Ticks between two chase steps of the enemies
+DIRTY_RECT_RENDERING = True  # Overworld only repaints the regions that changed
+PROFILE = False    # Time every phase of the main loop and show an overlay (or pass --profile)
+DISPLAY_SCALE = 1.0  # Physical pixels per window pixel (2.0 on a HiDPI display); picks the sprite tier
+BATTLE_SPRITE_SIZE = 150  # Size of a 2x2 sprite on the battle screen
+SAVE_FILE = r"./savegame.sav"
+AUTOSAVE_INTERVAL = 60  # Seconds between two autosaves
+IMAGE_WORKERS = 2  # Threads generating sprite and background variants
+ASSET_BUDGET_MB = 64  # Memory for decoded images; least recently used backgrounds are dropped beyond it
+PREFETCH_DISTANCE = 4  # Battle backgrounds start loading when an enemy is this many cells away
 
 # Colors (Corrected Definitions)
 WHITE = (255, 255, 255)
@@ -18,12 +52,20 @@ BROWN = (139, 69, 19)          # Correct RGB for brown
 YELLOW = (255, 255, 0)
 GREY = (211, 211, 211)          # Correct RGB for light grey
 
-# Enemy data
-ENEMY_TYPES = {
-    "common": {"health": 10, "attack": 2, "xp": 5},
-    "tough": {"health": 20, "attack": 4, "xp": 10},
-    "elite": {"health": 30, "attack": 6, "xp": 20},
-    "boss": {"health": 50, "attack": 10, "xp": 100}
+# Enemy data (the rules live in game_engine)
+ENEMY_TYPES = game_engine.ENEMY_TYPES
+
+# Prompts for generated variants (G: a new look for the enemy in battle, B: for the current background)
+ENEMY_PROMPTS = {
+    "common": "a small green goblin, pixel art game sprite, plain background",
+    "tough": "an armored skeleton warrior, pixel art game sprite, plain background",
+    "elite": "a crocodile king with a crown, pixel art game sprite, plain background",
+    "boss": "a huge fire-breathing dragon, pixel art game sprite, plain background"
+}
+BACKGROUND_PROMPTS = {
+    "overworld": "top-down fantasy overworld map with grass and paths, pixel art",
+    "battle": "a forest clearing battle background, pixel art",
+    "boss": "a mountain peak battle background at dusk, pixel art"
 }
 
 # Animation variables for player (Overworld and Battle)
@@ -34,187 +76,298 @@ player_animation_speed = 0.005     # Slower animation speed
 player_scale_min = 0.95           # Minimum scale factor
 player_scale_max = 1.05           # Maximum scale factor
 
-# Enemy Animation Variables
-enemy_animation_scales = {}       # Scale factors for each enemy type
-enemy_animation_directions = {}   # Directions for each enemy type's animation
-enemy_shake_flags = {}            # Flags to indicate if an enemy is shaking
-enemy_shake_counters = {}         # Counters to manage shake duration
-
-# Initialize enemy animation variables
-for etype in ENEMY_TYPES.keys():
-    enemy_animation_scales[etype] = 1.0
-    enemy_animation_directions[etype] = 1
-    enemy_shake_flags[etype] = False
-    enemy_shake_counters[etype] = 0
-
-# Set up the display
-screen = pygame.display.set_mode((WINDOW_SIZE, WINDOW_SIZE))
-pygame.display.set_caption("Chase Game with Battle Transition")
-
-# Music setup
-pygame.mixer.init()
+# Enemy animations (scale, direction and shake) are per enemy, in the columns of state.enemies
+ENEMY_SHAKE_TICKS = 30  # How long an enemy shakes after a hit
+
+# Animation values as of the previous tick; rendering interpolates from them
+previous_player_overworld_scale = player_overworld_scale
+previous_player_battle_scale = player_battle_scale
+previous_player_position = None  # Drawn player position (cells), None until the first tick of a game
+render_alpha = 1.0  # How far rendering is between the previous and the current tick
+
+# Music tracks
 overworld_music = r"./sound/Main game.mp3"
 battle_music = r"./sound/Main battle.mp3"
 final_boss_music = r"./sound/Battle music.mp3"
-current_music = None
-
-def play_music(track):
-    """
-    Plays the specified music track if it's not already playing.
-    """
-    global current_music
-    if current_music != track:
-        try:
-            pygame.mixer.music.load(track)
-            pygame.mixer.music.play(-1)  # -1 means loop indefinitely
-            current_music = track
-        except pygame.error as e:
-            print(f"Error loading music file {track}: {e}")
-
-play_music(overworld_music)  # Start with overworld music
+hit_sound = r"./sound/Hit.wav"
+audio = None  # AudioManager, created by init_game()
 
-# Sprite position (grid coordinates)
-sprite_x, sprite_y = 0, 0
-
-# Player Direction
-facing_right = True  # Initially facing right
+# Game state (see game_engine.GameState), created by main()
+state = None
+player_action = None
 
-# Walls
-walls = set()
+# Display and assets, created by init_game()
+screen = None
+asset_loader = None
+assets = None  # AssetManager holding the backgrounds and sprite atlases, created by init_game()
+background_image = None
+player_image_original = None
+enemy_images_original = {}
+enemy_images = {}
+battle_player_image = None
+battle_enemy_images = {}
+frame_cache = None
+asset_requests = None  # AssetRequestQueue, created by main()
+variant_counts = {}    # Variants requested so far per sprite or background, so every request is a new image
+tilemap = None
+camera = None
+overworld_renderer = None
+
+# Text rendering, created by init_game()
+text_renderer = None
+player_health_text = None
+enemy_health_text = None
+player_mana_text = None
+
+# Per-phase frame timings, replaced by main() when profiling is on
+profiler = FrameProfiler(enabled=False)
+
+# Adaptive frame rate, created by main() (None renders every frame at FPS)
+pacer = None
+
+# Key bindings
+BATTLE_KEYS = {
+    pygame.K_SPACE: game_engine.BASIC_ATTACK,
+    pygame.K_s: game_engine.SPECIAL_ATTACK,
+    pygame.K_r: game_engine.RUN_AWAY,
+    pygame.K_d: game_engine.DEFEND,
+    pygame.K_i: game_engine.USE_ITEM
+}
+SAVE_KEY = pygame.K_F5
+LOAD_KEY = pygame.K_F9
+ENEMY_VARIANT_KEY = pygame.K_g
+BACKGROUND_VARIANT_KEY = pygame.K_b
+OVERWORLD_KEYS = {
+    pygame.K_UP: game_engine.UP,
+    pygame.K_DOWN: game_engine.DOWN,
+    pygame.K_LEFT: game_engine.LEFT,
+    pygame.K_RIGHT: game_engine.RIGHT
+}
 
-def spawn_box_at(x, y):
+def play_music(track):
     """
-    Adds a wall at the specified grid coordinates.
+    Switches to the specified music track if it's not already playing.
+    The switch never blocks: the track is decoded in the background and crossfaded in.
     """
-    walls.add((x, y))
-
-# Add grouped walls manually
-wall_groups = [
-    (range(10, 13), range(4, 7)),
-    (range(23, 27), range(11, 15)),
-    (range(20, 24), range(16, 20)),
-    (range(16, 19), range(18, 21)),
-    (range(10, 14), range(21, 24)),
-    (range(9, 12), range(29, 32)),
-    (range(20, 23), range(28, 32)),
-    (range(18, 20), range(0, 8)),
-    (range(20, 27), range(7, 9)),
-    (range(29, 33), range(7, 9)),
-    (range(1, 5), range(21, 24))
-]
-
-for wx_range, wy_range in wall_groups:
-    for wx in wx_range:
-        for wy in wy_range:
-            spawn_box_at(wx, wy)
+    audio.play_music(track)
 
 # Load and resize images
 def load_and_resize_image(path, width, height):
     """
     Loads an image from the specified path and resizes it to (width, height).
+    Images are read straight from the zip archives, see AssetLoader.
     """
     try:
-        image = pygame.image.load(path).convert_alpha()
-        return pygame.transform.scale(image, (width, height))
-    except pygame.error as e:
+        return asset_loader.load_image(path, width, height)
+    except (pygame.error, OSError) as e:
         print(f"Error loading image {path}: {e}")
         sys.exit()
 
-background_image = load_and_resize_image(r"./images/Overworldmap.png", WINDOW_SIZE, WINDOW_SIZE)
-fight_background_image = load_and_resize_image(r"./images/Forest background.png", WINDOW_SIZE, WINDOW_SIZE)
-final_boss_background_image = load_and_resize_image(r"./images/Mountain background.png", WINDOW_SIZE, WINDOW_SIZE)
-player_image_original = load_and_resize_image(r"./images/mainguy.png", CELL_SIZE * 2, CELL_SIZE * 2)
-enemy_images_original = {
-    "common": load_and_resize_image(r"./images/Gobby-4.png", CELL_SIZE * 2, CELL_SIZE * 2),
-    "tough": load_and_resize_image(r"./images/Skelly-2.png", CELL_SIZE * 2, CELL_SIZE * 2),
-    "elite": load_and_resize_image(r"./images/KING CROC-2.png", CELL_SIZE * 2, CELL_SIZE * 2),
-    "boss": load_and_resize_image(r"./images/Dragon #2-2.png", CELL_SIZE * 4, CELL_SIZE * 4)
-}
+def init_game(asset_budget=ASSET_BUDGET_MB * 1_000_000):
+    """
+    Opens the window, starts the music and loads every image.
+    Expects the game state to exist already, since its walls get baked into the background.
+    """
+    global screen, audio, asset_loader, assets, background_image
+    global player_image_original, enemy_images_original, enemy_images, battle_player_image, battle_enemy_images
+    global frame_cache
+    global text_renderer, player_health_text, enemy_health_text, player_mana_text
+
+    # Initialize Pygame
+    pygame.init()
+
+    # Set up the display
+    screen = pygame.display.set_mode((WINDOW_SIZE, WINDOW_SIZE))
+    pygame.display.set_caption("Chase Game with Battle Transition")
+
+    # Music setup: decode every track up front on a worker thread
+    pygame.mixer.init()
+    audio = AudioManager()
+    audio.preload(overworld_music, battle_music, final_boss_music)
+    audio.load_effect("hit", hit_sound)
+    play_music(overworld_music)  # Start with overworld music
+
+    # Images come straight out of images.zip, with scaled pixels cached on disk
+    asset_loader = AssetLoader()
+    assets = AssetManager(asset_budget)
+    background_image = load_and_resize_image(r"./images/Overworldmap.png", WINDOW_SIZE, WINDOW_SIZE)
+    assets.add("overworld_background", background_image, pinned=True)  # Baked into the map chunks
+
+    # Battle backgrounds are only needed near enemies, so they can be dropped and loaded again in the background
+    assets.register("battle_background", lambda: asset_loader.load_image(
+        r"./images/Forest background.png", WINDOW_SIZE, WINDOW_SIZE, converted=False))
+    assets.register("boss_background", lambda: asset_loader.load_image(
+        r"./images/Mountain background.png", WINDOW_SIZE, WINDOW_SIZE, converted=False))
+    assets.prefetch("battle_background")
+    assets.prefetch("boss_background")
+
+    # Sprites are subsurfaces of one atlas per resolution tier, the lowest one sharp enough (see choose_tier)
+    overworld_atlas = SpriteAtlas(choose_tier(CELL_SIZE * 2, DISPLAY_SCALE), asset_loader)
+    battle_atlas = SpriteAtlas(choose_tier(BATTLE_SPRITE_SIZE, DISPLAY_SCALE), asset_loader)
+    player_image_original = overworld_atlas.sprite("player")
+    enemy_images_original = {etype: overworld_atlas.sprite(etype) for etype in ENEMY_TYPES}
+    battle_player_image = battle_atlas.sprite("player")
+    battle_enemy_images = {etype: battle_atlas.sprite(etype) for etype in ENEMY_TYPES}
+    assets.add("overworld_sprites", overworld_atlas.image, pinned=True)
+    assets.add("battle_sprites", battle_atlas.image, pinned=True)
+
+    # Animation frames are scaled straight from the atlas by the frame cache
+    enemy_images = dict(enemy_images_original)
+
+    # Cache of pre-scaled/pre-flipped animation frames, so drawing is a lookup instead of a resample
+    frame_cache = FrameCache()
+
+    build_map()
+
+    # Fonts are loaded once and text is only rendered again when it changes
+    text_renderer = TextRenderer()
+    player_health_text = ValueText(text_renderer, "HP: {}/{}", 30, BLACK)
+    enemy_health_text = ValueText(text_renderer, "Enemy HP: {}", 30, BLACK)
+    player_mana_text = ValueText(text_renderer, "Mana: {}/{}", 30, BLACK)
+
+def build_map():
+    """
+    Bakes the walls of the current state into the map and sets up the camera.
+    """
+    global tilemap, camera, overworld_renderer
 
-# Pre-scale enemy images for performance
-enemy_images = {}
-for etype, img in enemy_images_original.items():
-    enemy_images[etype] = img
-
-player_image = player_image_original  # Keep original for scaling
-
-# Initialize enemies list
-enemies = []
-
-# Common enemies: 1-14 tiles to the right, 16-18 tiles down
-for _ in range(4):
-    ex, ey = random.randint(1, 14), random.randint(16, 18)
-    if (ex, ey) not in walls:
-        enemies.append({"type": "common", "x": ex, "y": ey, "health": ENEMY_TYPES["common"]["health"]})
-
-# Tough enemies: 6-17 tiles from the left, 24-27 tiles down (since GRID_SIZE - 8 = 24)
-for _ in range(3):
-    ex, ey = random.randint(6, 16), random.randint(GRID_SIZE - 8, GRID_SIZE - 5)
-    if (ex, ey) not in walls:
-        enemies.append({"type": "tough", "x": ex, "y": ey, "health": ENEMY_TYPES["tough"]["health"]})
-
-# Elite enemies: 28-31 tiles from the left (assuming GRID_SIZE=32, so positions 28-31), 10-21 tiles up from bottom
-for _ in range(2):
-    ex = random.randint(GRID_SIZE - 4, GRID_SIZE - 1)
-    ey = random.randint(GRID_SIZE - 22, GRID_SIZE - 11)
-    if (ex, ey) not in walls:
-        enemies.append({"type": "elite", "x": ex, "y": ey, "health": ENEMY_TYPES["elite"]["health"]})
-
-# Boss enemy: 26 tiles to the right, 3 tiles down
-enemies.append({"type": "boss", "x": 26, "y": 3, "health": ENEMY_TYPES["boss"]["health"]})
-
-# Battle variables
-player_health = 20
-player_max_health = 20
-player_damage = 3
-player_mana = 10
-player_max_mana = 10
-player_xp = 0
-xp_needed = 5
-player_level = 1
-battle_mode = False
-player_action = None
-current_enemy = None
-mana_warning = False
+    # Create a semi-transparent wall surface
+    wall_surface = pygame.Surface((CELL_SIZE, CELL_SIZE), pygame.SRCALPHA)
+    wall_alpha = 0  # 0 (fully transparent) to 255 (fully opaque)
+    wall_color = BROWN + (wall_alpha,)  # Adding alpha to the color
+    wall_surface.fill(wall_color)
+
+    # Bake the ground and the walls into map chunks, since neither ever changes
+    tilemap = Tilemap(state.grid_size, state.grid_size, CELL_SIZE, background_image, state.walls, wall_surface)
+    camera = Camera(WINDOW_SIZE, WINDOW_SIZE, tilemap.width, tilemap.height)
+
+    # Restores only the regions covered by sprites instead of repainting the whole map
+    overworld_renderer = DirtyRectRenderer(screen, draw_map)
+
+def load_game(path):
+    """
+    Replaces the running game with a saved one. A missing or broken save is reported and ignored.
+    """
+    global state, previous_player_position
+    try:
+        state = save_game.load(path)
+    except (OSError, ValueError) as e:
+        print(f"Could not load {path}: {e}")
+        return
+    previous_player_position = None
+    build_map()
+    if not state.battle_mode:
+        play_music(overworld_music)
+    elif state.enemies.type_name(state.current_enemy) == "boss":
+        play_music(final_boss_music)
+    else:
+        play_music(battle_music)
+
+def variant_prompt(name, prompt):
+    """
+    Numbers the requests for a name, so each one is a new image rather than a cache hit.
+    """
+    variant_counts[name] = variant_counts.get(name, 0) + 1
+    return f"{prompt}, variant {variant_counts[name]}"
+
+def request_enemy_variant(enemy_type):
+    """
+    Asks for a new look for an enemy type without waiting for it.
+    A placeholder stands in for the type until the image arrives.
+    """
+    footprint = game_engine.enemy_size(enemy_type) * CELL_SIZE
+    battle_size = BATTLE_SPRITE_SIZE if enemy_type != "boss" else BATTLE_SPRITE_SIZE * 2
+    previous = enemy_images[enemy_type], battle_enemy_images[enemy_type]
+
+    def swap(overworld_image, battle_image):
+        enemy_images[enemy_type] = overworld_image
+        battle_enemy_images[enemy_type] = battle_image
+        assets.add(("variant", enemy_type), overworld_image)
+        assets.add(("variant", "battle", enemy_type), battle_image)
+        frame_cache.invalidate(enemy_type)
+        frame_cache.invalidate(("battle", enemy_type))
+
+    prompt = variant_prompt(enemy_type, ENEMY_PROMPTS[enemy_type])
+    if asset_requests.request(("enemy", enemy_type), prompt, [(footprint, footprint), (battle_size, battle_size)],
+                              lambda surfaces: swap(*surfaces), lambda error: swap(*previous)):
+        swap(asset_requests.placeholder(footprint, footprint), asset_requests.placeholder(battle_size, battle_size))
+
+def request_background_variant(scene):
+    """
+    Asks for a new background for "overworld", "battle" or "boss" without waiting for it.
+    The current background stays up until the new one arrives.
+    """
+    def swap(surfaces):
+        global background_image
+        # A generated background can't be loaded again, so it stays resident
+        assets.add(f"{scene}_background", surfaces[0], pinned=True)
+        if scene == "overworld":
+            # The ground is baked into the map chunks
+            background_image = surfaces[0]
+            build_map()
+
+    asset_requests.request(("background", scene), variant_prompt(scene, BACKGROUND_PROMPTS[scene]),
+                           [(WINDOW_SIZE, WINDOW_SIZE)], swap)
+
+def update_assets():
+    """
+    Makes finished background loads resident, and on the overworld starts
+    loading the battle background of any enemy close enough to start a battle soon.
+    """
+    assets.update()
+    if state.battle_mode:
+        return
+    enemies = state.enemies
+    # Gap in cells between the player's footprint and each enemy's, per axis
+    gap_x = np.maximum(np.maximum(enemies.x - (state.sprite_x + game_engine.PLAYER_SIZE),
+                                  state.sprite_x - (enemies.x + enemies.size)), 0)
+    gap_y = np.maximum(np.maximum(enemies.y - (state.sprite_y + game_engine.PLAYER_SIZE),
+                                  state.sprite_y - (enemies.y + enemies.size)), 0)
+    near = enemies.type_id[np.maximum(gap_x, gap_y) <= PREFETCH_DISTANCE]
+    if len(near):
+        is_boss = near == enemies.type_ids["boss"]
+        if is_boss.any():
+            assets.prefetch("boss_background")
+        if not is_boss.all():
+            assets.prefetch("battle_background")
+
+def draw_map(area=None):
+    """
+    Draws the baked map chunks seen by the camera (only over area, if given).
+    """
+    tilemap.draw(screen, camera, area)
 
 def draw_xp_bar():
     """
-    Draws the XP bar on the overworld screen.
+    Draws the XP bar on the overworld screen and returns the rect it covers.
     """
     bar_width = 200
     bar_height = 20
     x = 100
     y = 10
     pygame.draw.rect(screen, YELLOW, (x, y, bar_width, bar_height), 2)  # Yellow outline
-    filled_width = int(bar_width * (player_xp / xp_needed))
+    filled_width = int(bar_width * (state.player_xp / state.xp_needed))
     pygame.draw.rect(screen, YELLOW, (x, y, filled_width, bar_height))
+    return pygame.Rect(x, y, bar_width, bar_height)
 
 def draw_battle_screen():
     """
     Draws the battle screen with player and enemy stats, including animations.
     """
-    global mana_warning
-
-    # Play appropriate music and set background
-    if current_enemy["type"] == "boss":
-        play_music(final_boss_music)
-        screen.blit(final_boss_background_image, (0, 0))
+    enemies = state.enemies
+    current_enemy = state.current_enemy
+    enemy_type = enemies.type_name(current_enemy)
+
+    # Set background (loaded on the spot if it was evicted and no prefetch brought it back)
+    background = assets.get("boss_background" if enemy_type == "boss" else "battle_background")
+    if background is not None:
+        screen.blit(background, (0, 0))
     else:
-        play_music(battle_music)
-        screen.blit(fight_background_image, (0, 0))
-
-    # Animate Player in Battle
-    global player_battle_scale, player_animation_direction
-    # Update player animation scale factors
-    player_battle_scale += player_animation_direction * player_animation_speed
-
-    # Reverse direction if limits are reached
-    if player_battle_scale <= player_scale_min or player_battle_scale >= player_scale_max:
-        player_animation_direction *= -1
+        screen.fill(BLACK)  # The background couldn't be loaded
 
     # Apply scaling to player image
-    scaled_player_size = int(120 * player_battle_scale)
-    scaled_player_image = pygame.transform.scale(player_image_original, (scaled_player_size, scaled_player_size))
+    scaled_player_size = int(120 * interpolate(previous_player_battle_scale, player_battle_scale))
+    scaled_player_image = frame_cache.get(("battle", "player"), battle_player_image, scaled_player_size)
 
     # Ensure player always faces right in battle mode
     final_player_image = scaled_player_image  # Always face right
@@ -227,29 +380,18 @@ def draw_battle_screen():
     screen.blit(final_player_image, player_rect)
 
     # Animate Enemy in Battle
-    enemy_type = current_enemy["type"]
-    enemy_scale = enemy_animation_scales[enemy_type]
-    enemy_dir = enemy_animation_directions[enemy_type]
-
-    # Update enemy animation scale
-    enemy_scale += enemy_dir * player_animation_speed  # Reuse player animation speed for consistency
-    if enemy_scale <= player_scale_min or enemy_scale >= player_scale_max:
-        enemy_animation_directions[enemy_type] *= -1
-    enemy_animation_scales[enemy_type] = enemy_scale
+    enemy_scale = interpolate(enemies.anim_previous_scale[current_enemy], enemies.anim_scale[current_enemy])
 
     # Apply scaling to enemy image
-    enemy_size = 150 if enemy_type != "boss" else 300
+    enemy_size = BATTLE_SPRITE_SIZE if enemy_type != "boss" else BATTLE_SPRITE_SIZE * 2
     scaled_enemy_size = int(enemy_size * enemy_scale)
-    scaled_enemy_image = pygame.transform.scale(enemy_images[enemy_type], (scaled_enemy_size, scaled_enemy_size))
+    scaled_enemy_image = frame_cache.get(("battle", enemy_type), battle_enemy_images[enemy_type], scaled_enemy_size)
 
     # Handle Enemy Shake Animation
-    if enemy_shake_flags[enemy_type]:
+    if enemies.shake[current_enemy] > 0:
         # Apply a small random offset to simulate shaking
         shake_offset_x = random.randint(-5, 5)
         shake_offset_y = random.randint(-5, 5)
-        enemy_shake_counters[enemy_type] -= 1
-        if enemy_shake_counters[enemy_type] <= 0:
-            enemy_shake_flags[enemy_type] = False
     else:
         shake_offset_x = 0
         shake_offset_y = 0
@@ -265,114 +407,273 @@ def draw_battle_screen():
     pygame.draw.rect(screen, BLACK, text_bg_rect, 2)  # Border
 
     # Draw text to indicate a battle
-    font = pygame.font.Font(None, 50)
-    battle_text = font.render("Battle!", True, BLACK)
+    battle_text = text_renderer.render("Battle!", 50, BLACK)
     screen.blit(battle_text, (WINDOW_SIZE // 2 - battle_text.get_width() // 2, 420))
 
     # Draw health bars and mana
-    font_small = pygame.font.Font(None, 30)
-    player_health_text = font_small.render(f"HP: {player_health}/{player_max_health}", True, BLACK)
-    screen.blit(player_health_text, (70, 450))
-
-    enemy_health_text = font_small.render(f"Enemy HP: {current_enemy['health']}", True, BLACK)
-    screen.blit(enemy_health_text, (70, 480))
-
-    player_mana_text = font_small.render(f"Mana: {player_mana}/{player_max_mana}", True, BLACK)
-    screen.blit(player_mana_text, (70, 510))
+    screen.blit(player_health_text.render(state.player_health, state.player_max_health), (70, 450))
+    screen.blit(enemy_health_text.render(int(enemies.health[current_enemy])), (70, 480))
+    screen.blit(player_mana_text.render(state.player_mana, state.player_max_mana), (70, 510))
 
     # Menu for player actions
     action_text_lines = [
-        "Space: Basic Attack",
-        "S: Special Attack          R: Run Away"
+        "Space: Attack   S: Special   D: Defend",
+        f"I: Potion ({state.potions} left)   R: Run Away"
     ]
     for i, line in enumerate(action_text_lines):
-        action_text = font_small.render(line, True, BLACK)
+        action_text = text_renderer.render(line, 30, BLACK)
         screen.blit(action_text, (70, 540 + i * 30))
 
     # Display mana warning
-    if mana_warning:
-        warning_text = font_small.render("Out of Mana!", True, BLACK)
+    if state.mana_warning:
+        warning_text = text_renderer.render("Out of Mana!", 30, BLACK)
         screen.blit(warning_text, (WINDOW_SIZE // 2 - warning_text.get_width() // 2, 600))
-        mana_warning = False
+        state.mana_warning = False
 
-def handle_battle():
+def draw_overworld():
     """
-    Handles the logic for player's actions during battle.
+    Draws the overworld: background, player, enemies and the XP bar.
     """
-    global player_health, player_mana, player_xp, battle_mode, current_enemy, mana_warning
-    global player_max_health, player_max_mana, player_damage, player_level, xp_needed
-    global facing_right  # Ensure we can modify facing_right
-
-    if player_action == "basic_attack":
-        # Basic attack
-        current_enemy["health"] -= player_damage
-        trigger_enemy_shake(current_enemy["type"])
-    elif player_action == "special_attack":
-        if player_mana >= 3:
-            # Special attack
-            current_enemy["health"] -= player_damage + 2
-            player_mana -= 3
-            trigger_enemy_shake(current_enemy["type"])
+    # Keep the player in view; when the view scrolls every pixel changes
+    player_x, player_y = player_pixel_position()
+    if camera.follow(player_x + CELL_SIZE, player_y + CELL_SIZE):
+        overworld_renderer.invalidate()
+
+    if DIRTY_RECT_RENDERING:
+        # Restore the background (walls included) under last frame's sprites
+        overworld_renderer.begin_frame()
+    else:
+        # Draw the map chunks in view, walls baked in
+        draw_map()
+
+    # Draw the animated sprite
+    player_pos_x = player_x - camera.rect.x
+    player_pos_y = player_y - camera.rect.y
+
+    # Apply scaling based on overworld animation
+    scaled_player_size = int(CELL_SIZE * 2 * interpolate(previous_player_overworld_scale, player_overworld_scale))
+
+    # Flip the player image based on direction (cached per facing)
+    final_player_image = frame_cache.get("player", player_image_original, scaled_player_size, flip=not state.facing_right)
+
+    # Calculate offset to keep the player centered
+    player_offset = (CELL_SIZE * 2 - scaled_player_size) // 2
+
+    # Create a rect with adjusted position
+    player_rect = pygame.Rect(player_pos_x + player_offset, player_pos_y + player_offset, scaled_player_size, scaled_player_size)
+    screen.blit(final_player_image, player_rect)
+    if DIRTY_RECT_RENDERING:
+        overworld_renderer.mark(player_rect)
+
+    # Cull the enemies outside the view and size the rest, all in one pass over the columns
+    view = camera.rect
+    enemies = state.enemies
+    sizes = enemies.size * CELL_SIZE
+    screen_xs = enemies.x * CELL_SIZE - view.x
+    screen_ys = enemies.y * CELL_SIZE - view.y
+    visible = np.flatnonzero((screen_xs + sizes >= 0) & (screen_ys + sizes >= 0) &
+                             (screen_xs < view.width) & (screen_ys < view.height))
+    scales = interpolate(enemies.anim_previous_scale[visible], enemies.anim_scale[visible])
+    scaled_sizes = (sizes[visible] * scales).astype(np.int32)
+
+    # Draw the enemies inside the view
+    type_names = enemies.type_names
+    for enemy, type_id, size, enemy_x, enemy_y, scaled_enemy_size, shaking in zip(
+            visible.tolist(), enemies.type_id[visible].tolist(), sizes[visible].tolist(),
+            screen_xs[visible].tolist(), screen_ys[visible].tolist(), scaled_sizes.tolist(),
+            (enemies.shake[visible] > 0).tolist()):
+        enemy_type = type_names[type_id]
+        scaled_enemy_image = frame_cache.get(enemy_type, enemy_images[enemy_type], scaled_enemy_size)
+
+        # Handle Enemy Shake Animation
+        if shaking:
+            # Apply a small random offset to simulate shaking
+            shake_offset_x = random.randint(-5, 5)
+            shake_offset_y = random.randint(-5, 5)
         else:
-            mana_warning = True
-            return
-    elif player_action == "run_away":
-        # Run away
-        play_music(overworld_music)
-        battle_mode = False
-        return
+            shake_offset_x = 0
+            shake_offset_y = 0
+
+        # Calculate offset to keep the enemy centered
+        enemy_offset = (size - scaled_enemy_size) // 2
+        enemy_rect_scaled = pygame.Rect(
+            enemy_x + enemy_offset + shake_offset_x,
+            enemy_y + enemy_offset + shake_offset_y,
+            scaled_enemy_size,
+            scaled_enemy_size
+        )
+
+        # Blit the scaled (and possibly shaken) enemy image
+        screen.blit(scaled_enemy_image, enemy_rect_scaled)
+        if DIRTY_RECT_RENDERING:
+            overworld_renderer.mark(enemy_rect_scaled)
+
+    # Draw the XP bar (regions are only tracked when the renderer flushes them each frame)
+    xp_bar_rect = draw_xp_bar()
+    if DIRTY_RECT_RENDERING:
+        overworld_renderer.mark(xp_bar_rect)
+
+def interpolate(previous, current):
+    """
+    Blends an animation value between the previous and the current tick.
+    """
+    return previous + (current - previous) * render_alpha
+
+def player_pixel_position():
+    """
+    Returns where the player is drawn on the map, in pixels: on the way to their cell, between the previous and the current tick.
+    """
+    previous_x, previous_y = previous_player_position or (state.player_x, state.player_y)
+    return (round(interpolate(previous_x, state.player_x) * CELL_SIZE),
+            round(interpolate(previous_y, state.player_y) * CELL_SIZE))
 
-    # Enemy's turn to attack
-    if current_enemy["health"] > 0:
-        player_health -= ENEMY_TYPES[current_enemy["type"]]["attack"]
+def update_animations():
+    """
+    Advances every animation by one simulation tick.
+    """
+    global player_overworld_scale, player_battle_scale, player_animation_direction
+    global previous_player_overworld_scale, previous_player_battle_scale
 
-    # Check if battle is over
-    if player_health <= 0:
-        print("You lost the game!")
-        game_over_screen(victory=False)
+    previous_player_overworld_scale = player_overworld_scale
+    previous_player_battle_scale = player_battle_scale
+    enemies = state.enemies
+    enemies.anim_previous_scale[:] = enemies.anim_scale
 
-    if current_enemy["health"] <= 0:
-        player_xp += ENEMY_TYPES[current_enemy["type"]]["xp"]
-        if current_enemy["type"] == "boss":
-            print("You win!")
-            game_over_screen(victory=True)
+    if state.battle_mode:
+        # Animate Player in Battle
+        player_battle_scale += player_animation_direction * player_animation_speed
 
-        enemies.remove(current_enemy)
-        play_music(overworld_music)
-        battle_mode = False
+        # Reverse direction if limits are reached
+        if player_battle_scale <= player_scale_min or player_battle_scale >= player_scale_max:
+            player_animation_direction *= -1
+    else:
+        # Update player animation scale factors (Overworld)
+        player_overworld_scale += player_animation_direction * player_animation_speed
+        player_overworld_scale = max(min(player_overworld_scale, player_scale_max), player_scale_min)
+
+        # Reverse direction if limits are reached
+        if player_overworld_scale <= player_scale_min or player_overworld_scale >= player_scale_max:
+            player_animation_direction *= -1
 
-        # Level up check
-        if player_xp >= xp_needed:
-            player_level_up()
+    # Update every enemy's scale factor at once (reuse player animation speed for consistency)
+    scales = enemies.anim_scale
+    scales += enemies.anim_direction * player_animation_speed
+    np.clip(scales, player_scale_min, player_scale_max, out=scales)
 
-def player_level_up():
+    # Reverse direction where limits are reached
+    enemies.anim_direction[(scales <= player_scale_min) | (scales >= player_scale_max)] *= -1
+
+    # Count the shakes down
+    shake = enemies.shake
+    shake[shake > 0] -= 1
+
+def render_signature():
+    """
+    Sums up what a frame shows: frames with the same signature look the same
+    (animated sprite sizes are compared in steps of PERCEPTIBLE_PIXELS).
+    """
+    if state.battle_mode:
+        enemy = state.current_enemy
+        enemy_size = BATTLE_SPRITE_SIZE * interpolate(state.enemies.anim_previous_scale[enemy], state.enemies.anim_scale[enemy])
+        return (True, enemy, state.player_health, int(state.enemies.health[enemy]), state.player_mana, state.potions,
+                state.mana_warning, int(120 * interpolate(previous_player_battle_scale, player_battle_scale)) // PERCEPTIBLE_PIXELS,
+                int(enemy_size) // PERCEPTIBLE_PIXELS)
+    return (False, player_pixel_position(), state.facing_right, state.player_xp, len(state.enemies),
+            int(CELL_SIZE * 2 * interpolate(previous_player_overworld_scale, player_overworld_scale)) // PERCEPTIBLE_PIXELS)
+
+def draw_frame():
     """
-    Handles player leveling up.
+    Draws the current scene and pushes it to the display.
     """
-    global player_level, player_xp, xp_needed
-    global player_max_health, player_max_mana, player_damage
-    global player_health, player_mana
+    if state.battle_mode:
+        start = profiler.start()
+        draw_battle_screen()
+        profiler.draw_overlay(screen, text_renderer)
+        profiler.stop("battle_screen", start)
+
+        start = profiler.start()
+        pygame.display.flip()
+        profiler.stop("flip", start)
+
+        # The battle screen covered everything, so the overworld needs a full repaint
+        overworld_renderer.invalidate()
+    else:
+        start = profiler.start()
+        draw_overworld()
+        overlay_rect = profiler.draw_overlay(screen, text_renderer)
+        if DIRTY_RECT_RENDERING and overlay_rect is not None:
+            overworld_renderer.mark(overlay_rect)
+        profiler.stop("overworld", start)
+
+        # Update the display
+        start = profiler.start()
+        if DIRTY_RECT_RENDERING:
+            overworld_renderer.present()
+        else:
+            pygame.display.flip()
+        profiler.stop("flip", start)
+
+def handle_events(events):
+    """
+    Plays the sound, animation and screen changes for the events returned by game_engine.step().
+    """
+    if events and pacer is not None:
+        # Moves, chase steps and battle turns all change the picture
+        pacer.activity(time.perf_counter())
+    for event in events:
+        if event == game_engine.BATTLE_STARTED:
+            # Play appropriate music
+            if state.enemies.type_name(state.current_enemy) == "boss":
+                play_music(final_boss_music)
+            else:
+                play_music(battle_music)
+        elif event == game_engine.ENEMY_HIT:
+            trigger_enemy_shake(state.current_enemy)
+            audio.play_effect("hit")
+        elif event in (game_engine.RAN_AWAY, game_engine.ENEMY_DEFEATED):
+            play_music(overworld_music)
+        elif event == game_engine.NO_POTIONS:
+            print("No potions left!")
+        elif event == game_engine.LEVEL_UP:
+            print(f"Level Up! You are now level {state.player_level}.")
+        elif event == game_engine.DEFEAT:
+            print("You lost the game!")
+        elif event == game_engine.VICTORY:
+            print("You win!")
 
-    player_level += 1
-    player_xp = 0
-    xp_needed += 5
-    player_max_health += 10
-    player_max_mana += 5
-    player_damage += 2
-    player_health = player_max_health
-    player_mana = player_max_mana
-    print(f"Level Up! You are now level {player_level}.")
+def handle_battle():
+    """
+    Handles the logic for player's actions during battle.
+    """
+    start = profiler.start()
+    events = game_engine.step(state, player_action)
+    handle_events(events)
+    profiler.stop("handle_battle", start, parent="events")
+
+def handle_key(key):
+    """
+    Handles a key press in battle or in the overworld.
+    """
+    global player_action
+
+    if state.battle_mode:
+        if key in BATTLE_KEYS:
+            player_action = BATTLE_KEYS[key]
+            handle_battle()
+    else:
+        # Move the sprite with arrow keys (when not in battle); any key checks for enemy contact
+        events = game_engine.step(state, OVERWORLD_KEYS.get(key))
+        handle_events(events)
 
 def game_over_screen(victory=False):
     """
     Displays the game over or victory screen.
     """
     screen.fill(BLACK)
-    font = pygame.font.Font(None, 74)
     if victory:
-        text = font.render("You Win!", True, WHITE)
+        text = text_renderer.render("You Win!", 74, WHITE)
     else:
-        text = font.render("Game Over", True, WHITE)
+        text = text_renderer.render("Game Over", 74, WHITE)
     screen.blit(text, (WINDOW_SIZE//2 - text.get_width()//2, WINDOW_SIZE//2 - text.get_height()//2))
     pygame.display.flip()
 
@@ -381,207 +682,234 @@ def game_over_screen(victory=False):
     pygame.quit()
     sys.exit()
 
-def trigger_enemy_shake(enemy_type):
+def trigger_enemy_shake(enemy):
+    """
+    Triggers the shake animation for the enemy at the given index.
+    """
+    if enemy is not None:
+        state.enemies.shake[enemy] = ENEMY_SHAKE_TICKS
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Chase Game with Battle Transition")
+    parser.add_argument("--profile", action="store_true", default=PROFILE,
+                        help="Time each phase of the main loop and show an overlay")
+    parser.add_argument("--profile-csv", metavar="PATH", help="Also write per-frame timings to a CSV file")
+    parser.add_argument("--fixed-step", action=argparse.BooleanOptionalAction, default=FIXED_TIMESTEP,
+                        help="Simulate at TICK_RATE independently of the render rate")
+    parser.add_argument("--adaptive-pacing", action=argparse.BooleanOptionalAction, default=ADAPTIVE_PACING,
+                        help="Render at IDLE_FPS while the scene is static (needs --fixed-step)")
+    parser.add_argument("--seed", type=int, help="Seed for enemy placement and animations")
+    parser.add_argument("--record", metavar="PATH", help="Record the seed and every key press to PATH")
+    parser.add_argument("--replay", metavar="PATH", help="Replay a session recorded with --record")
+    parser.add_argument("--fast", action="store_true", help="With --replay: no rendering, no frame cap")
+    parser.add_argument("--load", metavar="PATH", help="Continue a saved game")
+    parser.add_argument("--map", metavar="PATH", help="Play on a map file made by mapgen.py")
+    parser.add_argument("--save-file", metavar="PATH", default=SAVE_FILE,
+                        help="Where F5 and the autosave write the game (F9 loads it)")
+    parser.add_argument("--asset-budget", type=float, default=ASSET_BUDGET_MB, metavar="MB",
+                        help="Memory for decoded images; battle backgrounds beyond it are dropped and reloaded")
+    parser.add_argument("--image-url", metavar="URL",
+                        help="Generate variants (G and B keys) with an HTTP image server, such as "
+                             "generate_image.py --stub-server, instead of OpenAI")
+    args = parser.parse_args(argv)
+
+    # A recording only holds the seed and the keys, so it must start from the default map
+    if args.record and (args.load or args.map):
+        parser.error("--record can't be combined with --load or --map (the recording would not contain them)")
+    return args
+
+def simulation_step(tick):
     """
-    Triggers the shake animation for the specified enemy type.
+    Advances the game by one tick: enemies chasing the player, the player gliding and every animation.
     """
-    if enemy_type in enemy_shake_flags:
-        enemy_shake_flags[enemy_type] = True
-        enemy_shake_counters[enemy_type] = 30  # Shake for 30 frames
+    global previous_player_position
 
-# Create a semi-transparent wall surface
-wall_surface = pygame.Surface((CELL_SIZE, CELL_SIZE), pygame.SRCALPHA)
-wall_alpha = 0  # 0 (fully transparent) to 255 (fully opaque)
-wall_color = BROWN + (wall_alpha,)  # Adding alpha to the color
-wall_surface.fill(wall_color)
+    # Let the enemies chase the player
+    if tick % ENEMY_MOVE_INTERVAL == 0 and not state.battle_mode:
+        handle_events(game_engine.step(state, game_engine.TICK))
 
-# Game loop
-clock = pygame.time.Clock()
+    # Let the drawn player catch up with their cell
+    previous_player_position = (state.player_x, state.player_y)
+    game_engine.glide_player(state)
 
-running = True
-while running:
+    update_animations()
 
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.KEYDOWN:
-            if battle_mode:
-                if event.key == pygame.K_SPACE:
-                    player_action = "basic_attack"
-                    handle_battle()
-                elif event.key == pygame.K_s:
-                    player_action = "special_attack"
-                    handle_battle()
-                elif event.key == pygame.K_r:
-                    player_action = "run_away"
-                    handle_battle()
-            else:
-                # Move the sprite with arrow keys (when not in battle)
-                moved = False  # Flag to check if movement occurred
-                if event.key == pygame.K_UP and sprite_y > 0:
-                    # Check collision for all cells the sprite will occupy after movement
-                    collision = False
-                    for dx in range(2):
-                        for dy in range(2):
-                            if (sprite_x + dx, sprite_y - 1 + dy) in walls:
-                                collision = True
-                                break
-                        if collision:
-                            break
-                    if not collision:
-                        sprite_y -= 1
-                        moved = True
-                elif event.key == pygame.K_DOWN and sprite_y < GRID_SIZE - 2:
-                    collision = False
-                    for dx in range(2):
-                        for dy in range(2):
-                            if (sprite_x + dx, sprite_y + 2 + dy) in walls:
-                                collision = True
-                                break
-                        if collision:
-                            break
-                    if not collision:
-                        sprite_y += 1
-                        moved = True
-                elif event.key == pygame.K_LEFT and sprite_x > 0:
-                    collision = False
-                    for dx in range(2):
-                        for dy in range(2):
-                            if (sprite_x - 1 + dx, sprite_y + dy) in walls:
-                                collision = True
-                                break
-                        if collision:
-                            break
-                    if not collision:
-                        sprite_x -= 1
-                        moved = True
-                        facing_right = False  # Change direction to left
-                elif event.key == pygame.K_RIGHT and sprite_x < GRID_SIZE - 2:
-                    collision = False
-                    for dx in range(2):
-                        for dy in range(2):
-                            if (sprite_x + 2 + dx, sprite_y + dy) in walls:
-                                collision = True
-                                break
-                        if collision:
-                            break
-                    if not collision:
-                        sprite_x += 1
-                        moved = True
-                        facing_right = True  # Change direction to right
-
-                # If movement occurred, you can trigger movement-based animations here
-                if moved:
-                    pass  # Currently, animation is continuous. Modify if you want animation tied to movement.
-
-                # Check for collisions with enemies
-                for enemy in enemies:
-                    enemy_size = 2 if enemy["type"] != "boss" else 4
-                    if (sprite_x < enemy["x"] + enemy_size and
-                        sprite_x + 2 > enemy["x"] and
-                        sprite_y < enemy["y"] + enemy_size and
-                        sprite_y + 2 > enemy["y"]):
-                        battle_mode = True
-                        current_enemy = enemy
-                        facing_right = True  # Ensure player faces right in battle mode
-                        break  # Initiate battle with the first collided enemy
-
-    # Clear the screen
-    if battle_mode:
-        draw_battle_screen()
-    else:
-        screen.blit(background_image, (0, 0))
-
-        # Draw the walls first to ensure they are at the bottom layer
-        for (wx, wy) in walls:
-            wall_rect = pygame.Rect(wx * CELL_SIZE, wy * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-            screen.blit(wall_surface, wall_rect)  # Blit the semi-transparent wall
+def main(argv=None):
+    """
+    Runs the game until the window is closed.
+    """
+    global state, profiler, render_alpha, asset_requests, pacer
 
-        # Draw the animated sprite
-        player_pos_x = sprite_x * CELL_SIZE
-        player_pos_y = sprite_y * CELL_SIZE
+    args = parse_args(argv)
+    profiler = FrameProfiler(enabled=args.profile or bool(args.profile_csv), csv_path=args.profile_csv)
 
-        # Apply scaling based on overworld animation
-        scaled_player_size = int(CELL_SIZE * 2 * player_overworld_scale)
-        scaled_player_image = pygame.transform.scale(player_image_original, (scaled_player_size, scaled_player_size))
+    # Everything random derives from one seed, so a recorded session can be replayed exactly
+    replay = InputReplay(args.replay) if args.replay else None
+    if replay is not None:
+        seed = replay.seed
+    elif args.seed is not None:
+        seed = args.seed
+    else:
+        seed = random.randrange(2 ** 32)
+    random.seed(seed)
+    recorder = InputRecorder(args.record, seed) if args.record else None
+    fast_forward = replay is not None and args.fast
 
-        # Flip the player image based on direction
-        if facing_right:
-            final_player_image = scaled_player_image
+    if args.map:
+        state = mapgen.new_game(mapgen.load_map(args.map), seed)
+    else:
+        state = game_engine.new_game(seed)
+    init_game(int(args.asset_budget * 1_000_000))
+    profiler.extra_lines = assets.summary_lines
+    if args.load and replay is None:
+        load_game(args.load)
+
+    # Saves are snapshotted here and written on a background thread; replays never save
+    autosaver = save_game.AutoSaver(args.save_file, AUTOSAVE_INTERVAL) if replay is None else None
+
+    # Sprite and background variants are generated on worker threads while the game runs
+    client = HTTPImageClient(args.image_url) if args.image_url else OpenAIImageClient()
+    asset_requests = AssetRequestQueue(client, IMAGE_WORKERS)
+
+    # Idle scenes render at a low rate; replays and the per-frame simulation keep the fixed rate
+    if args.adaptive_pacing and args.fixed_step and replay is None:
+        pacer = FramePacer(FPS, IDLE_FPS, IDLE_DELAY)
+
+    # Game loop
+    clock = pygame.time.Clock()
+    woken_by = None     # Event that ended an idle wait, handled with the next frame's events
+    tick = 0            # Simulation ticks run so far
+    tick_time = 1 / TICK_RATE
+    accumulator = 0.0   # Real time (seconds) not simulated yet
+    skipped_renders = 0
+
+    running = True
+    while running:
+        profiler.begin_frame()
+
+        start = profiler.start()
+        events = pygame.event.get()
+        if woken_by is not None:
+            events.insert(0, woken_by)
+            woken_by = None
+        for event in events:
+            if pacer is not None and event.type == pygame.KEYDOWN:
+                pacer.activity(time.perf_counter())
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN and event.key == SAVE_KEY and autosaver is not None:
+                autosaver.save(state, time.perf_counter())
+            elif event.type == pygame.KEYDOWN and event.key == LOAD_KEY and autosaver is not None:
+                # Loading would break a recording, so it's only allowed without one
+                if recorder is None:
+                    load_game(args.save_file)
+            elif event.type == pygame.KEYDOWN and event.key == ENEMY_VARIANT_KEY and state.battle_mode:
+                request_enemy_variant(state.enemies.type_name(state.current_enemy))
+            elif event.type == pygame.KEYDOWN and event.key == BACKGROUND_VARIANT_KEY:
+                if not state.battle_mode:
+                    request_background_variant("overworld")
+                elif state.enemies.type_name(state.current_enemy) == "boss":
+                    request_background_variant("boss")
+                else:
+                    request_background_variant("battle")
+            elif event.type == pygame.KEYDOWN and replay is None:
+                if recorder is not None:
+                    recorder.record(tick, event.key)
+                handle_key(event.key)
+
+        # How many ticks to simulate: one per frame, or as many as the elapsed time calls for
+        if fast_forward:
+            ticks_due = replay.last_frame - tick
+        elif args.fixed_step:
+            ticks_due = min(int(accumulator / tick_time), MAX_TICKS_PER_FRAME)
+            accumulator -= ticks_due * tick_time
+            if ticks_due == MAX_TICKS_PER_FRAME:
+                # Too far behind to catch up: drop the extra time instead of spiraling
+                accumulator = min(accumulator, tick_time)
         else:
-            final_player_image = pygame.transform.flip(scaled_player_image, True, False)
-
-        # Calculate offset to keep the player centered
-        player_offset = (CELL_SIZE * 2 - scaled_player_size) // 2
-
-        # Create a rect with adjusted position
-        player_rect = pygame.Rect(player_pos_x + player_offset, player_pos_y + player_offset, scaled_player_size, scaled_player_size)
-        screen.blit(final_player_image, player_rect)
-
-        # Update player animation scale factors (Overworld)
-        player_overworld_scale += player_animation_direction * player_animation_speed
-        player_overworld_scale = max(min(player_overworld_scale, player_scale_max), player_scale_min)
-
-        # Reverse direction if limits are reached
-        if player_overworld_scale <= player_scale_min or player_overworld_scale >= player_scale_max:
-            player_animation_direction *= -1
-
-        # Draw the enemies
-        for enemy in enemies:
-            size = CELL_SIZE * 2 if enemy["type"] != "boss" else CELL_SIZE * 4
-            enemy_rect = pygame.Rect(enemy["x"] * CELL_SIZE, enemy["y"] * CELL_SIZE, size, size)
-
-            # Get enemy type
-            enemy_type = enemy["type"]
-
-            # Get current animation scale for the enemy
-            enemy_scale = enemy_animation_scales[enemy_type]
-
-            # Apply scaling
-            scaled_enemy_size = int(size * enemy_scale)
-            scaled_enemy_image = pygame.transform.scale(enemy_images[enemy_type], (scaled_enemy_size, scaled_enemy_size))
-
-            # Handle Enemy Shake Animation
-            if enemy_shake_flags[enemy_type]:
-                # Apply a small random offset to simulate shaking
-                shake_offset_x = random.randint(-5, 5)
-                shake_offset_y = random.randint(-5, 5)
-                enemy_shake_counters[enemy_type] -= 1
-                if enemy_shake_counters[enemy_type] <= 0:
-                    enemy_shake_flags[enemy_type] = False
-            else:
-                shake_offset_x = 0
-                shake_offset_y = 0
-
-            # Calculate offset to keep the enemy centered
-            enemy_offset = (size - scaled_enemy_size) // 2
-            enemy_rect_scaled = pygame.Rect(
-                enemy["x"] * CELL_SIZE + enemy_offset + shake_offset_x,
-                enemy["y"] * CELL_SIZE + enemy_offset + shake_offset_y,
-                scaled_enemy_size,
-                scaled_enemy_size
-            )
-
-            # Blit the scaled (and possibly shaken) enemy image
-            screen.blit(scaled_enemy_image, enemy_rect_scaled)
-
-            # Update enemy animation scale factors
-            enemy_animation_scales[enemy_type] += enemy_animation_directions[enemy_type] * player_animation_speed
-            enemy_animation_scales[enemy_type] = max(min(enemy_animation_scales[enemy_type], player_scale_max), player_scale_min)
-
-            # Reverse direction if limits are reached
-            if enemy_animation_scales[enemy_type] <= player_scale_min or enemy_animation_scales[enemy_type] >= player_scale_max:
-                enemy_animation_directions[enemy_type] *= -1
-
-        # Draw the XP bar
-        draw_xp_bar()
-
-    # Update the display
-    pygame.display.flip()
+            ticks_due = 1
+        if replay is not None:
+            ticks_due = min(ticks_due, replay.last_frame - tick)
+
+        for _ in range(ticks_due):
+            # Replayed keys go through the same handlers as live ones, on the same tick
+            if replay is not None:
+                for key in replay.keys_for(tick):
+                    handle_key(key)
+            simulation_step(tick)
+            tick += 1
+            if state.game_over:
+                break
+
+        if replay is not None and tick >= replay.last_frame and not state.game_over:
+            for key in replay.keys_for(tick):
+                handle_key(key)
+            running = False
 
-    # Cap the frame rate
-    clock.tick(FPS)
+        # Start any music switch whose track finished decoding, and swap in finished variants
+        audio.update()
+        variants_arrived = asset_requests.update()
+        update_assets()
+        if pacer is not None:
+            now = time.perf_counter()
+            if variants_arrived or state.enemies.shake.any():
+                pacer.activity(now)
+            pacer.update(now)
+        if autosaver is not None and not state.game_over:
+            autosaver.maybe_save(state, time.perf_counter())
+        profiler.stop("events", start)
+
+        # The boss is beaten or the player died
+        if state.game_over:
+            if fast_forward:
+                break
+            if recorder is not None:
+                recorder.close(tick)
+                recorder = None
+            if autosaver is not None:
+                autosaver.stop()
+            game_over_screen(victory=state.victory)
+
+        if fast_forward:
+            profiler.end_frame()
+            continue
+
+        # Frame skipping: while the simulation is still behind, skip a bounded number of renders
+        if args.fixed_step and accumulator >= tick_time and skipped_renders < MAX_FRAME_SKIP:
+            skipped_renders += 1
+        else:
+            skipped_renders = 0
+            render_alpha = accumulator / tick_time if args.fixed_step else 1.0
+            # While idle, a frame that would look like the last one isn't drawn at all
+            if pacer is None or pacer.should_draw(render_signature()):
+                draw_frame()
+
+        # Cap the frame rate (while idle: sleep until the next idle frame or the next input)
+        start = profiler.start()
+        if pacer is not None:
+            elapsed, woken_by = pacer.wait(clock)
+        else:
+            elapsed = clock.tick(FPS)
+        accumulator += elapsed / 1000
+        profiler.stop("tick", start)
+        profiler.end_frame()
+
+    if recorder is not None:
+        recorder.close(tick)
+    if autosaver is not None:
+        autosaver.save(state)
+        autosaver.stop()
+    if replay is not None:
+        print(f"Replayed {tick} ticks: position ({state.sprite_x}, {state.sprite_y}), "
+              f"level {state.player_level}, HP {state.player_health}, {len(state.enemies)} enemies left")
+
+    # Quit Pygame
+    profiler.close()
+    audio.stop()
+    asset_requests.stop()
+    assets.stop()
+    pygame.quit()
+    sys.exit()
 
-# Quit Pygame
-pygame.quit()
-sys.exit()
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,17 @@
+import os
+import argparse
+import random
+import time
 import tkinter as tk
+from collections import deque
 from tkinter import messagebox
 
 class RPGGameUI:
-    def __init__(self, root):
+    def __init__(self, root, on_action=None):
         self.root = root
         self.root.title("AI RPG Game")
         self.root.geometry("800x600")
+        self.on_action = on_action  # Called with the button name in hosted mode
 
         # Game Display Area
         self.game_display = tk.Canvas(root, width=600, height=400, bg="black")
@@ -35,15 +41,210 @@ class RPGGameUI:
         self.use_item_button.pack(side=tk.LEFT, padx=10)
 
     def attack(self):
-        messagebox.showinfo("Action", "You chose to attack!")
+        if self.on_action is not None:
+            self.on_action("attack")
+        else:
+            messagebox.showinfo("Action", "You chose to attack!")
 
     def defend(self):
-        messagebox.showinfo("Action", "You chose to defend!")
+        if self.on_action is not None:
+            self.on_action("defend")
+        else:
+            messagebox.showinfo("Action", "You chose to defend!")
 
     def use_item(self):
-        messagebox.showinfo("Action", "You used an item!")
+        if self.on_action is not None:
+            self.on_action("use_item")
+        else:
+            messagebox.showinfo("Action", "You used an item!")
 
-# Create the main window
-root = tk.Tk()
-app = RPGGameUI(root)
-root.mainloop()
+class GameHost:
+    """
+    Runs the pygame game inside an RPGGameUI window ("hosted mode").
+
+    Tk owns the main thread: pygame never opens a window of its own (it draws
+    to an offscreen display surface through SDL's dummy video driver) and
+    never runs a loop of its own. Each frame is scheduled with root.after, so
+    mainloop keeps handling Tk events in between. After drawing, only the
+    regions the game actually updated are handed to a Tk PhotoImage on the
+    canvas, as binary PPM data.
+    """
+
+    # Tk keysyms for the game's keys
+    KEYSYMS = {
+        "Up": "K_UP", "Down": "K_DOWN", "Left": "K_LEFT", "Right": "K_RIGHT",
+        "space": "K_SPACE", "s": "K_s", "r": "K_r", "d": "K_d", "i": "K_i"
+    }
+
+    def __init__(self, root, seed=None):
+        # Must be set before the game initializes pygame's display
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        import pygame
+        import game_engine
+        import Test
+        self.pygame = pygame
+        self.game = Test
+
+        self.root = root
+        self.ui = RPGGameUI(root, on_action=self.queue_action)
+        size = Test.WINDOW_SIZE
+        root.geometry(f"800x{size + 200}")
+        self.ui.game_display.config(width=size, height=size)
+        self.photo = tk.PhotoImage(width=size, height=size)
+        self.ui.game_display.create_image(0, 0, anchor=tk.NW, image=self.photo)
+
+        # Battle actions from the buttons and key presses from the window, drained once per frame
+        self.actions = deque()
+        self.keys = deque()
+        self.key_codes = {keysym: getattr(pygame, name) for keysym, name in self.KEYSYMS.items()}
+        self.button_actions = {
+            "attack": game_engine.BASIC_ATTACK,
+            "defend": game_engine.DEFEND,
+            "use_item": game_engine.USE_ITEM
+        }
+        root.bind("<KeyPress>", self.on_key)
+        root.protocol("WM_DELETE_WINDOW", self.close)
+
+        # Labels and button states as last shown, so Tk is only touched when they change
+        self.shown_health = None
+        self.shown_inventory = None
+        self.shown_battle = None
+
+        # Start the game
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        random.seed(seed)
+        Test.state = game_engine.new_game(seed)
+        Test.init_game()
+
+        # The game draws into a surface one row taller than the screen, whose top
+        # row holds the PPM header (padded with whitespace to a whole row, as PPM
+        # allows), so a full-screen push is one tobytes() with no concatenation
+        header = b"P6 %d %d 255\n" % (size, size)
+        header = header[:2] + b" " * (size * 3 - len(header)) + header[2:]
+        self.staging = pygame.Surface((size, size + 1), 0, Test.screen)
+        self.staging.blit(pygame.image.frombuffer(header, (size, 1), "RGB"), (0, 0))
+        Test.screen = self.staging.subsurface((0, 1, size, size))
+        Test.overworld_renderer.screen = Test.screen
+
+        self.frame_time = 1 / Test.FPS
+        self.tick_time = 1 / Test.TICK_RATE
+        self.tick = 0
+        self.accumulator = 0.0
+        self.last_time = time.perf_counter()
+        self.root.after(0, self.frame)
+
+    def queue_action(self, button):
+        self.actions.append(self.button_actions[button])
+
+    def on_key(self, event):
+        key = self.key_codes.get(event.keysym)
+        if key is not None:
+            self.keys.append(key)
+
+    def frame(self):
+        """
+        Runs one frame: input, fixed simulation ticks, drawing and the push to Tk.
+        """
+        game = self.game
+        frame_start = time.perf_counter()
+        self.accumulator += frame_start - self.last_time
+        self.last_time = frame_start
+
+        while self.keys:
+            game.handle_key(self.keys.popleft())
+        while self.actions:
+            action = self.actions.popleft()
+            if game.state.battle_mode and not game.state.game_over:
+                game.player_action = action
+                game.handle_battle()
+
+        ticks_due = min(int(self.accumulator / self.tick_time), game.MAX_TICKS_PER_FRAME)
+        self.accumulator = min(self.accumulator - ticks_due * self.tick_time, self.tick_time)
+        for _ in range(ticks_due):
+            if game.state.game_over:
+                break
+            game.simulation_step(self.tick)
+            self.tick += 1
+        game.audio.update()
+        game.update_assets()
+
+        state = game.state
+        if state.game_over:
+            self.show_game_over(state.victory)
+            return
+
+        game.render_alpha = self.accumulator / self.tick_time
+        game.draw_frame()
+        self.push_frame(None if state.battle_mode else game.overworld_renderer.updated_rects)
+        self.update_panel()
+
+        # Schedule the next frame for the rest of this frame's time slot
+        elapsed = time.perf_counter() - frame_start
+        self.root.after(max(1, int((self.frame_time - elapsed) * 1000)), self.frame)
+
+    def push_frame(self, rects=None):
+        """
+        Copies the given screen regions (or the whole screen) into the canvas image.
+        """
+        if rects is None:
+            # Header and pixels in one conversion, straight from the staging surface
+            data = self.pygame.image.tobytes(self.staging, "RGB")
+            self.photo.tk.call(self.photo.name, "put", data, "-format", "ppm", "-to", 0, 0)
+            return
+        screen = self.game.screen
+        bounds = screen.get_rect()
+        for rect in rects:
+            rect = bounds.clip(rect)
+            if not rect.width or not rect.height:
+                continue
+            # Dirty rects are sprite-sized, where concatenating the header costs less than staging it
+            pixels = self.pygame.image.tobytes(screen.subsurface(rect), "RGB")
+            data = b"P6 %d %d 255\n" % rect.size + pixels
+            self.photo.tk.call(self.photo.name, "put", data, "-format", "ppm", "-to", rect.x, rect.y)
+
+    def update_panel(self):
+        """
+        Refreshes the health and inventory labels and the buttons, when they changed.
+        """
+        state = self.game.state
+        health = (state.player_health, state.player_max_health)
+        if health != self.shown_health:
+            self.ui.health_label.config(text=f"Health: {health[0]}/{health[1]}")
+            self.shown_health = health
+        if state.potions != self.shown_inventory:
+            self.ui.inventory_label.config(text=f"Inventory: [Sword, Potion x{state.potions}]")
+            self.shown_inventory = state.potions
+        if state.battle_mode != self.shown_battle:
+            button_state = tk.NORMAL if state.battle_mode else tk.DISABLED
+            for button in (self.ui.attack_button, self.ui.defend_button, self.ui.use_item_button):
+                button.config(state=button_state)
+            self.shown_battle = state.battle_mode
+
+    def show_game_over(self, victory):
+        self.update_panel()
+        size = self.game.WINDOW_SIZE
+        self.ui.game_display.create_text(size // 2, size // 2, text="You Win!" if victory else "Game Over",
+                                         fill="white", font=("Arial", 48))
+
+    def close(self):
+        self.game.audio.stop()
+        self.pygame.quit()
+        self.root.destroy()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AI RPG Game UI")
+    parser.add_argument("--hosted", action="store_true", help="Play the pygame game inside the UI")
+    parser.add_argument("--seed", type=int, help="Seed for enemy placement and animations")
+    args = parser.parse_args(argv)
+
+    # Create the main window
+    root = tk.Tk()
+    if args.hosted:
+        app = GameHost(root, seed=args.seed)
+    else:
+        app = RPGGameUI(root)
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
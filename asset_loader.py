@@ -0,0 +1,141 @@
+import io
+import mmap
+import os
+import re
+import zipfile
+import pygame
+
+# Archives the game ships its images in
+ARCHIVES = [r"./images.zip", r"./hd images.zip"]
+
+# Directory holding already-scaled, already-converted RGBA pixel buffers
+CACHE_DIR = r"./.asset_cache"
+
+
+class AssetLoader:
+    """
+    Loads images straight out of the zip archives, without extracting them.
+
+    The first time an image is asked for at a given size it is decoded,
+    scaled and its RGBA pixels are written to CACHE_DIR. The file name
+    includes the archive entry, its CRC and the target size, so a changed
+    archive never serves stale pixels. Later loads memory-map that file
+    and hand it to pygame.image.frombuffer, skipping the PNG decode and the
+    rescale entirely.
+    """
+
+    def __init__(self, archives=ARCHIVES, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.archives = []
+        self.entries = {}  # Entry name -> (archive, ZipInfo)
+        for path in archives:
+            if not os.path.exists(path):
+                continue
+            archive = zipfile.ZipFile(path)
+            self.archives.append(archive)
+            for info in archive.infolist():
+                if not info.is_dir():
+                    self.entries.setdefault(info.filename, (archive, info))
+
+    def close(self):
+        for archive in self.archives:
+            archive.close()
+        self.archives = []
+        self.entries = {}
+
+    def find(self, path):
+        """
+        Returns the (archive, ZipInfo) for a path like "./images/mainguy.png", or None.
+        """
+        name = path.replace("\\", "/")
+        if name.startswith("./"):
+            name = name[2:]
+        return self.entries.get(name)
+
+    def read_bytes(self, path):
+        """
+        Returns the raw bytes of an archive entry, or of the file on disk if no archive has it.
+        """
+        entry = self.find(path)
+        if entry is None:
+            with open(path, "rb") as file:
+                return file.read()
+        archive, info = entry
+        return archive.read(info)
+
+    def cache_path(self, info, width, height):
+        safe_name = re.sub(r"[^A-Za-z0-9]+", "_", info.filename)
+        return os.path.join(self.cache_dir, f"{safe_name}-{info.CRC:08x}-{width}x{height}.rgba")
+
+    def load_image(self, path, width, height, converted=True):
+        """
+        Returns the image at path scaled to (width, height), converted for fast blitting.
+        With converted=False the conversion is left to the caller, e.g. when
+        loading on a worker thread.
+        """
+        finish = convert if converted else (lambda image: image)
+        entry = self.find(path)
+        if entry is None:
+            # Not in any archive, e.g. a checkout with the images extracted
+            image = pygame.image.load(path)
+            return finish(pygame.transform.scale(image, (width, height)))
+
+        archive, info = entry
+        cache_path = self.cache_path(info, width, height)
+        if os.path.exists(cache_path):
+            image = self.load_cached(cache_path, width, height, finish)
+            if image is not None:
+                return image
+
+        # Decode and scale once, then keep the pixels for the next start
+        image = pygame.image.load(io.BytesIO(archive.read(info)), os.path.basename(info.filename))
+        image = finish(pygame.transform.scale(image, (width, height)))
+        self.store_cached(cache_path, pygame.image.tobytes(image, "RGBA"))
+        return image
+
+    def load_cached(self, cache_path, width, height, finish=None):
+        """
+        Builds a surface from a cached pixel buffer, memory-mapped where possible.
+        Returns None if the cached file is unusable.
+        """
+        finish = finish or convert
+        expected_size = width * height * 4
+        with open(cache_path, "rb") as file:
+            if os.fstat(file.fileno()).st_size != expected_size:
+                return None
+            try:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                buffer = file.read()
+
+            raw = pygame.image.frombuffer(buffer, (width, height), "RGBA")
+            image = finish(raw)
+            if image is raw:
+                # The surface still points into the buffer, so it needs its own pixels
+                image = raw.copy()
+            del raw
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+        return image
+
+    def store_cached(self, cache_path, pixels):
+        """
+        Writes a pixel buffer to the cache. A failed write only costs a decode next time.
+        """
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = cache_path + ".tmp"
+            with open(temp_path, "wb") as file:
+                file.write(pixels)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"Could not write asset cache {cache_path}: {e}")
+
+
+def convert(image):
+    """
+    Converts an image to the display's pixel format, if a display exists.
+    """
+    if pygame.display.get_surface() is None:
+        return image
+    return image.convert_alpha()
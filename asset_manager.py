@@ -0,0 +1,168 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from asset_loader import convert
+
+
+def surface_bytes(surface):
+    """
+    Bytes of pixel memory a surface shows (a subsurface counts its own area only).
+    """
+    return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+
+class AssetManager:
+    """
+    Decoded surfaces held within a memory budget.
+
+    Every surface is counted at its pixel size. Assets registered with a
+    loader can be evicted: when the resident total goes over the budget,
+    the least recently used ones are dropped (a battle background that
+    wasn't drawn since the last battle goes first) and loaded again the
+    next time they are needed. prefetch() starts that reload on a worker
+    thread ahead of use, so get() only has to load on the spot when a
+    prediction missed. Surfaces added without a loader, and pinned ones,
+    are never evicted.
+
+    A load that fails is reported and not tried again until the asset is
+    registered or added again; get() returns None for it meanwhile. Adding
+    a surface drops any load of that name still in flight, so a prefetch
+    finishing late can't replace it.
+
+    Loaders run on the worker and return unconverted surfaces; the
+    conversion to the display format happens on the main thread, in
+    update() or get().
+    """
+
+    def __init__(self, budget_bytes, workers=1):
+        self.budget_bytes = budget_bytes
+        self.loaders = {}          # Name -> function returning an unconverted surface
+        self.pinned = set()
+        self.resident = OrderedDict()  # Name -> surface, least recently used first
+        self.sizes = {}            # Name -> bytes of the resident surface
+        self.resident_bytes = 0
+        self.loading = {}          # Name -> future of a load in flight
+        self.failed = set()        # Names whose last load raised
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="asset-manager")
+        self.hits = 0
+        self.misses = 0            # get() calls that had to load (or wait for a load)
+        self.prefetches = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def register(self, name, load, pinned=False):
+        """
+        Registers an asset that load() can (re)load. It's loaded on first use or prefetch.
+        """
+        self.loaders[name] = load
+        self.failed.discard(name)
+        if pinned:
+            self.pinned.add(name)
+
+    def add(self, name, surface, pinned=False):
+        """
+        Makes an already loaded surface resident, replacing any surface of the same name.
+        """
+        future = self.loading.pop(name, None)
+        if future is not None:
+            future.cancel()
+        self.failed.discard(name)
+        self.insert(name, surface)
+        if pinned:
+            self.pinned.add(name)
+
+    def insert(self, name, surface):
+        self.discard(name)
+        self.resident[name] = surface
+        self.sizes[name] = surface_bytes(surface)
+        self.resident_bytes += self.sizes[name]
+        self.enforce_budget(keep=name)
+
+    def discard(self, name):
+        if name in self.resident:
+            del self.resident[name]
+            self.resident_bytes -= self.sizes.pop(name)
+
+    def get(self, name):
+        """
+        Returns the surface of an asset, loading it now if it isn't resident,
+        or None if it can't be loaded.
+        """
+        surface = self.resident.get(name)
+        if surface is not None:
+            self.resident.move_to_end(name)
+            self.hits += 1
+            return surface
+
+        if name in self.failed:
+            return None
+        self.misses += 1
+        future = self.loading.pop(name, None)
+        try:
+            surface = future.result() if future is not None else self.loaders[name]()
+        except Exception as e:
+            print(f"Could not load asset {name}: {e}")
+            self.failed.add(name)
+            return None
+        surface = convert(surface)
+        self.insert(name, surface)
+        return surface
+
+    def prefetch(self, name):
+        """
+        Starts loading an asset on the worker unless it's resident or already loading.
+        A resident asset is marked as used, so it isn't the next one evicted.
+        """
+        if name in self.resident:
+            self.resident.move_to_end(name)
+        elif name not in self.loading and name not in self.failed:
+            self.loading[name] = self.executor.submit(self.loaders[name])
+            self.prefetches += 1
+
+    def update(self):
+        """
+        Makes finished loads resident. Called once a frame; never blocks.
+        """
+        for name in [name for name, future in self.loading.items() if future.done()]:
+            future = self.loading.pop(name)
+            try:
+                surface = future.result()
+            except Exception as e:
+                print(f"Could not load asset {name}: {e}")
+                self.failed.add(name)
+                continue
+            self.insert(name, convert(surface))
+
+    def enforce_budget(self, keep=None):
+        """
+        Evicts least recently used assets until the resident total fits the budget.
+        """
+        for name in list(self.resident):
+            if self.resident_bytes <= self.budget_bytes:
+                break
+            if name == keep or name in self.pinned or name not in self.loaders:
+                continue
+            self.evicted_bytes += self.sizes[name]
+            self.evictions += 1
+            self.discard(name)
+
+    def stats(self):
+        return {
+            "budget_bytes": self.budget_bytes,
+            "resident_bytes": self.resident_bytes,
+            "resident": len(self.resident),
+            "loading": len(self.loading),
+            "hits": self.hits,
+            "misses": self.misses,
+            "prefetches": self.prefetches,
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes
+        }
+
+    def summary_lines(self):
+        return [
+            f"Assets: {self.resident_bytes / 1e6:.1f}/{self.budget_bytes / 1e6:.1f} MB, {len(self.resident)} resident",
+            f"Misses: {self.misses}  Evictions: {self.evictions}  Loading: {len(self.loading)}"
+        ]
+
+    def stop(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
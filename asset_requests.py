@@ -0,0 +1,125 @@
+import asyncio
+import base64
+import io
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+import pygame
+from asset_loader import convert
+from generate_image import CACHE_DIR, cache_key, write_base64_image
+
+# Size asked from the image service; results are scaled down to their footprint anyway
+REQUEST_SIZE = "256x256"
+
+PLACEHOLDER_COLOR = (255, 0, 255, 96)  # Translucent magenta while a variant is on its way
+
+
+class AssetRequestQueue:
+    """
+    Generates new sprite and background variants while the game runs.
+
+    request() hands the prompt to a worker pool and returns at once. The
+    workers call the image client, write the result to the generate_image
+    cache (so the same prompt is never paid for twice) and decode and scale
+    it to every size the caller asked for. update(), called once a frame,
+    only converts the finished surfaces and hands them to their callback,
+    so the frame loop never waits on the network, a decode or the disk.
+
+    client is anything with an async create(prompt, n, size) returning
+    base64 images, such as generate_image.HTTPImageClient pointed at the
+    local stub server.
+    """
+
+    def __init__(self, client, workers=2, cache_dir=CACHE_DIR, max_per_frame=2):
+        self.client = client
+        self.cache_dir = cache_dir
+        self.max_per_frame = max_per_frame
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="asset-request")
+        self.done = queue.Queue()  # (key, surfaces or None, error), filled by the workers
+        self.pending = {}          # Key -> (on_ready, on_error) of the request in flight
+        self.placeholders = {}     # Size -> placeholder surface
+        self.completed = 0
+        self.failed = 0
+
+    def placeholder(self, width, height):
+        """
+        Returns the shared placeholder surface of a size.
+        """
+        size = (width, height)
+        surface = self.placeholders.get(size)
+        if surface is None:
+            surface = pygame.Surface(size, pygame.SRCALPHA)
+            surface.fill(PLACEHOLDER_COLOR)
+            pygame.draw.rect(surface, PLACEHOLDER_COLOR[:3], surface.get_rect(), 2)
+            self.placeholders[size] = convert(surface)
+            surface = self.placeholders[size]
+        return surface
+
+    def request(self, key, prompt, sizes, on_ready, on_error=None):
+        """
+        Starts generating an image for prompt, scaled to each (width, height) in sizes.
+
+        on_ready(surfaces) is called from update() with one converted surface
+        per size, or on_error(exception) if generation failed. Returns False
+        if a request for the same key is still running.
+        """
+        if key in self.pending:
+            return False
+        self.pending[key] = (on_ready, on_error)
+        self.executor.submit(self.generate, key, prompt, tuple(sizes))
+        return True
+
+    def generate(self, key, prompt, sizes):
+        """
+        Worker side of a request: fetch (or reuse), decode and scale.
+        """
+        try:
+            path = os.path.join(self.cache_dir, f"{cache_key(prompt, REQUEST_SIZE, 1)}_0.png")
+            if os.path.exists(path):
+                with open(path, "rb") as image_file:
+                    data = image_file.read()
+            else:
+                image_data = asyncio.run(self.client.create(prompt, 1, REQUEST_SIZE))[0]
+                os.makedirs(self.cache_dir, exist_ok=True)
+                write_base64_image(image_data, path)
+                data = base64.b64decode(image_data)
+            image = pygame.image.load(io.BytesIO(data), "variant.png")
+            if image.get_bitsize() not in (24, 32):
+                # smoothscale needs 24 or 32 bit pixels; widen paletted images without touching the display
+                widened = pygame.Surface(image.get_size(), pygame.SRCALPHA)
+                widened.blit(image, (0, 0))
+                image = widened
+            surfaces = [pygame.transform.smoothscale(image, size) for size in sizes]
+            self.done.put((key, surfaces, None))
+        except Exception as e:
+            self.done.put((key, None, e))
+
+    def update(self):
+        """
+        Converts and delivers up to max_per_frame finished requests and returns
+        how many it delivered. Never blocks.
+        """
+        delivered = 0
+        for _ in range(self.max_per_frame):
+            try:
+                key, surfaces, error = self.done.get_nowait()
+            except queue.Empty:
+                break
+            on_ready, on_error = self.pending.pop(key)
+            if error is not None:
+                self.failed += 1
+                print(f"Could not generate {key}: {error}")
+                if on_error is not None:
+                    on_error(error)
+                delivered += 1
+                continue
+            self.completed += 1
+            on_ready([convert(surface) for surface in surfaces])
+            delivered += 1
+        return delivered
+
+    def stop(self):
+        """
+        Drops the queued requests; ones already running finish in the background.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,162 @@
+import io
+import json
+import math
+import os
+import sys
+import pygame
+from asset_loader import AssetLoader, convert
+
+# Directory the built atlases go to (python atlas.py builds them up front)
+ATLAS_DIR = r"./atlas"
+
+# Sprite name -> base name of its image in the archives
+SPRITES = {
+    "player": "mainguy",
+    "common": "Gobby-4",
+    "tough": "Skelly-2",
+    "elite": "KING CROC-2",
+    "boss": "Dragon #2-2"
+}
+
+# Resolution tiers, lowest first: (tier, file name suffix, pixels per 2 cells of its coarsest sprite).
+# The boss covers 4x4 cells, so its 80 px (ld) and 230 px (hd) images count as 40 and 115.
+TIERS = (
+    ("ld", ".png", 40),
+    ("hd", "_hd.png", 115)
+)
+
+PADDING = 1  # Empty pixels between packed sprites, so scaling never bleeds neighbours in
+
+
+def choose_tier(drawn_size, display_scale=1.0):
+    """
+    Returns the lowest tier in which no sprite is scaled up when a 2x2-cell
+    sprite is drawn drawn_size physical pixels wide. When no tier is that
+    sharp, returns the highest one, whose sprites are scaled up the least:
+    the 150 px battle sprites (300 px for the boss) come from the hd tier,
+    enlarged by the frame cache, since there is no larger source art.
+    """
+    for tier, suffix, sprite_size in TIERS:
+        if sprite_size >= drawn_size * display_scale:
+            return tier
+    return TIERS[-1][0]
+
+
+def sprite_path(name, tier):
+    suffix = next(suffix for tier_name, suffix, sprite_size in TIERS if tier_name == tier)
+    return f"./images/{SPRITES[name]}{suffix}"
+
+
+def atlas_paths(tier, atlas_dir=ATLAS_DIR):
+    return os.path.join(atlas_dir, f"sprites_{tier}.png"), os.path.join(atlas_dir, f"sprites_{tier}.json")
+
+
+def source_versions(loader, tier):
+    """
+    Returns the CRC of every source image of a tier (None for loose files), to detect stale atlases.
+    """
+    versions = {}
+    for name in SPRITES:
+        entry = loader.find(sprite_path(name, tier))
+        versions[name] = entry[1].CRC if entry is not None else None
+    return versions
+
+
+def pack(sizes):
+    """
+    Shelf-packs rectangles. sizes maps names to (width, height); returns
+    (rects, (atlas width, atlas height)) with rects mapping names to (x, y, w, h).
+    """
+    area = sum((width + PADDING) * (height + PADDING) for width, height in sizes.values())
+    max_width = max(max(width for width, height in sizes.values()), int(math.sqrt(area) * 1.3))
+
+    rects = {}
+    x = y = shelf_height = atlas_width = 0
+    # Tallest first, so each shelf wastes little height
+    for name in sorted(sizes, key=lambda name: sizes[name][1], reverse=True):
+        width, height = sizes[name]
+        if x and x + width > max_width:
+            y += shelf_height + PADDING
+            x = shelf_height = 0
+        rects[name] = (x, y, width, height)
+        x += width + PADDING
+        shelf_height = max(shelf_height, height)
+        atlas_width = max(atlas_width, x - PADDING)
+    return rects, (atlas_width, y + shelf_height)
+
+
+def build(tier, loader, atlas_dir=ATLAS_DIR):
+    """
+    Packs every sprite of a tier into one image and writes it with its rect index.
+    Returns (atlas surface, rects).
+    """
+    images = {}
+    for name in SPRITES:
+        path = sprite_path(name, tier)
+        images[name] = pygame.image.load(io.BytesIO(loader.read_bytes(path)), os.path.basename(path))
+    rects, size = pack({name: image.get_size() for name, image in images.items()})
+
+    atlas = pygame.Surface(size, pygame.SRCALPHA)
+    for name, image in images.items():
+        atlas.blit(image, rects[name][:2])
+
+    image_path, index_path = atlas_paths(tier, atlas_dir)
+    try:
+        os.makedirs(atlas_dir, exist_ok=True)
+        pygame.image.save(atlas, image_path)
+        with open(index_path, "w") as index_file:
+            json.dump({"tier": tier, "sprites": rects, "sources": source_versions(loader, tier)}, index_file, indent=2)
+    except (OSError, pygame.error) as e:
+        print(f"Could not write sprite atlas {image_path}: {e}")
+    return atlas, rects
+
+
+class SpriteAtlas:
+    """
+    All sprites of one resolution tier in a single image.
+
+    Loading a tier opens and decodes one file instead of one per sprite, and
+    every sprite is a subsurface of it, so nothing is copied or rescaled at
+    load time. If the built atlas is missing or older than the images in the
+    archives, it is rebuilt on the spot.
+    """
+
+    def __init__(self, tier, loader=None, atlas_dir=ATLAS_DIR):
+        self.tier = tier
+        loader = loader or AssetLoader()
+        image_path, index_path = atlas_paths(tier, atlas_dir)
+
+        atlas = None
+        if os.path.exists(image_path) and os.path.exists(index_path):
+            with open(index_path) as index_file:
+                index = json.load(index_file)
+            if index.get("sources") == source_versions(loader, tier):
+                atlas = pygame.image.load(image_path)
+                rects = index["sprites"]
+        if atlas is None:
+            atlas, rects = build(tier, loader, atlas_dir)
+
+        self.image = convert(atlas)
+        self.sprites = {name: self.image.subsurface(rect) for name, rect in rects.items()}
+
+    def sprite(self, name):
+        return self.sprites[name]
+
+
+def main(argv=None):
+    """
+    Builds the atlas of every tier (python atlas.py).
+    """
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.init()
+    loader = AssetLoader()
+    for tier, suffix, sprite_size in TIERS:
+        atlas, rects = build(tier, loader)
+        print(f"{atlas_paths(tier)[0]}: {atlas.get_width()}x{atlas.get_height()}, {len(rects)} sprites")
+    loader.close()
+    pygame.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
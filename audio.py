@@ -0,0 +1,136 @@
+import queue
+import threading
+import pygame
+
+
+class AudioManager:
+    """
+    Music and sound effects without loading anything on the main thread.
+
+    Tracks and effects are decoded into pygame Sounds on a worker thread.
+    play_music() only records the switch request; update(), called once a
+    frame, starts it as soon as the track is decoded, fading the old track
+    out on one of two music channels while the new one fades in on the
+    other. Hit effects play on a small pool of reserved channels.
+
+    Decoded tracks live in memory (roughly 10 MB per minute of stereo audio).
+    """
+
+    def __init__(self, crossfade_ms=800, effect_channels=4):
+        self.crossfade_ms = crossfade_ms
+        self.sounds = {}        # Path -> decoded Sound
+        self.requested = set()  # Paths queued for decoding (or already decoded)
+        self.failed = set()     # Paths that could not be decoded
+        self.effects = {}       # Effect name -> path
+        self.lock = threading.Lock()
+        self.load_queue = queue.Queue()
+        self.switch_queue = queue.Queue()  # Music switch requests, applied by update()
+        self.current_music = None
+        self.pending_music = None
+
+        # Two channels for crossfading music, the rest for effects
+        pygame.mixer.set_num_channels(2 + effect_channels)
+        pygame.mixer.set_reserved(2 + effect_channels)
+        self.music_channels = [pygame.mixer.Channel(0), pygame.mixer.Channel(1)]
+        self.active_music_channel = 0
+        self.effect_channels = [pygame.mixer.Channel(2 + i) for i in range(effect_channels)]
+        self.next_effect_channel = 0
+
+        self.worker = threading.Thread(target=self.load_worker, name="audio-loader", daemon=True)
+        self.worker.start()
+
+    def load_worker(self):
+        """
+        Decodes queued files until stop() is called.
+        """
+        while True:
+            path = self.load_queue.get()
+            if path is None:
+                break
+            try:
+                sound = pygame.mixer.Sound(path)
+            except (pygame.error, FileNotFoundError) as e:
+                print(f"Error loading audio file {path}: {e}")
+                with self.lock:
+                    self.failed.add(path)
+                continue
+            with self.lock:
+                self.sounds[path] = sound
+
+    def preload(self, *paths):
+        """
+        Queues files for decoding on the worker thread.
+        """
+        for path in paths:
+            with self.lock:
+                if path in self.requested:
+                    continue
+                self.requested.add(path)
+            self.load_queue.put(path)
+
+    def load_effect(self, name, path):
+        self.effects[name] = path
+        self.preload(path)
+
+    def play_music(self, track):
+        """
+        Requests a switch to track. Never blocks; update() applies it.
+        """
+        self.preload(track)
+        self.switch_queue.put(track)
+
+    def update(self):
+        """
+        Applies queued music switches whose tracks are ready. Call once per frame.
+        """
+        while not self.switch_queue.empty():
+            self.pending_music = self.switch_queue.get_nowait()
+        if self.pending_music is None:
+            return
+        if self.pending_music == self.current_music:
+            self.pending_music = None
+            return
+
+        with self.lock:
+            loaded = self.pending_music in self.sounds
+            failed = self.pending_music in self.failed
+        if loaded:
+            self.crossfade(self.pending_music)
+        elif failed or not self.worker.is_alive():
+            self.pending_music = None
+
+    def crossfade(self, track):
+        """
+        Fades the current track out while track fades in on the other music channel.
+        """
+        with self.lock:
+            sound = self.sounds[track]
+        self.music_channels[self.active_music_channel].fadeout(self.crossfade_ms)
+        self.active_music_channel = 1 - self.active_music_channel
+        self.music_channels[self.active_music_channel].play(sound, loops=-1, fade_ms=self.crossfade_ms)
+        self.current_music = track
+        self.pending_music = None
+
+    def play_effect(self, name):
+        """
+        Plays an effect on an idle pooled channel, cutting off the oldest one if all are busy.
+        """
+        with self.lock:
+            sound = self.sounds.get(self.effects.get(name))
+        if sound is None:
+            return  # Not loaded (yet)
+
+        for channel in self.effect_channels:
+            if not channel.get_busy():
+                channel.play(sound)
+                return
+        channel = self.effect_channels[self.next_effect_channel]
+        self.next_effect_channel = (self.next_effect_channel + 1) % len(self.effect_channels)
+        channel.play(sound)
+
+    def stop(self):
+        """
+        Stops the worker thread and all audio.
+        """
+        self.load_queue.put(None)
+        pygame.mixer.stop()
@@ -0,0 +1,253 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import game_engine
+
+# Balance tables: for every (player level, enemy type, strategy), simulate
+# many battles with the rules of game_engine.battle_turn() and report the
+# win rate, the turns a win takes and the damage taken.
+#
+# The game's combat has no dice, so with the default --variance 0 a fixed
+# strategy always plays out the same way and only the "random" strategy
+# spreads. --variance V rolls every hit within +-V of its nominal damage to
+# see how fragile a tuning is.
+
+STRATEGIES = ("basic", "special", "cautious", "random")
+
+# Action codes used inside the vectorized battles
+BASIC, SPECIAL, DEFEND, USE_ITEM = range(4)
+ENGINE_ACTIONS = {
+    BASIC: game_engine.BASIC_ATTACK,
+    SPECIAL: game_engine.SPECIAL_ATTACK,
+    DEFEND: game_engine.DEFEND,
+    USE_ITEM: game_engine.USE_ITEM
+}
+
+MAX_TURNS = 1000  # Battles still running after this many turns count as losses
+SHARD_SIZE = 250_000  # Battles per worker task
+
+
+def player_at_level(level):
+    """
+    Returns a fresh GameState whose player has levelled up to `level` with the game's own rules.
+    """
+    state = game_engine.GameState()
+    for _ in range(level - 1):
+        game_engine.player_level_up(state)
+    return state
+
+
+def roll(nominal, count, variance, rng):
+    """
+    Returns `count` damage values within +-variance of nominal (all nominal when variance is 0).
+    """
+    if not variance:
+        return np.full(count, nominal, dtype=np.int32)
+    return np.rint(nominal * rng.uniform(1 - variance, 1 + variance, count)).astype(np.int32)
+
+
+def choose_actions(strategy, health, mana, potions, enemy_attack, rng):
+    """
+    Returns the action code each battle plays this turn.
+    """
+    count = len(health)
+    if strategy == "basic":
+        return np.full(count, BASIC)
+    if strategy == "random":
+        return rng.integers(0, 4, count)
+    actions = np.where(mana >= game_engine.SPECIAL_ATTACK_COST, SPECIAL, BASIC)
+    if strategy == "cautious":
+        # Drink a potion when the next hit could be the last one
+        actions[(health <= enemy_attack) & (potions > 0)] = USE_ITEM
+    return actions
+
+
+def simulate(level, enemy_type, strategy, count, variance=0.0, seed=None):
+    """
+    Plays `count` battles side by side and returns their summed results:
+    (battles, wins, turns of the won battles, damage taken, potions used).
+    """
+    rng = np.random.default_rng(seed)
+    player = player_at_level(level)
+    stats = game_engine.ENEMY_TYPES[enemy_type]
+
+    health = np.full(count, player.player_health, dtype=np.int32)
+    mana = np.full(count, player.player_mana, dtype=np.int32)
+    potions = np.full(count, player.potions, dtype=np.int32)
+    enemy_health = np.full(count, stats["health"], dtype=np.int32)
+    turns = np.zeros(count, dtype=np.int32)
+    damage_taken = np.zeros(count, dtype=np.int64)
+    won = np.zeros(count, dtype=bool)
+    active = np.arange(count)
+
+    for _ in range(MAX_TURNS):
+        if not len(active):
+            break
+        h, m, p, e = health[active], mana[active], potions[active], enemy_health[active]
+        n = len(active)
+        actions = choose_actions(strategy, h, m, p, stats["attack"], rng)
+
+        # A special attack without mana or a potion without potions does nothing and costs no turn
+        played = ~(((actions == SPECIAL) & (m < game_engine.SPECIAL_ATTACK_COST)) |
+                   ((actions == USE_ITEM) & (p <= 0)))
+
+        # Player's move
+        damage = roll(player.player_damage, n, variance, rng)
+        damage[actions == SPECIAL] += game_engine.SPECIAL_ATTACK_BONUS
+        attacking = played & ((actions == BASIC) | (actions == SPECIAL))
+        e = e - np.where(attacking, damage, 0)
+        m = m - np.where(played & (actions == SPECIAL), game_engine.SPECIAL_ATTACK_COST, 0)
+        drinking = played & (actions == USE_ITEM)
+        h = np.where(drinking, np.minimum(h + game_engine.POTION_HEAL, player.player_max_health), h)
+        p = p - drinking
+
+        # Enemy's answer, if it survived
+        hit = roll(stats["attack"], n, variance, rng)
+        hit[actions == DEFEND] //= game_engine.DEFEND_DIVISOR
+        hit = np.where(played & (e > 0), hit, 0)
+        h = h - hit
+
+        health[active], mana[active], potions[active], enemy_health[active] = h, m, p, e
+        turns[active] += played
+        damage_taken[active] += hit
+
+        # Same order as the game: the player dying ends the battle first
+        lost = h <= 0
+        won[active[~lost & (e <= 0)]] = True
+        active = active[~lost & (e > 0)]
+
+    wins = int(won.sum())
+    return (count, wins, int(turns[won].sum()), int(damage_taken.sum()),
+            int((player.potions - potions).sum()))
+
+
+def simulate_shard(task):
+    return task, simulate(*task)
+
+
+def check_against_engine(level, enemy_type, strategy):
+    """
+    Plays one battle through game_engine.step() and one through simulate(), and
+    checks they agree. Only meaningful for strategies without randomness.
+    """
+    state = player_at_level(level)
+    game_engine.add_enemy(state, enemy_type, 0, 0)
+    state.battle_mode = True
+    state.current_enemy = 0
+    turns = 0
+    damage_taken = 0
+    for _ in range(MAX_TURNS):
+        action = int(choose_actions(strategy, np.array([state.player_health]), np.array([state.player_mana]),
+                                    np.array([state.potions]), game_engine.ENEMY_TYPES[enemy_type]["attack"], None)[0])
+        health_before = state.player_health
+        events = game_engine.step(state, ENGINE_ACTIONS[action])
+        if game_engine.OUT_OF_MANA in events or game_engine.NO_POTIONS in events:
+            continue
+        turns += 1
+        won = game_engine.ENEMY_DEFEATED in events or game_engine.VICTORY in events
+        if game_engine.HEALED in events:
+            health_before = min(health_before + game_engine.POTION_HEAL, state.player_max_health)
+        if not won:
+            # A beaten enemy doesn't hit back (and a level up refills the health)
+            damage_taken += health_before - state.player_health
+        if not state.battle_mode or state.game_over:
+            break
+
+    battles, wins, win_turns, simulated_damage, potions_used = simulate(level, enemy_type, strategy, 1)
+    return wins == int(won) and (not won or win_turns == turns) and simulated_damage == damage_taken
+
+
+def run(levels, enemy_types, strategies, battles, variance=0.0, workers=None, seed=0):
+    """
+    Simulates every combination, sharded across worker processes, and returns the table rows.
+    """
+    seeds = np.random.SeedSequence(seed)
+    tasks = []
+    for level in levels:
+        for enemy_type in enemy_types:
+            for strategy in strategies:
+                remaining = battles
+                while remaining > 0:
+                    shard = min(remaining, SHARD_SIZE)
+                    tasks.append((level, enemy_type, strategy, shard, variance, seeds.spawn(1)[0]))
+                    remaining -= shard
+
+    totals = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for task, result in executor.map(simulate_shard, tasks):
+            key = task[:3]
+            previous = totals.get(key, (0, 0, 0, 0, 0))
+            totals[key] = tuple(a + b for a, b in zip(previous, result))
+
+    rows = []
+    for (level, enemy_type, strategy), (count, wins, win_turns, damage_taken, potions_used) in totals.items():
+        rows.append({
+            "level": level,
+            "enemy": enemy_type,
+            "strategy": strategy,
+            "battles": count,
+            "win_rate": wins / count,
+            "turns_to_win": win_turns / wins if wins else None,
+            "damage_taken": damage_taken / count,
+            "potions_used": potions_used / count
+        })
+    return rows
+
+
+def write_rows(rows, path):
+    """
+    Writes the table as JSON if path ends in .json, as CSV otherwise ("-" is stdout).
+    """
+    output = sys.stdout if path == "-" else open(path, "w", newline="")
+    try:
+        if path.endswith(".json"):
+            json.dump(rows, output, indent=2)
+        else:
+            writer = csv.DictWriter(output, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo balance tables for enemies, leveling and battle strategies.")
+    parser.add_argument("--max-level", type=int, default=10, help="Simulate player levels 1 to this")
+    parser.add_argument("--enemy", action="append", choices=list(game_engine.ENEMY_TYPES), help="Only these enemy types")
+    parser.add_argument("--strategy", action="append", choices=STRATEGIES, help="Only these strategies")
+    parser.add_argument("--battles", type=int, default=100_000, help="Battles per combination")
+    parser.add_argument("--variance", type=float, default=0.0, help="Roll each hit within +-this fraction of its damage")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="-", help="Output file, .json for JSON and CSV otherwise (default: stdout)")
+    parser.add_argument("--check", action="store_true", help="Check the simulation against game_engine.step() first")
+    args = parser.parse_args(argv)
+
+    levels = range(1, args.max_level + 1)
+    enemy_types = args.enemy or list(game_engine.ENEMY_TYPES)
+    strategies = args.strategy or list(STRATEGIES)
+
+    if args.check:
+        for level in levels:
+            for enemy_type in enemy_types:
+                for strategy in strategies:
+                    if strategy != "random" and not check_against_engine(level, enemy_type, strategy):
+                        print(f"Simulation disagrees with the game: level {level}, {enemy_type}, {strategy}", file=sys.stderr)
+                        return 1
+
+    start = time.perf_counter()
+    rows = run(levels, enemy_types, strategies, args.battles, args.variance, args.workers, args.seed)
+    elapsed = time.perf_counter() - start
+    write_rows(rows, args.output)
+    total = sum(row["battles"] for row in rows)
+    print(f"Simulated {total} battles in {elapsed:.2f} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
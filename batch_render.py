@@ -0,0 +1,414 @@
+import os
+
+# Render without a display or a sound card (must be set before pygame is imported)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import io
+import json
+import multiprocessing
+import random
+import struct
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pygame
+import game_engine
+import Test
+
+# Offscreen batch rendering: every state description is drawn by Test's own
+# draw_frame() (the battle screen or the overworld branch) into the hidden
+# display surface, saved as a PNG and, when golden images are given,
+# compared against its golden image with a perceptual diff.
+#
+# A state description is a JSON object:
+#   name            file name of the frame, without any directory (default: frame_<index>)
+#   seed            enemy placement of game_engine.new_game() (default 0), used when "enemies" is missing
+#   enemies         list of {"type", "x", "y", "health", "scale", "shake"}; health defaults to full,
+#                   scale (pulse scale factor) to 1.0 and shake (ticks of hit shake left) to 0
+#   current_enemy   index of the enemy in battle, or null for the overworld
+#   player_scale    pulse scale factor of the player (default 1.0)
+#   shake_phase     seed of the shake offsets, so shaking frames render the same every time (default 0)
+# plus any of the player fields of game_engine.GameState (sprite_x, sprite_y,
+# facing_right, player_health, player_mana, player_xp, potions, ...).
+#
+# Work is split into chunks of CHUNK_FRAMES frames fanned out to worker
+# processes; every worker opens its hidden window and loads the assets once.
+
+PLAYER_FIELDS = (
+    "sprite_x", "sprite_y", "facing_right",
+    "player_health", "player_max_health", "player_damage",
+    "player_mana", "player_max_mana",
+    "player_xp", "xp_needed", "player_level", "potions",
+    "mana_warning"
+)
+
+CHUNK_FRAMES = 32  # Frames per worker task
+
+# Perceptual diff: frames are compared as blurred luminance, so sub-pixel
+# shifts and colour noise below what the eye would notice don't count
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)  # Rec. 601
+PERCEPTIBLE_DELTA = 8.0  # Luminance difference (0-255) a pixel needs to count as changed
+DIFF_TOLERANCE = 0.001   # Fraction of changed pixels a frame may have and still pass
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_LEVEL = 1  # zlib level of the written frames; higher levels barely shrink the busy backgrounds further
+PNG_UP = 2  # PNG filter type: each row stored as its difference from the row above
+
+DIFF_DIM = 0.3               # Brightness of the golden image under a diff image's highlights
+DIFF_COLOR = (255, 0, 0)     # Changed pixels in diff images
+
+
+def init_worker():
+    """
+    Opens the hidden window and loads every asset, once per process.
+    """
+    Test.state = game_engine.new_game(seed=0, chase=False)
+    Test.init_game()
+
+
+def build_state(description):
+    """
+    Returns a GameState matching a state description.
+    """
+    state = game_engine.new_game(seed=description.get("seed", 0), chase=False)
+    if "enemies" in description:
+        state.enemies.clear()
+        for enemy in description["enemies"]:
+            index = game_engine.add_enemy(state, enemy["type"], enemy["x"], enemy["y"])
+            if "health" in enemy:
+                state.enemies.health[index] = enemy["health"]
+            state.enemies.anim_scale[index] = enemy.get("scale", 1.0)
+            state.enemies.shake[index] = enemy.get("shake", 0)
+    enemies = state.enemies
+    enemies.anim_previous_scale[:] = enemies.anim_scale
+
+    for field in PLAYER_FIELDS:
+        if field in description:
+            setattr(state, field, description[field])
+    game_engine.place_player(state, state.sprite_x, state.sprite_y)  # Drawn on the cell, not on the way there
+    current_enemy = description.get("current_enemy")
+    if current_enemy is not None:
+        if not 0 <= current_enemy < len(enemies):
+            raise ValueError(f"current_enemy {current_enemy} out of range (there are {len(enemies)} enemies)")
+        state.battle_mode = True
+        state.current_enemy = current_enemy
+    return state
+
+
+def describe(state, name=None, player_scale=1.0, shake_phase=0):
+    """
+    Returns the state description of a GameState (the inverse of build_state()).
+    """
+    enemies = state.enemies
+    description = {} if name is None else {"name": name}
+    for field in PLAYER_FIELDS:
+        description[field] = getattr(state, field)
+    description["enemies"] = [
+        {"type": enemies.type_name(i), "x": int(enemies.x[i]), "y": int(enemies.y[i]),
+         "health": int(enemies.health[i]), "scale": float(enemies.anim_scale[i]), "shake": int(enemies.shake[i])}
+        for i in range(len(enemies))
+    ]
+    description["current_enemy"] = state.current_enemy if state.battle_mode else None
+    description["player_scale"] = player_scale
+    description["shake_phase"] = shake_phase
+    return description
+
+
+def random_descriptions(count, seed=0):
+    """
+    Returns count varied state descriptions: a third of them battles, the
+    rest the overworld around random free cells, with random animation
+    phases and shakes. The same seed always gives the same descriptions.
+    """
+    rng = random.Random(seed)
+    descriptions = []
+    for i in range(count):
+        state = game_engine.new_game(seed=rng.randrange(2 ** 32), chase=False)
+        enemies = state.enemies
+        while True:
+            state.sprite_x = rng.randrange(state.grid_size - 1)
+            state.sprite_y = rng.randrange(state.grid_size - 1)
+            if not game_engine.is_blocked(state, state.sprite_x, state.sprite_y):
+                break
+        state.facing_right = rng.random() < 0.5
+        state.player_health = rng.randint(1, state.player_max_health)
+        state.player_mana = rng.randint(0, state.player_max_mana)
+        state.player_xp = rng.randrange(state.xp_needed)
+        state.potions = rng.randint(0, game_engine.STARTING_POTIONS)
+        enemies.anim_scale[:] = [rng.uniform(Test.player_scale_min, Test.player_scale_max) for _ in range(len(enemies))]
+        enemies.shake[:] = [Test.ENEMY_SHAKE_TICKS if rng.random() < 0.2 else 0 for _ in range(len(enemies))]
+        if rng.random() < 1 / 3:
+            state.battle_mode = True
+            state.current_enemy = rng.randrange(len(enemies))
+            enemies.health[state.current_enemy] = rng.randint(1, int(enemies.health[state.current_enemy]))
+        descriptions.append(describe(state, f"random_{seed}_{i:05d}",
+                                     player_scale=rng.uniform(Test.player_scale_min, Test.player_scale_max),
+                                     shake_phase=rng.randrange(2 ** 16)))
+    return descriptions
+
+
+def render(description):
+    """
+    Draws a state description with the game's own drawing code and returns the screen surface.
+    """
+    Test.state = build_state(description)
+    player_scale = description.get("player_scale", 1.0)
+    Test.player_overworld_scale = Test.previous_player_overworld_scale = player_scale
+    Test.player_battle_scale = Test.previous_player_battle_scale = player_scale
+    Test.render_alpha = 1.0
+
+    # Shake offsets come from random, so seeding it makes shaking frames reproducible
+    random.seed(description.get("shake_phase", 0))
+    # Every frame is a fresh scene, so nothing of the previous one may be kept
+    Test.overworld_renderer.invalidate()
+    Test.draw_frame()
+    return Test.screen
+
+
+def frame_pixels(surface):
+    """
+    Returns the pixels of a surface as a (height, width, 3) uint8 array.
+    """
+    width, height = surface.get_size()
+    return np.frombuffer(pygame.image.tobytes(surface, "RGB"), dtype=np.uint8).reshape(height, width, 3)
+
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def write_png(pixels, path, level=PNG_LEVEL):
+    """
+    Writes a (height, width, 3) uint8 array as an 8-bit RGB PNG.
+
+    Rows are stored with the Up filter and compressed at a low zlib level
+    (see PNG_LEVEL), which is several times faster than the ~90 ms
+    pygame.image.save() spends on a frame, for a file about 10% larger.
+    """
+    height, width, _ = pixels.shape
+    flat = pixels.reshape(height, width * 3)
+    rows = np.empty((height, 1 + width * 3), dtype=np.uint8)
+    rows[:, 0] = PNG_UP
+    rows[0, 1:] = flat[0]
+    np.subtract(flat[1:], flat[:-1], out=rows[1:, 1:])  # Wraps around modulo 256, as PNG expects
+    with open(path, "wb") as png_file:
+        png_file.write(PNG_SIGNATURE)
+        png_file.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        png_file.write(png_chunk(b"IDAT", zlib.compress(rows.tobytes(), level)))
+        png_file.write(png_chunk(b"IEND", b""))
+
+
+def read_png(path):
+    """
+    Reads a PNG into a (height, width, 3) uint8 array. Files written by
+    write_png() are decoded directly; anything else goes through pygame.
+    """
+    with open(path, "rb") as png_file:
+        data = png_file.read()
+    if data[:8] == PNG_SIGNATURE and data[12:16] == b"IHDR":
+        width, height, depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", data[16:29])
+        if (depth, color_type, interlace) == (8, 2, 0):
+            idat = []
+            offset = 8
+            while offset < len(data):
+                (length,) = struct.unpack_from(">I", data, offset)
+                if data[offset + 4:offset + 8] == b"IDAT":
+                    idat.append(data[offset + 8:offset + 8 + length])
+                offset += 12 + length
+            rows = np.frombuffer(zlib.decompress(b"".join(idat)), dtype=np.uint8).reshape(height, 1 + width * 3)
+            filters = rows[:, 0]
+            if not filters.any():
+                return rows[:, 1:].reshape(height, width, 3)
+            if (filters == PNG_UP).all():
+                return np.cumsum(rows[:, 1:], axis=0, dtype=np.uint8).reshape(height, width, 3)
+    return frame_pixels(pygame.image.load(io.BytesIO(data), os.path.basename(path)))
+
+
+def luminance(pixels):
+    """
+    Returns the luminance of every pixel as a (height, width) float array.
+    """
+    return pixels.astype(np.float32) @ LUMA_WEIGHTS
+
+
+def blur(image):
+    """
+    3x3 box blur (edges repeated), done as two 3-tap passes.
+    """
+    height, width = image.shape
+    padded = np.pad(image, 1, mode="edge")
+    rows = padded[:, :width] + padded[:, 1:width + 1] + padded[:, 2:]
+    return (rows[:height] + rows[1:height + 1] + rows[2:]) / 9
+
+
+def perceptual_diff(pixels, golden, threshold=PERCEPTIBLE_DELTA):
+    """
+    Compares two frames given as pixel arrays and returns (fraction of
+    changed pixels, largest luminance difference, boolean (height, width)
+    mask of changed pixels). Frames of different sizes are entirely different.
+    """
+    if pixels.shape != golden.shape:
+        return 1.0, 255.0, None
+    if np.array_equal(pixels, golden):
+        return 0.0, 0.0, np.zeros(pixels.shape[:2], dtype=bool)  # The usual case, for a fraction of the cost
+    delta = np.abs(blur(luminance(pixels)) - blur(luminance(golden)))
+    changed = delta > threshold
+    return float(changed.mean()), float(delta.max()), changed
+
+
+def diff_image(golden, changed):
+    """
+    Returns the golden frame dimmed to grey with the changed pixels highlighted.
+    """
+    grey = (luminance(golden) * DIFF_DIM).astype(np.uint8)
+    pixels = np.repeat(grey[:, :, None], 3, axis=2)
+    pixels[changed] = DIFF_COLOR
+    return pixels
+
+
+def render_chunk(task):
+    """
+    Renders, saves and compares one chunk of frames (the worker task). Returns their report entries.
+    """
+    first, descriptions, output_dir, golden_dir, threshold, tolerance, png_level = task
+    results = []
+    for index, description in enumerate(descriptions, first):
+        name = str(description.get("name", f"frame_{index:05d}"))
+        if not name or name in (".", "..") or "/" in name or "\\" in name:
+            # Names become file names, so they must not lead out of the output directory
+            results.append({"name": name, "error": "bad state description: name must be a plain file name"})
+            continue
+        result = {"name": name, "path": os.path.join(output_dir, f"{name}.png")}
+        try:
+            pixels = frame_pixels(render(description))
+        except (KeyError, ValueError, TypeError) as e:
+            result["error"] = f"bad state description: {e}"
+            results.append(result)
+            continue
+        write_png(pixels, result["path"], png_level)
+
+        if golden_dir is not None:
+            golden_path = os.path.join(golden_dir, f"{name}.png")
+            if not os.path.exists(golden_path):
+                result["golden"] = None
+            else:
+                golden = read_png(golden_path)
+                changed_fraction, max_delta, changed = perceptual_diff(pixels, golden, threshold)
+                result["golden"] = golden_path
+                result["changed_fraction"] = changed_fraction
+                result["max_delta"] = max_delta
+                result["passed"] = changed_fraction <= tolerance
+                if not result["passed"] and changed is not None:
+                    result["diff_path"] = os.path.join(output_dir, f"{name}.diff.png")
+                    write_png(diff_image(golden, changed), result["diff_path"], png_level)
+        results.append(result)
+    return results
+
+
+def run(descriptions, output_dir, golden_dir=None, workers=None,
+        threshold=PERCEPTIBLE_DELTA, tolerance=DIFF_TOLERANCE, png_level=PNG_LEVEL):
+    """
+    Renders every description into output_dir and returns the report entries, in order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(first, descriptions[first:first + CHUNK_FRAMES], output_dir, golden_dir, threshold, tolerance, png_level)
+             for first in range(0, len(descriptions), CHUNK_FRAMES)]
+
+    # Loading once here also rebuilds stale sprite atlases and asset caches
+    # before the workers start, so they never race to write them
+    init_worker()
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) == 1:
+        chunks = map(render_chunk, tasks)
+        return [result for chunk in chunks for result in chunk]
+
+    # Spawned rather than forked, since this process already opened a window
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), initializer=init_worker,
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        return [result for chunk in executor.map(render_chunk, tasks) for result in chunk]
+
+
+def load_descriptions(paths):
+    """
+    Reads state descriptions from JSON files, each holding one description or a list of them.
+    """
+    descriptions = []
+    for path in paths:
+        with open(path) as description_file:
+            data = json.load(description_file)
+        descriptions.extend(data if isinstance(data, list) else [data])
+    return descriptions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Renders game states offscreen and diffs them against golden images.")
+    parser.add_argument("states", nargs="*", help="JSON files of state descriptions")
+    parser.add_argument("--random", type=int, default=0, metavar="N", help="Also render N random states")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random states")
+    parser.add_argument("--output", default=r"./renders", help="Directory for the rendered frames and the report")
+    parser.add_argument("--golden", help="Directory of golden frames to compare against")
+    parser.add_argument("--update-golden", action="store_true", help="Render straight into --golden instead of comparing")
+    parser.add_argument("--allow-missing", action="store_true", help="Don't fail frames that have no golden image yet")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--threshold", type=float, default=PERCEPTIBLE_DELTA,
+                        help="Luminance difference (0-255) at which a pixel counts as changed")
+    parser.add_argument("--tolerance", type=float, default=DIFF_TOLERANCE,
+                        help="Fraction of changed pixels a frame may have and still pass")
+    parser.add_argument("--png-level", type=int, default=PNG_LEVEL, choices=range(10),
+                        help="zlib level of the written PNGs (higher is smaller and much slower)")
+    parser.add_argument("--dump-states", help="Write the state descriptions to this JSON file and exit")
+    args = parser.parse_args(argv)
+
+    descriptions = load_descriptions(args.states) + random_descriptions(args.random, args.seed)
+    if not descriptions:
+        parser.error("no states to render (give state files or --random N)")
+    if args.dump_states:
+        with open(args.dump_states, "w") as states_file:
+            json.dump(descriptions, states_file, indent=2)
+        return 0
+    if args.update_golden and not args.golden:
+        parser.error("--update-golden needs --golden")
+
+    output_dir, golden_dir = args.output, args.golden
+    if args.update_golden:
+        output_dir, golden_dir = args.golden, None
+
+    start = time.perf_counter()
+    results = run(descriptions, output_dir, golden_dir, args.workers, args.threshold, args.tolerance, args.png_level)
+    elapsed = time.perf_counter() - start
+
+    errors = [result for result in results if "error" in result]
+    failed = [result for result in results if result.get("passed") is False]
+    missing = [result for result in results if golden_dir is not None and result.get("golden", "") is None]
+    report = {
+        "frames": len(results),
+        "seconds": elapsed,
+        "golden": golden_dir,
+        "threshold": args.threshold,
+        "tolerance": args.tolerance,
+        "errors": len(errors),
+        "failed": len(failed),
+        "missing_golden": len(missing),
+        "results": results
+    }
+    with open(os.path.join(output_dir, "report.json"), "w") as report_file:
+        json.dump(report, report_file, indent=2)
+
+    print(f"Rendered {len(results)} frames in {elapsed:.2f} s ({len(results) / elapsed:.0f} frames/s) into {output_dir}")
+    for result in errors:
+        print(f"{result['name']}: {result['error']}", file=sys.stderr)
+    for result in failed:
+        print(f"{result['name']}: {result['changed_fraction']:.2%} of pixels changed"
+              + (f", see {result['diff_path']}" if "diff_path" in result else " (size differs)"), file=sys.stderr)
+    if missing:
+        print(f"{len(missing)} frames have no golden image (render them with --update-golden)", file=sys.stderr)
+    # A wrong --golden directory would otherwise pass every frame without comparing any
+    return 1 if errors or failed or (missing and not args.allow_missing) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
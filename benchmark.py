@@ -0,0 +1,269 @@
+import os
+
+# Run without a display or a sound card (must be set before pygame is imported)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import array
+import json
+import random
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pygame
+import game_engine
+import Test
+
+# Default location of the stored baseline (create it with --save-baseline)
+BASELINE_FILE = r"./benchmark_baseline.json"
+
+BENCH_SEED = 1234      # Enemy placement seed, so every run sees the same map
+DEFAULT_FRAMES = 600   # Frames per overworld scenario
+ATTACK_INTERVAL = 15   # Frames between two attacks in battle scenarios
+MEMORY_FRAMES = 200    # Frames of the memory run of each scenario
+
+
+class Scenario:
+    """
+    A scripted session: setup() prepares Test.state, keys(frame) returns the
+    keys pressed on that frame, and the run stops after `frames` frames or
+    once done() returns True.
+    """
+
+    def __init__(self, name, setup, keys=None, frames=DEFAULT_FRAMES, done=None):
+        self.name = name
+        self.setup = setup
+        self.keys = keys or (lambda frame: ())
+        self.frames = frames
+        self.done = done or (lambda: False)
+
+
+def new_state(chase=True):
+    state = game_engine.new_game(seed=BENCH_SEED, chase=chase)
+    Test.state = state
+    return state
+
+
+def setup_idle():
+    new_state()
+
+def setup_walls():
+    # Next to the wall block at x 10-12, y 4-6, with chasing off so nothing interrupts
+    state = new_state(chase=False)
+    game_engine.place_player(state, 8, 4)
+
+def walls_keys(frame):
+    # Push into the wall, slide along it and push again
+    return ((pygame.K_RIGHT, pygame.K_RIGHT, pygame.K_DOWN, pygame.K_RIGHT, pygame.K_UP)[frame % 5],)
+
+def setup_battle(enemy_type):
+    def setup():
+        state = new_state(chase=False)
+        state.player_health = state.player_max_health = 10 ** 6  # Play the whole battle out
+        state.battle_mode = True
+        state.current_enemy = int(state.enemies.of_type(enemy_type)[0])
+        Test.handle_events([game_engine.BATTLE_STARTED])
+    return setup
+
+def battle_keys(frame):
+    return (pygame.K_SPACE,) if frame % ATTACK_INTERVAL == ATTACK_INTERVAL - 1 else ()
+
+def battle_done():
+    return not Test.state.battle_mode or Test.state.game_over
+
+def setup_stress(count):
+    def setup():
+        state = new_state(chase=False)
+        rng = random.Random(BENCH_SEED)
+        state.enemies.clear()
+        while len(state.enemies) < count:
+            x, y = rng.randint(4, state.grid_size - 2), rng.randint(4, state.grid_size - 2)
+            if (x, y) not in state.walls:
+                game_engine.add_enemy(state, rng.choice(("common", "tough", "elite")), x, y)
+    return setup
+
+
+def build_scenarios(frames=DEFAULT_FRAMES):
+    scenarios = [
+        Scenario("idle_overworld", setup_idle, frames=frames),
+        Scenario("walk_into_walls", setup_walls, walls_keys, frames=frames)
+    ]
+    for enemy_type in game_engine.ENEMY_TYPES:
+        scenarios.append(Scenario(f"battle_{enemy_type}", setup_battle(enemy_type), battle_keys,
+                                  frames=10 ** 6, done=battle_done))
+    for count in (200, 1000):
+        scenarios.append(Scenario(f"stress_{count}_enemies", setup_stress(count), frames=frames))
+    return scenarios
+
+
+def play(scenario, max_frames, frame_times=None):
+    """
+    Plays a scenario from its setup for up to max_frames frames and returns the frames played.
+    With frame_times given, appends each frame's duration in nanoseconds to it.
+    """
+    scenario.setup()
+    Test.overworld_renderer.invalidate()
+    frame = 0
+    while frame < max_frames and not scenario.done():
+        frame_start = time.perf_counter_ns()
+        pygame.event.pump()
+        for key in scenario.keys(frame):
+            Test.handle_key(key)
+        Test.simulation_step(frame)
+        Test.audio.update()
+        Test.draw_frame()
+        if frame_times is not None:
+            frame_times.append(time.perf_counter_ns() - frame_start)
+        frame += 1
+    return frame
+
+
+def run_scenario(scenario):
+    """
+    Runs one scenario with the frame cap removed and returns its metrics.
+
+    Timing comes from a plain run. Memory comes from a second run of at most
+    MEMORY_FRAMES frames under tracemalloc (which would distort the timings),
+    so each scenario's peak only counts what that scenario allocates.
+    """
+    frame_times = array.array("q")  # Raw integers, so recording a frame allocates no objects
+    blocks_before = sys.getallocatedblocks()
+    start = time.perf_counter()
+    frame = play(scenario, scenario.frames, frame_times)
+    elapsed = time.perf_counter() - start
+    blocks_after = sys.getallocatedblocks()
+
+    tracemalloc.start()
+    play(scenario, min(scenario.frames, MEMORY_FRAMES))
+    traced_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    frame_times = sorted(frame_times)
+    return {
+        "frames": frame,
+        "fps": frame / elapsed if elapsed else 0.0,
+        "frame_ms_p50": frame_times[len(frame_times) // 2] / 1e6 if frame_times else 0.0,
+        "frame_ms_p99": frame_times[min(len(frame_times) - 1, int(0.99 * len(frame_times)))] / 1e6 if frame_times else 0.0,
+        # Growth of the live Python memory blocks per frame: not how much a frame
+        # allocates, but how much of it stays allocated (anything above ~0 accumulates)
+        "net_blocks_per_frame": (blocks_after - blocks_before) / frame if frame else 0.0,
+        # Highest Python/NumPy memory in use during the scenario beyond what was
+        # allocated before it (SDL surface pixels aren't traced)
+        "peak_traced_mb": traced_peak / 1e6
+    }
+
+
+def reference_rate(rounds=5, seconds=0.2):
+    """
+    Returns how fast this machine runs a fixed mix of the work a frame does
+    (Python bookkeeping, small NumPy operations and a full-screen blit), in
+    rounds per second; the best of `rounds` tries, since noise only slows it.
+    Frame rates are compared relative to it, so a baseline recorded on one
+    machine holds on another.
+    """
+    surface = pygame.Surface(Test.screen.get_size())
+    values = np.arange(1000, 0, -1)
+    table = {}
+    best = 0.0
+    for _ in range(rounds):
+        done = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            for i in range(200):
+                table[i % 64] = (i, i * i)
+            np.sort(values)
+            Test.screen.blit(surface, (0, 0))
+            done += 1
+        best = max(best, done / (time.perf_counter() - start))
+    return best
+
+
+def compare(results, baseline, tolerance, rate):
+    """
+    Returns a list of regression messages (empty when everything is within tolerance).
+
+    Timings are scaled by how fast this machine ran the reference work
+    (rate) compared to the machine that recorded the baseline. Memory and
+    block counts don't depend on the speed and are compared as they are.
+    """
+    speed = rate / baseline["reference_rate"]
+    regressions = []
+    for name, metrics in results.items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            regressions.append(f"{name}: not in the baseline (re-record it with --save-baseline)")
+            continue
+        expected_fps = base["fps"] * speed
+        if metrics["fps"] < expected_fps * (1 - tolerance):
+            regressions.append(f"{name}: fps {metrics['fps']:.1f} < {expected_fps:.1f} expected from the baseline")
+        # Tail latency and allocation counts are noisy, so they get extra slack
+        expected_p99 = base["frame_ms_p99"] / speed
+        if metrics["frame_ms_p99"] > expected_p99 * (1 + 2 * tolerance) + 1.0:
+            regressions.append(f"{name}: p99 {metrics['frame_ms_p99']:.2f} ms > {expected_p99:.2f} ms expected from the baseline")
+        if metrics["net_blocks_per_frame"] > base["net_blocks_per_frame"] * (1 + tolerance) + 2:
+            regressions.append(f"{name}: {metrics['net_blocks_per_frame']:.1f} net blocks/frame > baseline {base['net_blocks_per_frame']:.1f}")
+        if metrics["peak_traced_mb"] > base["peak_traced_mb"] * (1 + tolerance) + 0.5:
+            regressions.append(f"{name}: peak traced memory {metrics['peak_traced_mb']:.1f} MB > baseline {base['peak_traced_mb']:.1f} MB")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless rendering benchmarks for the game.")
+    parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES, help="Frames per overworld scenario")
+    parser.add_argument("--scenario", action="append", help="Only run the named scenario(s)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline file to compare against")
+    parser.add_argument("--save-baseline", "--record-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--no-baseline", action="store_true", help="Only measure; don't fail when there is no baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown")
+    parser.add_argument("--output", help="Also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    Test.state = game_engine.new_game(seed=BENCH_SEED)
+    Test.init_game()
+    rate = reference_rate()
+    print(f"{'reference':24} {rate:9.1f} rounds/s")
+
+    results = {}
+    for scenario in build_scenarios(args.frames):
+        if args.scenario and scenario.name not in args.scenario:
+            continue
+        metrics = run_scenario(scenario)
+        results[scenario.name] = metrics
+        print(f"{scenario.name:24} {metrics['fps']:9.1f} fps  p50 {metrics['frame_ms_p50']:6.2f} ms  "
+              f"p99 {metrics['frame_ms_p99']:6.2f} ms  {metrics['net_blocks_per_frame']:7.1f} net blocks/frame  "
+              f"{metrics['peak_traced_mb']:7.2f} MB peak")
+
+    Test.audio.stop()
+    pygame.quit()
+
+    report = {"reference_rate": rate, "scenarios": results}
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        # A gate without a baseline would pass anything, so that takes an explicit --no-baseline
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0 if args.no_baseline else 1
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    if "reference_rate" not in baseline:
+        print(f"{args.baseline} predates the reference calibration; re-record it with --save-baseline.")
+        return 1
+    regressions = compare(results, baseline, args.tolerance, rate)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
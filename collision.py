@@ -0,0 +1,124 @@
+import math
+from pathfinding import footprint_free, occupancy_grid, region_occupancy
+
+# Passability is worked out per CHUNK x CHUNK block of positions, on first use
+CHUNK_SHIFT = 8
+CHUNK = 1 << CHUNK_SHIFT
+CHUNK_MASK = CHUNK - 1
+
+
+class PassabilityGrid:
+    """
+    Where each footprint size fits, as bitmaps with one byte per position.
+
+    fits(x, y, size) is one bounds check and one indexed read: True when a
+    size x size footprint with its top-left corner at (x, y) is on the grid
+    and touches no wall. The bitmaps come from pathfinding.footprint_free,
+    built per block on first use so a huge map costs nothing until it's walked on.
+    Blocks are flat bytearrays, which index faster from Python than NumPy
+    scalars do (and faster than the four set lookups a 2x2 check used to take).
+    set_wall() patches only the positions whose footprint covers the cell.
+
+    sweep() moves a box by a fractional amount for smooth, sub-cell motion.
+    """
+
+    def __init__(self, walls, grid_size, sizes=(2,)):
+        self.walls = walls
+        self.grid_size = grid_size
+        self.sizes = tuple(sorted(set(sizes)))
+        # Walls given as a set of cells are converted once; a WallGrid is read per block
+        self.occupancy = None if hasattr(walls, "occupancy") else occupancy_grid(walls, grid_size)
+        self.chunks = {}  # (chunk x, chunk y) -> {size: bytearray of CHUNK rows of CHUNK positions}
+
+    def region(self, x0, y0, x1, y1):
+        """
+        Returns the walls of [x0, x1) x [y0, y1); cells off the grid count as walls.
+        """
+        return region_occupancy(self.walls if self.occupancy is None else self.occupancy,
+                                self.grid_size, x0, y0, x1, y1)
+
+    def chunk(self, cx, cy):
+        bitmaps = self.chunks.get((cx, cy))
+        if bitmaps is None:
+            x0, y0 = cx * CHUNK, cy * CHUNK
+            border = self.sizes[-1] - 1
+            occupancy = self.region(x0, y0, x0 + CHUNK + border, y0 + CHUNK + border)
+            bitmaps = {size: bytearray(footprint_free(occupancy, size)[:CHUNK, :CHUNK].tobytes())
+                       for size in self.sizes}
+            self.chunks[(cx, cy)] = bitmaps
+        return bitmaps
+
+    def fits(self, x, y, size):
+        """
+        Checks whether a size x size footprint fits with its top-left corner at (x, y).
+        """
+        if x < 0 or y < 0 or x > self.grid_size - size or y > self.grid_size - size:
+            return False
+        bitmaps = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if bitmaps is None:
+            bitmaps = self.chunk(x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        return bitmaps[size][(y & CHUNK_MASK) << CHUNK_SHIFT | (x & CHUNK_MASK)] == 1
+
+    def set_wall(self, x, y, wall=True):
+        """
+        Updates the bitmaps after the cell (x, y) became a wall or stopped being one.
+        Walls given as a WallGrid must already hold the change.
+        """
+        if self.occupancy is not None and 0 <= x < self.grid_size and 0 <= y < self.grid_size:
+            self.occupancy[y, x] = wall
+        for size in self.sizes:
+            # Only footprints covering (x, y) change
+            for py in range(y - size + 1, y + 1):
+                for px in range(x - size + 1, x + 1):
+                    if px < 0 or py < 0:
+                        continue
+                    bitmaps = self.chunks.get((px >> CHUNK_SHIFT, py >> CHUNK_SHIFT))
+                    if bitmaps is None:
+                        continue  # Built with the change when first used
+                    fits = not wall and not self.region(px, py, px + size, py + size).any()
+                    bitmaps[size][(py & CHUNK_MASK) << CHUNK_SHIFT | (px & CHUNK_MASK)] = fits
+
+    def blocked(self, x0, y0, x1, y1):
+        """
+        Checks whether any cell of [x0, x1) x [y0, y1) is a wall or off the grid.
+        """
+        return bool(self.region(x0, y0, x1, y1).any())
+
+    def sweep(self, x, y, dx, dy, size):
+        """
+        Moves a size x size box with its top-left corner at (x, y) by (dx, dy)
+        (in cells, fractions allowed), stopping it flush against walls and the
+        grid edge. Returns (x, y, hit_x, hit_y).
+
+        The axes are swept one after the other, so a box moving diagonally into
+        a wall slides along it. Every cell column or row the leading edge enters
+        is checked, so no step is too large to tunnel through a wall.
+        """
+        x, hit_x = self.sweep_axis(x, y, dx, size, horizontal=True)
+        y, hit_y = self.sweep_axis(y, x, dy, size, horizontal=False)
+        return x, y, hit_x, hit_y
+
+    def sweep_axis(self, position, across, delta, size, horizontal):
+        """
+        Sweeps along one axis. across is the box's coordinate on the other axis.
+        """
+        if not delta:
+            return position, False
+        first = math.floor(across)
+        last = math.ceil(across + size)  # Exclusive
+
+        def line_blocked(cell):
+            if horizontal:
+                return self.blocked(cell, first, cell + 1, last)
+            return self.blocked(first, cell, last, cell + 1)
+
+        if delta > 0:
+            # Cells the leading edge enters, nearest first
+            for cell in range(math.ceil(position + size), math.ceil(position + size + delta)):
+                if line_blocked(cell):
+                    return cell - size, True
+        else:
+            for cell in range(math.floor(position) - 1, math.floor(position + delta) - 1, -1):
+                if line_blocked(cell):
+                    return cell + 1, True
+        return position + delta, False
@@ -0,0 +1,59 @@
+import pygame
+
+
+class DirtyRectRenderer:
+    """
+    Redraws only the screen regions that changed since the last frame.
+
+    Each frame the regions covered by last frame's sprites are restored from
+    the static background, the sprites are drawn again and registered with
+    mark(), and only the union of old and new regions is pushed to the display
+    with pygame.display.update(rects).
+
+    draw_background(area) repaints the static background over the screen
+    rect area, or over the whole screen when area is None.
+    """
+
+    def __init__(self, screen, draw_background):
+        self.screen = screen
+        self.draw_background = draw_background
+        self.previous_rects = []  # Regions drawn over during the last frame
+        self.current_rects = []   # Regions drawn over during this frame
+        self.full_redraw = True   # Repaint the whole screen on the next frame
+        self.updated_rects = None # Regions pushed by the last present(), None after a full flip
+
+    def invalidate(self):
+        """
+        Forces a full repaint on the next frame (e.g. after leaving the battle screen).
+        """
+        self.full_redraw = True
+
+    def begin_frame(self):
+        """
+        Restores the background under everything that was drawn last frame.
+        """
+        if self.full_redraw:
+            self.draw_background(None)
+        else:
+            for rect in self.previous_rects:
+                self.draw_background(rect)
+
+    def mark(self, rect):
+        """
+        Registers a region drawn over during this frame.
+        """
+        self.current_rects.append(pygame.Rect(rect))
+
+    def present(self):
+        """
+        Pushes the changed regions (or the whole screen) to the display.
+        """
+        if self.full_redraw:
+            pygame.display.flip()
+            self.full_redraw = False
+            self.updated_rects = None
+        else:
+            self.updated_rects = self.previous_rects + self.current_rects
+            pygame.display.update(self.updated_rects)
+        self.previous_rects = self.current_rects
+        self.current_rects = []
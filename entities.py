@@ -0,0 +1,166 @@
+import numpy as np
+
+
+class Column:
+    """
+    Exposes the live rows (the first `count`) of one store column as a NumPy view,
+    so reads and writes like store.health[i] -= 3 go straight to the column.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, store, owner=None):
+        if store is None:
+            return self
+        return store.columns[self.name][:store.count]
+
+    def __set__(self, store, values):
+        # Needed for in-place operators: store.x += dx assigns the result back
+        store.columns[self.name][:store.count] = values
+
+
+class EnemyStore:
+    """
+    Every enemy on the map, stored as parallel NumPy columns (struct of arrays).
+
+    An enemy is a row index. Per-enemy work (contact checks, chasing, animation)
+    runs as one array operation over all rows instead of a Python loop over
+    dicts. Removal moves the last row into the freed slot, so it's O(1) but
+    changes the index of the enemy that was last.
+
+    The animation columns belong to the renderer; the rules never read them,
+    but keeping them here means they move with their enemy on removal.
+    """
+
+    x = Column()
+    y = Column()
+    type_id = Column()
+    size = Column()
+    health = Column()
+    anim_scale = Column()           # Current pulse scale factor
+    anim_previous_scale = Column()  # Scale factor as of the previous tick, for interpolation
+    anim_direction = Column()       # 1 while growing, -1 while shrinking
+    shake = Column()                # Ticks of hit shake left
+
+    # (name, dtype, value of a new row)
+    COLUMNS = (
+        ("x", np.int32, 0),
+        ("y", np.int32, 0),
+        ("type_id", np.int8, 0),
+        ("size", np.int32, 0),
+        ("health", np.int32, 0),
+        ("anim_scale", np.float64, 1.0),
+        ("anim_previous_scale", np.float64, 1.0),
+        ("anim_direction", np.int8, 1),
+        ("shake", np.int16, 0)
+    )
+
+    def __init__(self, type_sizes, capacity=64):
+        """
+        type_sizes maps each enemy type name to its width/height in cells.
+        """
+        self.type_names = tuple(type_sizes)
+        self.type_ids = {name: i for i, name in enumerate(self.type_names)}
+        self.type_sizes = np.array([type_sizes[name] for name in self.type_names], dtype=np.int32)
+        self.count = 0
+        self.columns = {name: np.full(capacity, default, dtype=dtype) for name, dtype, default in self.COLUMNS}
+
+    def __len__(self):
+        return self.count
+
+    def add(self, enemy_type, x, y, health):
+        """
+        Appends an enemy and returns its index.
+        """
+        if self.count == len(self.columns["x"]):
+            self.grow()
+        index = self.count
+        self.count += 1
+        for name, dtype, default in self.COLUMNS:
+            self.columns[name][index] = default
+        type_id = self.type_ids[enemy_type]
+        self.x[index] = x
+        self.y[index] = y
+        self.type_id[index] = type_id
+        self.size[index] = self.type_sizes[type_id]
+        self.health[index] = health
+        return index
+
+    def grow(self):
+        """
+        Doubles the capacity of every column.
+        """
+        for name, dtype, default in self.COLUMNS:
+            old = self.columns[name]
+            column = np.full(max(2 * len(old), 1), default, dtype=dtype)
+            column[:self.count] = old[:self.count]
+            self.columns[name] = column
+
+    def remove(self, index):
+        """
+        Removes the enemy at index by moving the last enemy into its slot.
+        """
+        last = self.count - 1
+        if index != last:
+            for column in self.columns.values():
+                column[index] = column[last]
+        self.count = last
+
+    def add_many(self, enemy_type, xs, ys, health):
+        """
+        Appends one enemy of the given type at each (xs[i], ys[i]), all at the same health.
+        """
+        start = self.count
+        end = start + len(xs)
+        while len(self.columns["x"]) < end:
+            self.grow()
+        for name, dtype, default in self.COLUMNS:
+            self.columns[name][start:end] = default
+        type_id = self.type_ids[enemy_type]
+        self.count = end
+        self.x[start:] = xs
+        self.y[start:] = ys
+        self.type_id[start:] = type_id
+        self.size[start:] = self.type_sizes[type_id]
+        self.health[start:] = health
+
+    def assign(self, xs, ys, type_ids, healths):
+        """
+        Replaces every enemy with the given columns, without a per-enemy loop.
+        """
+        count = len(xs)
+        self.count = 0
+        while len(self.columns["x"]) < count:
+            self.grow()
+        for name, dtype, default in self.COLUMNS:
+            self.columns[name][:count] = default
+        self.count = count
+        self.x = xs
+        self.y = ys
+        self.type_id = type_ids
+        self.size = self.type_sizes[type_ids]
+        self.health = healths
+
+    def clear(self):
+        self.count = 0
+
+    def type_name(self, index):
+        return self.type_names[self.type_id[index]]
+
+    def of_type(self, enemy_type):
+        """
+        Returns the indices of every enemy of the given type.
+        """
+        return np.flatnonzero(self.type_id == self.type_ids[enemy_type])
+
+    def first_overlap(self, x, y, size):
+        """
+        Returns the index of the first enemy overlapping the size x size
+        square at (x, y), or None.
+        """
+        ex = self.x
+        ey = self.y
+        overlap = (x < ex + self.size) & (x + size > ex) & (y < ey + self.size) & (y + size > ey)
+        hits = np.flatnonzero(overlap)
+        return int(hits[0]) if len(hits) else None
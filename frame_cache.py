@@ -0,0 +1,54 @@
+import pygame
+from collections import OrderedDict
+
+
+class FrameCache:
+    """
+    Bounded cache of pre-scaled (and pre-flipped) sprite frames.
+
+    The breathing animation only moves the scale factors between
+    player_scale_min and player_scale_max, so a sprite only ever shows up
+    at a handful of pixel sizes. Each (sprite, size, facing) frame is
+    resampled once and then reused; the least recently used frames are
+    evicted when the cache is full.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.frames = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sprite_key, image, size, flip=False):
+        """
+        Returns image scaled to (size, size), flipped horizontally if requested.
+        sprite_key identifies the source image (e.g. "player" or an enemy type).
+        """
+        key = (sprite_key, size, flip)
+        frame = self.frames.get(key)
+        if frame is not None:
+            # Mark as most recently used
+            self.frames.move_to_end(key)
+            self.hits += 1
+            return frame
+
+        self.misses += 1
+        frame = pygame.transform.scale(image, (size, size))
+        if flip:
+            frame = pygame.transform.flip(frame, True, False)
+        self.frames[key] = frame
+
+        # Evict the least recently used frames
+        while len(self.frames) > self.max_entries:
+            self.frames.popitem(last=False)
+        return frame
+
+    def invalidate(self, sprite_key):
+        """
+        Drops every cached frame of the given sprite (e.g. after its image changed).
+        """
+        for key in [key for key in self.frames if key[0] == sprite_key]:
+            del self.frames[key]
+
+    def clear(self):
+        self.frames.clear()
@@ -0,0 +1,433 @@
+import random
+import numpy as np
+from collision import PassabilityGrid
+from entities import EnemyStore
+from pathfinding import FlowField
+
+# Game rules: movement, enemy collision, battle turns and leveling.
+# Nothing in here touches the display, the mixer or any asset, so the rules
+# can be stepped headless (balance testing, servers) as fast as Python allows.
+
+# Constants
+GRID_SIZE = 32     # Grid is 32x32
+PLAYER_SIZE = 2    # The player occupies 2x2 cells
+GLIDE_SPEED = 0.25  # Cells per tick the drawn player moves toward the player's cell
+CHASE_RADIUS = 12  # Enemies within this many cells of the player chase them
+
+# Enemy data
+ENEMY_TYPES = {
+    "common": {"health": 10, "attack": 2, "xp": 5},
+    "tough": {"health": 20, "attack": 4, "xp": 10},
+    "elite": {"health": 30, "attack": 6, "xp": 20},
+    "boss": {"health": 50, "attack": 10, "xp": 100}
+}
+
+# Battle rules
+SPECIAL_ATTACK_COST = 3   # Mana used by a special attack
+SPECIAL_ATTACK_BONUS = 2  # Extra damage dealt by a special attack
+DEFEND_DIVISOR = 2        # Defending divides the enemy's attack by this
+POTION_HEAL = 10          # Health restored by a potion
+STARTING_POTIONS = 3
+
+# Level up rules
+LEVEL_UP_XP = 5           # Extra XP needed for each new level
+LEVEL_UP_HEALTH = 10
+LEVEL_UP_MANA = 5
+LEVEL_UP_DAMAGE = 2
+
+# Walls, grouped as (x range, y range)
+wall_groups = [
+    (range(10, 13), range(4, 7)),
+    (range(23, 27), range(11, 15)),
+    (range(20, 24), range(16, 20)),
+    (range(16, 19), range(18, 21)),
+    (range(10, 14), range(21, 24)),
+    (range(9, 12), range(29, 32)),
+    (range(20, 23), range(28, 32)),
+    (range(18, 20), range(0, 8)),
+    (range(20, 27), range(7, 9)),
+    (range(29, 33), range(7, 9)),
+    (range(1, 5), range(21, 24))
+]
+
+# Actions accepted by step()
+UP = "up"
+DOWN = "down"
+LEFT = "left"
+RIGHT = "right"
+BASIC_ATTACK = "basic_attack"
+SPECIAL_ATTACK = "special_attack"
+RUN_AWAY = "run_away"
+DEFEND = "defend"
+USE_ITEM = "use_item"  # Drink a potion
+TICK = "tick"  # Time passes: chasing enemies take one step
+
+MOVES = {
+    UP: (0, -1),
+    DOWN: (0, 1),
+    LEFT: (-1, 0),
+    RIGHT: (1, 0)
+}
+
+# Events returned by step()
+MOVED = "moved"
+ENEMIES_MOVED = "enemies_moved"
+BATTLE_STARTED = "battle_started"
+ENEMY_HIT = "enemy_hit"
+OUT_OF_MANA = "out_of_mana"
+DEFENDED = "defended"
+HEALED = "healed"
+NO_POTIONS = "no_potions"
+RAN_AWAY = "ran_away"
+ENEMY_DEFEATED = "enemy_defeated"
+LEVEL_UP = "level_up"
+VICTORY = "victory"
+DEFEAT = "defeat"
+
+
+class GameState:
+    """
+    Everything the rules need to know about a running game.
+    """
+
+    __slots__ = (
+        "grid_size", "walls", "enemies", "flow_field", "passability",
+        "sprite_x", "sprite_y", "player_x", "player_y", "facing_right",
+        "player_health", "player_max_health", "player_damage",
+        "player_mana", "player_max_mana",
+        "player_xp", "xp_needed", "player_level", "potions",
+        "battle_mode", "current_enemy", "mana_warning",
+        "game_over", "victory"
+    )
+
+    def __init__(self, grid_size=GRID_SIZE):
+        self.grid_size = grid_size
+        self.walls = set()
+        self.enemies = new_enemy_store()
+        self.flow_field = None  # Shared pathfinding field, None when enemies don't chase
+        self.passability = None  # PassabilityGrid of the walls, built on the first move (see passability())
+
+        # Sprite position (grid coordinates)
+        self.sprite_x, self.sprite_y = 0, 0
+        # Where the player is drawn, in fractions of a cell: follows the sprite position (see glide_player())
+        self.player_x, self.player_y = 0.0, 0.0
+        self.facing_right = True
+
+        # Battle variables
+        self.player_health = 20
+        self.player_max_health = 20
+        self.player_damage = 3
+        self.player_mana = 10
+        self.player_max_mana = 10
+        self.player_xp = 0
+        self.xp_needed = 5
+        self.player_level = 1
+        self.potions = STARTING_POTIONS
+        self.battle_mode = False
+        self.current_enemy = None  # Index of the enemy in battle
+        self.mana_warning = False
+
+        # Set once the boss is beaten (victory) or the player dies
+        self.game_over = False
+        self.victory = False
+
+
+def enemy_size(enemy_type):
+    """
+    Returns the width/height in cells of the given enemy type.
+    """
+    return 4 if enemy_type == "boss" else 2
+
+
+def new_enemy_store():
+    return EnemyStore({enemy_type: enemy_size(enemy_type) for enemy_type in ENEMY_TYPES})
+
+
+def add_enemy(state, enemy_type, x, y):
+    """
+    Adds an enemy at full health and returns its index.
+    """
+    return state.enemies.add(enemy_type, x, y, ENEMY_TYPES[enemy_type]["health"])
+
+
+def build_walls(groups=wall_groups):
+    """
+    Expands the grouped wall ranges into a set of (x, y) cells.
+    """
+    walls = set()
+    for wx_range, wy_range in groups:
+        for wx in wx_range:
+            for wy in wy_range:
+                walls.add((wx, wy))
+    return walls
+
+
+def free_cells(state, x_range, y_range):
+    """
+    Returns the cells of the given ranges that aren't walls.
+    """
+    return [(x, y) for x in x_range for y in y_range if (x, y) not in state.walls]
+
+
+def spawn_enemies(state, rng):
+    """
+    Places the enemies on the default map. Spawns are drawn from the free
+    cells of each area, so every area gets its full count.
+    """
+    grid_size = state.grid_size
+
+    # Common enemies: 1-14 tiles to the right, 16-18 tiles down
+    for ex, ey in rng.sample(free_cells(state, range(1, 15), range(16, 19)), 4):
+        add_enemy(state, "common", ex, ey)
+
+    # Tough enemies: 6-16 tiles from the left, 24-27 tiles down
+    for ex, ey in rng.sample(free_cells(state, range(6, 17), range(grid_size - 8, grid_size - 4)), 3):
+        add_enemy(state, "tough", ex, ey)
+
+    # Elite enemies: 28-31 tiles from the left, 10-21 tiles up from bottom
+    for ex, ey in rng.sample(free_cells(state, range(grid_size - 4, grid_size), range(grid_size - 22, grid_size - 10)), 2):
+        add_enemy(state, "elite", ex, ey)
+
+    # Boss enemy: 26 tiles to the right, 3 tiles down
+    add_enemy(state, "boss", 26, 3)
+
+
+def new_game(seed=None, chase=True):
+    """
+    Creates the default map with freshly spawned enemies.
+    The same seed always produces the same enemy placement.
+    With chase=False enemies stand still and TICK does nothing but check for contact.
+    """
+    state = GameState()
+    state.walls = build_walls()
+    spawn_enemies(state, random.Random(seed))
+    if chase:
+        enable_chase(state)
+    return state
+
+
+def enable_chase(state):
+    """
+    Builds the shared flow field that lets enemies chase the player around the walls.
+    """
+    sizes = {enemy_size(enemy_type) for enemy_type in ENEMY_TYPES}
+    state.flow_field = FlowField(state.walls, state.grid_size, CHASE_RADIUS, PLAYER_SIZE, sizes)
+
+
+def step(state, action):
+    """
+    Advances the game by one player action and returns the list of events it caused.
+
+    In the overworld, movement actions move the player, TICK moves the chasing
+    enemies and any action checks for contact with an enemy. In battle, the
+    battle actions play one turn.
+    """
+    events = []
+    if state.game_over:
+        return events
+
+    if state.battle_mode:
+        if action in (BASIC_ATTACK, SPECIAL_ATTACK, RUN_AWAY, DEFEND, USE_ITEM):
+            battle_turn(state, action, events)
+        return events
+
+    if action in MOVES:
+        move_player(state, action, events)
+    elif action == TICK and state.flow_field is not None:
+        move_enemies(state, events)
+    check_enemy_collision(state, events)
+    return events
+
+
+def passability(state):
+    """
+    Returns the state's PassabilityGrid, building it from the walls the first time.
+    Change walls with set_wall() afterwards, so it stays in sync.
+    """
+    if state.passability is None:
+        # Only the player moves through it; chasing enemies get their footprints from the flow field
+        state.passability = PassabilityGrid(state.walls, state.grid_size, (PLAYER_SIZE,))
+    return state.passability
+
+
+def is_blocked(state, x, y):
+    """
+    Checks whether the player's footprint at (x, y) is off the grid or hits a wall.
+    """
+    return not passability(state).fits(x, y, PLAYER_SIZE)
+
+
+def set_wall(state, x, y, wall=True):
+    """
+    Adds (or with wall=False removes) a wall cell, updating movement and chasing incrementally.
+    """
+    walls = state.walls
+    if hasattr(walls, "set"):
+        walls.set(x, y, wall)
+    elif wall:
+        walls.add((x, y))
+    else:
+        walls.discard((x, y))
+    if state.passability is not None:
+        state.passability.set_wall(x, y, wall)
+    if state.flow_field is not None:
+        state.flow_field.set_wall(x, y, wall)
+
+
+def place_player(state, x, y):
+    """
+    Puts the player on the cell (x, y) at once, without gliding there.
+    """
+    state.sprite_x, state.sprite_y = x, y
+    state.player_x, state.player_y = x, y
+
+
+def glide_player(state):
+    """
+    Moves where the player is drawn GLIDE_SPEED cells closer to the player's
+    cell, so tile steps show as smooth motion. Called once a tick.
+
+    The box is swept through the walls, so after quick steps around a corner it
+    slides along the wall instead of cutting across it. When it's more than two
+    steps behind (a loaded game) or can't get any closer (a wall was added in
+    the way), it's put on the cell at once.
+    """
+    x, y = state.player_x, state.player_y
+    gap_x, gap_y = state.sprite_x - x, state.sprite_y - y
+    if not gap_x and not gap_y:
+        return
+    if abs(gap_x) + abs(gap_y) > 2:
+        place_player(state, state.sprite_x, state.sprite_y)
+        return
+    dx = min(max(gap_x, -GLIDE_SPEED), GLIDE_SPEED)
+    dy = min(max(gap_y, -GLIDE_SPEED), GLIDE_SPEED)
+    x, y, _, _ = passability(state).sweep(x, y, dx, dy, PLAYER_SIZE)
+    if (x, y) == (state.player_x, state.player_y):
+        x, y = state.sprite_x, state.sprite_y  # Boxed in
+    state.player_x, state.player_y = x, y
+
+
+def move_player(state, action, events):
+    dx, dy = MOVES[action]
+    x = state.sprite_x + dx
+    y = state.sprite_y + dy
+    if is_blocked(state, x, y):
+        return
+    state.sprite_x, state.sprite_y = x, y
+    if dx:
+        state.facing_right = dx > 0
+    events.append(MOVED)
+
+
+def move_enemies(state, events):
+    """
+    Moves every enemy near the player one step down the shared flow field.
+    """
+    flow_field = state.flow_field
+    enemies = state.enemies
+
+    # Only enemies inside the field's window chase, so without any there is nothing to compute
+    radius = flow_field.radius
+    if not ((np.abs(enemies.x - state.sprite_x) <= radius) & (np.abs(enemies.y - state.sprite_y) <= radius)).any():
+        return
+    flow_field.update(state.sprite_x, state.sprite_y)  # No-op unless the player moved
+
+    dx, dy = flow_field.next_steps(enemies.x, enemies.y, enemies.size)
+    enemies.x += dx
+    enemies.y += dy
+    if dx.any() or dy.any():
+        events.append(ENEMIES_MOVED)
+
+
+def check_enemy_collision(state, events):
+    """
+    Starts a battle with the first enemy overlapping the player.
+    """
+    enemy = state.enemies.first_overlap(state.sprite_x, state.sprite_y, PLAYER_SIZE)
+    if enemy is not None:
+        state.battle_mode = True
+        state.current_enemy = enemy
+        state.facing_right = True  # Player always faces right in battle mode
+        events.append(BATTLE_STARTED)
+
+
+def battle_turn(state, action, events):
+    """
+    Plays the player's action and the enemy's answer.
+    """
+    enemies = state.enemies
+    enemy = state.current_enemy
+    enemy_type = enemies.type_name(enemy)
+    enemy_stats = ENEMY_TYPES[enemy_type]
+
+    if action == BASIC_ATTACK:
+        enemies.health[enemy] -= state.player_damage
+        events.append(ENEMY_HIT)
+    elif action == SPECIAL_ATTACK:
+        if state.player_mana < SPECIAL_ATTACK_COST:
+            state.mana_warning = True
+            events.append(OUT_OF_MANA)
+            return
+        enemies.health[enemy] -= state.player_damage + SPECIAL_ATTACK_BONUS
+        state.player_mana -= SPECIAL_ATTACK_COST
+        events.append(ENEMY_HIT)
+    elif action == DEFEND:
+        events.append(DEFENDED)
+    elif action == USE_ITEM:
+        if state.potions <= 0:
+            events.append(NO_POTIONS)
+            return
+        state.potions -= 1
+        state.player_health = min(state.player_health + POTION_HEAL, state.player_max_health)
+        events.append(HEALED)
+    elif action == RUN_AWAY:
+        state.battle_mode = False
+        state.current_enemy = None
+        events.append(RAN_AWAY)
+        return
+
+    # Enemy's turn to attack
+    if enemies.health[enemy] > 0:
+        if action == DEFEND:
+            state.player_health -= enemy_stats["attack"] // DEFEND_DIVISOR
+        else:
+            state.player_health -= enemy_stats["attack"]
+
+    # Check if battle is over
+    if state.player_health <= 0:
+        state.game_over = True
+        state.victory = False
+        events.append(DEFEAT)
+        return
+
+    if enemies.health[enemy] <= 0:
+        state.player_xp += enemy_stats["xp"]
+        if enemy_type == "boss":
+            state.game_over = True
+            state.victory = True
+            events.append(VICTORY)
+            return
+
+        enemies.remove(enemy)
+        state.battle_mode = False
+        state.current_enemy = None
+        events.append(ENEMY_DEFEATED)
+
+        # Level up check
+        if state.player_xp >= state.xp_needed:
+            player_level_up(state)
+            events.append(LEVEL_UP)
+
+
+def player_level_up(state):
+    """
+    Handles player leveling up.
+    """
+    state.player_level += 1
+    state.player_xp = 0
+    state.xp_needed += LEVEL_UP_XP
+    state.player_max_health += LEVEL_UP_HEALTH
+    state.player_max_mana += LEVEL_UP_MANA
+    state.player_damage += LEVEL_UP_DAMAGE
+    state.player_health = state.player_max_health
+    state.player_mana = state.player_max_mana
@@ -1,9 +1,32 @@
-import openai
+import argparse
+import asyncio
 import base64
+import hashlib
+import json
+import os
+import random
+import struct
+import tempfile
+import time
+import urllib.request
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Only needed for the OpenAI client; the game imports this module for its cache and HTTP client
+try:
+    import openai
+except ImportError:
+    openai = None
 
 # Set your OpenAI API key
 #openai.api_key = ''
 
+# Default cache for batch generation, keyed by a hash of (prompt, size, n)
+CACHE_DIR = r"./generated_cache"
+
+# Base64 characters decoded per chunk when writing images (a multiple of 4)
+DECODE_CHUNK = 64 * 1024
+
 
 def generate_image(prompt, output_file="generated_image.png"):
     """
@@ -25,14 +48,241 @@ def generate_image(prompt, output_file="generated_image.png"):
         image_data = response["data"][0]["b64_json"]
 
         # Decode the image and save it to a file
-        with open(output_file, "wb") as image_file:
-            image_file.write(base64.b64decode(image_data))
+        write_base64_image(image_data, output_file)
 
         print(f"Image successfully generated and saved as '{output_file}'.")
     except Exception as e:
         print(f"Error generating image: {e}")
 
 
+def write_base64_image(image_data, output_file):
+    """
+    Decodes base64 image data chunk by chunk into output_file.
+    The file only appears once it is complete; concurrent writers of the
+    same file each use their own temporary file, so the last one wins whole.
+    """
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(output_file) or ".", suffix=".tmp", delete=False) as image_file:
+        try:
+            for start in range(0, len(image_data), DECODE_CHUNK):
+                image_file.write(base64.b64decode(image_data[start:start + DECODE_CHUNK]))
+        except BaseException:
+            image_file.close()
+            os.remove(image_file.name)
+            raise
+    os.replace(image_file.name, output_file)
+
+
+class OpenAIImageClient:
+    """
+    Image client backed by OpenAI's API. The blocking call runs in a worker thread.
+    """
+
+    async def create(self, prompt, n, size):
+        if openai is None:
+            raise RuntimeError("The openai package is not installed (or use an HTTP image server)")
+        response = await asyncio.to_thread(
+            openai.Image.create,
+            prompt=prompt,
+            n=n,
+            size=size,
+            response_format="b64_json"
+        )
+        return [item["b64_json"] for item in response["data"]]
+
+
+class HTTPImageClient:
+    """
+    Image client for any server speaking the same JSON as the images endpoint,
+    such as the local stub started with --stub-server.
+    """
+
+    def __init__(self, url, timeout=60):
+        self.url = url
+        self.timeout = timeout
+
+    def post(self, prompt, n, size):
+        body = json.dumps({"prompt": prompt, "n": n, "size": size, "response_format": "b64_json"}).encode()
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.load(response)
+
+    async def create(self, prompt, n, size):
+        response = await asyncio.to_thread(self.post, prompt, n, size)
+        return [item["b64_json"] for item in response["data"]]
+
+
+def cache_key(prompt, size, n):
+    return hashlib.sha256(json.dumps([prompt, size, n]).encode()).hexdigest()
+
+
+async def generate_one(client, prompt, size, n, cache_dir, semaphore, retries, backoff):
+    """
+    Generates (or fetches from the cache) the images for one prompt.
+    Returns a result dict with the file paths, latency and any error.
+    """
+    key = cache_key(prompt, size, n)
+    paths = [os.path.join(cache_dir, f"{key}_{i}.png") for i in range(n)]
+    result = {"prompt": prompt, "files": paths, "cached": False, "attempts": 0, "latency": 0.0, "error": None}
+
+    # Content-addressed cache: the same request never costs a second call
+    if all(os.path.exists(path) for path in paths):
+        result["cached"] = True
+        return result
+
+    async with semaphore:
+        start = time.perf_counter()
+        for attempt in range(retries + 1):
+            result["attempts"] = attempt + 1
+            try:
+                images = await client.create(prompt, n, size)
+                if len(images) < n:
+                    raise ValueError(f"expected {n} images, got {len(images)}")
+                for image_data, path in zip(images, paths):
+                    await asyncio.to_thread(write_base64_image, image_data, path)
+                result["error"] = None
+                break
+            except Exception as e:
+                result["error"] = str(e)
+                if attempt < retries:
+                    # Exponential backoff with jitter
+                    await asyncio.sleep(backoff * 2 ** attempt + random.uniform(0, backoff))
+        result["latency"] = time.perf_counter() - start
+    return result
+
+
+async def generate_images(prompts, size="512x512", n=1, client=None, cache_dir=CACHE_DIR,
+                          concurrency=8, retries=3, backoff=0.5):
+    """
+    Generates images for many prompts concurrently.
+
+    At most `concurrency` requests are in flight at once and failed requests
+    are retried up to `retries` times. Returns (results, summary).
+    """
+    if client is None:
+        client = OpenAIImageClient()
+    os.makedirs(cache_dir, exist_ok=True)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # Duplicate prompts share one request: both would miss the cache and be billed otherwise
+    unique_prompts = list(dict.fromkeys(prompts))
+    start = time.perf_counter()
+    unique_results = await asyncio.gather(*[
+        generate_one(client, prompt, size, n, cache_dir, semaphore, retries, backoff)
+        for prompt in unique_prompts
+    ])
+    elapsed = time.perf_counter() - start
+
+    # One result per prompt given; repeats are reported as served from the first one
+    by_prompt = dict(zip(unique_prompts, unique_results))
+    results = []
+    seen = set()
+    for prompt in prompts:
+        result = by_prompt[prompt]
+        if prompt in seen:
+            result = dict(result, cached=True, attempts=0, latency=0.0)
+        seen.add(prompt)
+        results.append(result)
+    return results, summarize(results, elapsed)
+
+
+def generate_images_batch(prompts, **kwargs):
+    """
+    Blocking wrapper around generate_images().
+    """
+    return asyncio.run(generate_images(prompts, **kwargs))
+
+
+def summarize(results, elapsed):
+    """
+    Throughput and latency figures for a batch.
+    """
+    generated = [r for r in results if not r["cached"] and r["error"] is None]
+    latencies = sorted(r["latency"] for r in results if not r["cached"])
+
+    def percentile(p):
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+    return {
+        "prompts": len(results),
+        "generated": len(generated),
+        "cached": sum(r["cached"] for r in results),
+        "failed": sum(r["error"] is not None for r in results),
+        "retries": sum(max(r["attempts"] - 1, 0) for r in results),
+        "elapsed_s": elapsed,
+        "prompts_per_s": len(results) / elapsed if elapsed else 0.0,
+        "latency_p50_s": percentile(50),
+        "latency_p95_s": percentile(95),
+        "latency_max_s": latencies[-1] if latencies else 0.0
+    }
+
+
+def placeholder_png(width=8, height=8, color=(255, 0, 255, 255)):
+    """
+    Builds a small solid-color RGBA PNG without any imaging library.
+    """
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    row = b"\x00" + bytes(color) * width  # Filter type 0, then the pixels
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(row * height))
+            + chunk(b"IEND", b""))
+
+
+def run_stub_server(port=8765):
+    """
+    Serves fake image responses on localhost, so batches can run without network access.
+    Every request gets n copies of a tiny PNG.
+    """
+    png = base64.b64encode(placeholder_png()).decode()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            body = json.dumps({"data": [{"b64_json": png}] * request.get("n", 1)}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    print(f"Stub image server listening on http://127.0.0.1:{port}/")
+    server.serve_forever()
+
+
 if __name__ == "__main__":
-    prompt = "A fantasy warrior in a vibrant forest, detailed and cinematic"
-    generate_image(prompt)
+    parser = argparse.ArgumentParser(description="Generate images with DALL·E.")
+    parser.add_argument("prompt", nargs="?", default="A fantasy warrior in a vibrant forest, detailed and cinematic")
+    parser.add_argument("--batch", help="File with one prompt per line, generated concurrently")
+    parser.add_argument("--size", default="512x512")
+    parser.add_argument("--n", type=int, default=1, help="Images per prompt")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--url", help="Use an HTTP image server (e.g. the stub) instead of OpenAI")
+    parser.add_argument("--stub-server", type=int, metavar="PORT", help="Run the local stub server")
+    args = parser.parse_args()
+
+    if args.stub_server:
+        run_stub_server(args.stub_server)
+    elif args.batch:
+        with open(args.batch) as prompt_file:
+            prompts = [line.strip() for line in prompt_file if line.strip()]
+        client = HTTPImageClient(args.url) if args.url else OpenAIImageClient()
+        results, summary = generate_images_batch(
+            prompts, size=args.size, n=args.n, client=client, cache_dir=args.cache_dir,
+            concurrency=args.concurrency, retries=args.retries
+        )
+        for result in results:
+            if result["error"]:
+                print(f"Error generating image for '{result['prompt']}': {result['error']}")
+        print(json.dumps(summary, indent=2))
+    else:
+        generate_image(args.prompt)
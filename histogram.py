@@ -0,0 +1,24 @@
+from collections import deque
+
+
+class RollingHistogram:
+    """
+    Keeps the most recent `window` samples and answers percentile queries on them.
+    """
+
+    def __init__(self, window=600):
+        self.samples = deque(maxlen=window)
+
+    def add(self, value):
+        self.samples.append(value)
+
+    def percentile(self, p):
+        if not self.samples:
+            return 0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def mean(self):
+        if not self.samples:
+            return 0
+        return sum(self.samples) / len(self.samples)
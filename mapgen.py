@@ -0,0 +1,210 @@
+import argparse
+import random
+import struct
+import sys
+import time
+import numpy as np
+import game_engine
+from pathfinding import footprint_free
+
+# Map file layout: a header, then the wall bitmap with one bit per cell,
+# packed row by row (each row padded to whole bytes, least significant bit
+# first). A 4096x4096 map is 2 MB on disk and, memory-mapped, in memory.
+MAGIC = b"GMAP"
+VERSION = 1
+HEADER = struct.Struct("<4sHII")  # Magic, version, width, height
+
+START_CLEARING = 6  # Cells kept free around the player's start in the top-left corner
+
+# Enemies of the default 32x32 map; generated maps get the same density
+DEFAULT_SPAWNS = {"common": 4, "tough": 3, "elite": 2, "boss": 1}
+
+BAND_ROWS = 256  # Map rows unpacked at a time, so counting and placing never build whole-map arrays
+
+
+class WallGrid:
+    """
+    Walls as a bit-packed [y, x] bitmap.
+
+    Works as a drop-in for the set of (x, y) wall cells: `(x, y) in walls`
+    is a single byte lookup and iteration yields the wall cells. occupancy()
+    and cells_in() give the renderer and the pathfinding array access without
+    going through Python tuples.
+    """
+
+    def __init__(self, packed, width, height):
+        self.packed = packed  # uint8 [height, ceil(width / 8)], possibly a read-only memmap
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def from_occupancy(cls, occupancy):
+        height, width = occupancy.shape
+        return cls(np.packbits(occupancy, axis=1, bitorder="little"), width, height)
+
+    def __contains__(self, cell):
+        x, y = cell
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return False
+        return bool(self.packed[y, x >> 3] >> (x & 7) & 1)
+
+    def __len__(self):
+        return sum(int(self.occupancy(0, y, None, y + BAND_ROWS).sum()) for y in range(0, self.height, BAND_ROWS))
+
+    def __iter__(self):
+        ys, xs = np.nonzero(self.occupancy())
+        return zip(xs.tolist(), ys.tolist())
+
+    def set(self, x, y, wall=True):
+        """
+        Makes (x, y) a wall or clears it. A memory-mapped map is copied into memory on the first change.
+        """
+        if not self.packed.flags.writeable:
+            self.packed = np.array(self.packed)
+        bit = np.uint8(1 << (x & 7))
+        if wall:
+            self.packed[y, x >> 3] |= bit
+        else:
+            self.packed[y, x >> 3] &= ~bit
+
+    def occupancy(self, x0=0, y0=0, x1=None, y1=None):
+        """
+        Returns the walls of the region [x0, x1) x [y0, y1) (the whole map by default) as a boolean [y, x] array.
+        """
+        x1 = self.width if x1 is None else min(x1, self.width)
+        y1 = self.height if y1 is None else min(y1, self.height)
+        first_byte = x0 >> 3
+        rows = np.unpackbits(self.packed[y0:y1, first_byte:(x1 + 7) >> 3], axis=1, bitorder="little")
+        return rows[:, x0 - first_byte * 8:x1 - first_byte * 8].astype(bool)
+
+    def cells_in(self, x0, y0, x1, y1):
+        """
+        Returns the (x, y) wall cells of the region [x0, x1) x [y0, y1).
+        """
+        x0, y0 = max(x0, 0), max(y0, 0)
+        ys, xs = np.nonzero(self.occupancy(x0, y0, x1, y1))
+        return list(zip((xs + x0).tolist(), (ys + y0).tolist()))
+
+
+def generate(size, seed=None, density=0.45, smoothing=4):
+    """
+    Generates a size x size cave-like wall layout and returns its boolean [y, x] occupancy.
+
+    Starts from random noise and runs a few cellular automaton passes: a cell
+    becomes a wall when at least 5 of its 8 neighbours are walls and opens up
+    when at most 3 are, which turns the noise into blobs and corridors.
+    """
+    rng = np.random.default_rng(seed)
+    walls = rng.random((size, size), dtype=np.float32) < density
+    for _ in range(smoothing):
+        padded = np.pad(walls, 1, constant_values=True).astype(np.uint8)
+        neighbours = sum(padded[1 + dy:size + 1 + dy, 1 + dx:size + 1 + dx]
+                         for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx or dy)
+        walls = (neighbours >= 5) | (walls & (neighbours >= 4))
+    walls[:START_CLEARING, :START_CLEARING] = False
+    return walls
+
+
+def spawn_counts(walls):
+    """
+    Scales the default map's enemy counts to a map's free area. There is always one boss.
+    """
+    scale = (walls.width * walls.height - len(walls)) / (game_engine.GRID_SIZE ** 2)
+    return {enemy_type: max(1, int(count * scale)) if enemy_type != "boss" else 1
+            for enemy_type, count in DEFAULT_SPAWNS.items()}
+
+
+def band_fits(walls, size, y0):
+    """
+    Returns a boolean [y, x] array for the rows [y0, y0 + BAND_ROWS), True where
+    a size x size enemy fits with its top-left corner at (x, y).
+    """
+    y1 = min(y0 + BAND_ROWS, walls.height)
+    fits = footprint_free(walls.occupancy(0, y0, None, y1 + size - 1), size)[:y1 - y0]
+    if y0 < START_CLEARING:
+        fits[:START_CLEARING - y0, :START_CLEARING] = False  # Don't start the game in a battle
+    return fits
+
+
+def place_enemies(state, walls, counts, rng):
+    """
+    Adds exactly counts[type] enemies of each type on cells where they fit.
+
+    Spawns are drawn without replacement from the free positions for each
+    enemy size, so none are dropped. The positions are numbered row by row but
+    never listed: a first pass counts them per band of rows, and a second one
+    looks up the drawn numbers only in the bands they fall in. Raises
+    ValueError if a map has too little room for the requested enemies.
+    """
+    bands = range(0, walls.height, BAND_ROWS)
+    band_starts = {}  # Enemy size -> number of free positions before each band, and the total last
+    for enemy_type, count in counts.items():
+        size = game_engine.enemy_size(enemy_type)
+        if size not in band_starts:
+            band_starts[size] = np.cumsum([0] + [int(band_fits(walls, size, y0).sum()) for y0 in bands])
+        starts = band_starts[size]
+        if count > starts[-1]:
+            raise ValueError(f"Only room for {starts[-1]} {enemy_type} enemies, {count} requested")
+        picks = rng.choice(int(starts[-1]), count, replace=False)
+        spawns = np.empty(count, dtype=np.int64)
+        pick_bands = np.searchsorted(starts, picks, side="right") - 1
+        for band in np.unique(pick_bands).tolist():
+            in_band = pick_bands == band
+            positions = np.flatnonzero(band_fits(walls, size, bands[band]))
+            spawns[in_band] = positions[picks[in_band] - starts[band]] + bands[band] * walls.width
+        ys, xs = np.divmod(spawns, walls.width)
+        state.enemies.add_many(enemy_type, xs, ys, game_engine.ENEMY_TYPES[enemy_type]["health"])
+
+
+def new_game(walls, seed=None, counts=None, chase=True):
+    """
+    Creates a game on a generated or loaded map (a WallGrid).
+    """
+    if walls.width != walls.height:
+        raise ValueError("Maps must be square")
+    state = game_engine.GameState(walls.width)
+    state.walls = walls
+    place_enemies(state, walls, counts or spawn_counts(walls), np.random.default_rng(seed))
+    if chase:
+        game_engine.enable_chase(state)
+    return state
+
+
+def save_map(path, walls):
+    with open(path, "wb") as map_file:
+        map_file.write(HEADER.pack(MAGIC, VERSION, walls.width, walls.height))
+        map_file.write(np.ascontiguousarray(walls.packed).tobytes())
+
+
+def load_map(path):
+    """
+    Memory-maps a map file; only the rows that get touched are ever read from disk.
+    """
+    with open(path, "rb") as map_file:
+        magic, version, width, height = HEADER.unpack(map_file.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} map")
+    packed = np.memmap(path, dtype=np.uint8, mode="r", offset=HEADER.size, shape=(height, (width + 7) // 8))
+    return WallGrid(packed, width, height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a map file for the game (play it with Test.py --map).")
+    parser.add_argument("output", help="Map file to write")
+    parser.add_argument("--size", type=int, default=256, help="Width and height in cells")
+    parser.add_argument("--seed", type=int, default=random.randrange(2 ** 32))
+    parser.add_argument("--density", type=float, default=0.45, help="Share of wall cells in the starting noise")
+    parser.add_argument("--smoothing", type=int, default=4, help="Cellular automaton passes")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    occupancy = generate(args.size, args.seed, args.density, args.smoothing)
+    walls = WallGrid.from_occupancy(occupancy)
+    save_map(args.output, walls)
+    print(f"{args.output}: {args.size}x{args.size}, {occupancy.mean():.0%} walls, "
+          f"{walls.packed.nbytes / 1e6:.1f} MB, seed {args.seed}, {time.perf_counter() - start:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+import pygame
+
+
+class FramePacer:
+    """
+    Decides how often the main loop renders, and sleeps in between.
+
+    The loop runs at active_fps while something is going on: input, game
+    events (moves, chase steps, hits, battles) or a running shake. Once
+    nothing has happened for idle_delay seconds it drops to idle_fps and
+    sleeps in pygame.event.wait(), so a key press wakes it at once rather
+    than at the next idle frame. While idle, a frame is only drawn if its
+    signature changed, so a scene whose only motion is below the
+    perceptible threshold is not redrawn at all.
+
+    The simulation keeps its fixed tick rate: idle frames just simulate
+    several ticks at once.
+    """
+
+    def __init__(self, active_fps=60, idle_fps=10, idle_delay=0.5):
+        self.active_fps = active_fps
+        self.idle_fps = idle_fps
+        self.idle_delay = idle_delay
+        self.last_activity = 0.0
+        self.idle = False
+        self.drawn_signature = None
+        self.frame_start = 0  # pygame ticks when the current frame started
+        self.frames = 0
+        self.idle_frames = 0
+        self.skipped_draws = 0
+
+    def activity(self, now):
+        """
+        Records that something visible happened (now is in seconds).
+        """
+        self.last_activity = now
+
+    def update(self, now):
+        """
+        Switches between the active and the idle rate. Returns True when idle.
+        """
+        self.idle = now - self.last_activity >= self.idle_delay
+        self.frames += 1
+        self.idle_frames += self.idle
+        return self.idle
+
+    def should_draw(self, signature):
+        """
+        Returns whether to draw a frame whose content is summarized by signature.
+        """
+        if self.idle and signature == self.drawn_signature:
+            self.skipped_draws += 1
+            return False
+        self.drawn_signature = signature
+        return True
+
+    def wait(self, clock):
+        """
+        Waits for the next frame and returns (milliseconds since the previous
+        frame, the event that ended an idle wait or None).
+        """
+        event = None
+        if self.idle:
+            timeout = 1000 // self.idle_fps - (pygame.time.get_ticks() - self.frame_start)
+            if timeout > 0:
+                # Sleeps until the timeout or the first event, whichever comes first
+                event = pygame.event.wait(timeout)
+                if event.type == pygame.NOEVENT:
+                    event = None
+            elapsed = clock.tick()
+        else:
+            elapsed = clock.tick(self.active_fps)
+        self.frame_start = pygame.time.get_ticks()
+        return elapsed, event
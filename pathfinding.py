@@ -0,0 +1,234 @@
+import numpy as np
+
+# Distance value for cells the player can't be reached from
+UNREACHABLE = np.iinfo(np.int32).max
+
+NEIGHBOURS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+
+def occupancy_grid(walls, grid_size):
+    """
+    Converts a set of (x, y) wall cells (or a map's WallGrid) into a boolean
+    [y, x] array. Walls outside the grid are ignored.
+    """
+    if hasattr(walls, "occupancy"):
+        occupancy = np.zeros((grid_size, grid_size), dtype=bool)
+        region = walls.occupancy(0, 0, grid_size, grid_size)
+        occupancy[:region.shape[0], :region.shape[1]] = region
+        return occupancy
+    occupancy = np.zeros((grid_size, grid_size), dtype=bool)
+    cells = [(x, y) for (x, y) in walls if 0 <= x < grid_size and 0 <= y < grid_size]
+    if cells:
+        xs, ys = zip(*cells)
+        occupancy[list(ys), list(xs)] = True
+    return occupancy
+
+
+def region_occupancy(walls, grid_size, x0, y0, x1, y1):
+    """
+    Returns the walls of [x0, x1) x [y0, y1) as a boolean [y, x] array; cells off the grid count as walls.
+    walls is a whole-grid occupancy array or a map's WallGrid.
+    """
+    region = np.ones((y1 - y0, x1 - x0), dtype=bool)
+    cx0, cy0 = max(x0, 0), max(y0, 0)
+    cx1, cy1 = min(x1, grid_size), min(y1, grid_size)
+    if cx0 < cx1 and cy0 < cy1:
+        if hasattr(walls, "occupancy"):
+            inside = walls.occupancy(cx0, cy0, cx1, cy1)
+        else:
+            inside = walls[cy0:cy1, cx0:cx1]
+        region[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0] = inside
+    return region
+
+
+def footprint_free(occupancy, size):
+    """
+    Returns a boolean [y, x] array that is True where a size x size footprint
+    with its top-left corner at (x, y) fits on the grid without touching a wall.
+    """
+    height, width = occupancy.shape
+    free = np.zeros((height, width), dtype=bool)
+    if height < size or width < size:
+        return free
+
+    # Walls in any of the size rows from each cell down, then in any of the size columns from it rightwards
+    rows = occupancy[:height - size + 1].astype(bool)
+    for dy in range(1, size):
+        rows |= occupancy[dy:height - size + 1 + dy]
+    blocked = rows[:, :width - size + 1].copy()
+    for dx in range(1, size):
+        blocked |= rows[:, dx:width - size + 1 + dx]
+
+    free[:height - size + 1, :width - size + 1] = ~blocked
+    return free
+
+
+class FlowField:
+    """
+    Shared distance field that every chasing enemy reads from.
+
+    The field holds the number of steps from each top-left position to any
+    position where an enemy overlaps the player's 2x2 footprint. It only
+    covers a window of `radius` cells around the player, so recomputing it
+    costs the same on any map size, and it is only recomputed when the
+    player moves. Enemies outside the window don't chase.
+
+    Passability (where a footprint fits) is also only worked out for the
+    window plus a one-cell border, so a huge map is never scanned as a whole.
+    """
+
+    def __init__(self, walls, grid_size, radius=12, player_size=2, enemy_sizes=(2, 4)):
+        self.walls = walls
+        self.grid_size = grid_size
+        self.radius = radius
+        self.player_size = player_size
+        self.sizes = set(enemy_sizes) | {player_size}
+        # Small maps given as a set of cells are converted once; a WallGrid is read per window
+        self.occupancy = None if hasattr(walls, "occupancy") else occupancy_grid(walls, grid_size)
+        self.target = None
+        self.origin = (0, 0)
+        self.distance = np.zeros((0, 0), dtype=np.int32)
+        self.passable_origin = (0, 0)
+        self.passable = {size: np.zeros((0, 0), dtype=bool) for size in self.sizes}
+
+    def region_occupancy(self, x0, y0, x1, y1):
+        """
+        Returns the walls of [x0, x1) x [y0, y1) as a boolean [y, x] array; cells off the grid count as walls.
+        """
+        return region_occupancy(self.walls if self.occupancy is None else self.occupancy,
+                                self.grid_size, x0, y0, x1, y1)
+
+    def set_wall(self, x, y, wall=True):
+        """
+        Takes a changed wall cell into account; the field is recomputed on the next update().
+        Walls given as a WallGrid must already hold the change.
+        """
+        if self.occupancy is not None and 0 <= x < self.grid_size and 0 <= y < self.grid_size:
+            self.occupancy[y, x] = wall
+        self.target = None
+
+    def update(self, player_x, player_y):
+        """
+        Recomputes the field around the player, unless the player hasn't moved.
+        """
+        if self.target == (player_x, player_y):
+            return
+        self.target = (player_x, player_y)
+
+        # Window of cells the field covers
+        x0 = max(player_x - self.radius, 0)
+        y0 = max(player_y - self.radius, 0)
+        x1 = min(player_x + self.radius + 1, self.grid_size)
+        y1 = min(player_y + self.radius + 1, self.grid_size)
+        self.origin = (x0, y0)
+
+        # Passability of the window and its border (where enemies step from and to)
+        border = max(self.sizes) - 1
+        occupancy = self.region_occupancy(x0 - 1, y0 - 1, x1 + 1 + border, y1 + 1 + border)
+        self.passable_origin = (x0 - 1, y0 - 1)
+        for size in self.sizes:
+            self.passable[size] = footprint_free(occupancy, size)[:y1 - y0 + 2, :x1 - x0 + 2]
+        passable = self.passable[self.player_size][1:-1, 1:-1]
+
+        # Sources: every position whose footprint overlaps the player's footprint
+        reach = self.player_size - 1
+        frontier = np.zeros(passable.shape, dtype=bool)
+        frontier[max(player_y - reach - y0, 0):player_y + reach + 1 - y0,
+                 max(player_x - reach - x0, 0):player_x + reach + 1 - x0] = True
+        frontier &= passable
+
+        distance = np.full(passable.shape, UNREACHABLE, dtype=np.int32)
+        distance[frontier] = 0
+        visited = frontier.copy()
+
+        # Breadth-first search, expanding the whole frontier one step per iteration
+        step = 0
+        while frontier.any() and step < 2 * self.radius:
+            step += 1
+            grown = np.zeros_like(frontier)
+            grown[1:, :] |= frontier[:-1, :]
+            grown[:-1, :] |= frontier[1:, :]
+            grown[:, 1:] |= frontier[:, :-1]
+            grown[:, :-1] |= frontier[:, 1:]
+            frontier = grown & passable & ~visited
+            distance[frontier] = step
+            visited |= frontier
+
+        self.distance = distance
+
+    def distance_at(self, x, y):
+        """
+        Returns the number of steps from (x, y) to the player, or UNREACHABLE.
+        """
+        wx = x - self.origin[0]
+        wy = y - self.origin[1]
+        height, width = self.distance.shape
+        if 0 <= wx < width and 0 <= wy < height:
+            return int(self.distance[wy, wx])
+        return UNREACHABLE
+
+    def is_passable(self, x, y, size):
+        """
+        Checks whether a size x size footprint fits at (x, y). Only known around the field's window.
+        """
+        passable = self.passable[size]
+        px = x - self.passable_origin[0]
+        py = y - self.passable_origin[1]
+        height, width = passable.shape
+        return 0 <= px < width and 0 <= py < height and bool(passable[py, px])
+
+    def next_step(self, x, y, size):
+        """
+        Returns the (dx, dy) that brings an enemy of the given size at (x, y)
+        closer to the player, or None if it can't get closer.
+        """
+        best = self.distance_at(x, y)
+        if best == UNREACHABLE:
+            return None
+
+        move = None
+        for dx, dy in NEIGHBOURS:
+            nx, ny = x + dx, y + dy
+            if not self.is_passable(nx, ny, size):
+                continue
+            distance = self.distance_at(nx, ny)
+            if distance < best:
+                best = distance
+                move = (dx, dy)
+        return move
+
+    def distances_at(self, xs, ys):
+        """
+        Array version of distance_at() for many positions at once.
+        """
+        wx = xs - self.origin[0]
+        wy = ys - self.origin[1]
+        height, width = self.distance.shape
+        inside = (wx >= 0) & (wx < width) & (wy >= 0) & (wy < height)
+        distances = np.full(len(xs), UNREACHABLE, dtype=np.int32)
+        distances[inside] = self.distance[wy[inside], wx[inside]]
+        return distances
+
+    def next_steps(self, xs, ys, sizes):
+        """
+        Array version of next_step() for many enemies at once. Returns the
+        (dx, dy) arrays of their moves; enemies that can't get closer get (0, 0).
+        """
+        best = self.distances_at(xs, ys)
+        chasing = best != UNREACHABLE
+        dx = np.zeros(len(xs), dtype=np.int32)
+        dy = np.zeros(len(xs), dtype=np.int32)
+        # Only enemies inside the window can move; the border around it covers their steps
+        for step_x, step_y in NEIGHBOURS:
+            px = xs + step_x - self.passable_origin[0]
+            py = ys + step_y - self.passable_origin[1]
+            free = np.zeros(len(xs), dtype=bool)
+            for size, passable in self.passable.items():
+                of_size = chasing & (sizes == size)
+                free[of_size] = passable[py[of_size], px[of_size]]
+            distances = self.distances_at(xs + step_x, ys + step_y)
+            closer = free & (distances < best)
+            best[closer] = distances[closer]
+            dx[closer] = step_x
+            dy[closer] = step_y
+        return dx, dy
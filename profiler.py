@@ -0,0 +1,125 @@
+import csv
+import time
+import pygame
+from histogram import RollingHistogram
+
+# Phases of one pass through the main loop, in the order they run
+PHASES = ("events", "handle_battle", "overworld", "battle_screen", "flip", "tick")
+
+
+class FrameProfiler:
+    """
+    Times each phase of the main loop with time.perf_counter_ns.
+
+    Usage per frame: begin_frame(), then start()/stop(phase, start) around
+    each phase, then end_frame(). When disabled every call returns at once.
+    Timings go into rolling histograms (for the overlay) and, if csv_path
+    is set, one CSV row per frame.
+    """
+
+    def __init__(self, enabled=True, window=600, csv_path=None, overlay_refresh_ms=500):
+        self.enabled = enabled
+        self.frame_histogram = RollingHistogram(window)
+        self.phase_histograms = {phase: RollingHistogram(window) for phase in PHASES}
+        self.current = dict.fromkeys(PHASES, 0)
+        self.frame_start = 0
+        self.frame_index = 0
+
+        # Per-frame samples, streamed to disk
+        self.csv_file = None
+        self.csv_writer = None
+        if enabled and csv_path:
+            self.csv_file = open(csv_path, "w", newline="")
+            self.csv_writer = csv.writer(self.csv_file)
+            self.csv_writer.writerow(("frame", "total_ns") + tuple(f"{phase}_ns" for phase in PHASES))
+
+        # Overlay lines are recomputed every overlay_refresh_ms, not every frame
+        self.overlay_refresh_ns = overlay_refresh_ms * 1_000_000
+        self.overlay_updated = 0
+        self.overlay_lines = []
+        self.extra_lines = None  # Optional function returning more overlay lines (e.g. asset residency)
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.frame_start = time.perf_counter_ns()
+        for phase in PHASES:
+            self.current[phase] = 0
+
+    def start(self):
+        """
+        Returns the timestamp to pass to stop().
+        """
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def stop(self, phase, start, parent=None):
+        """
+        Adds the time since start to phase. If the phase ran inside another
+        one (e.g. handle_battle inside events), pass it as parent so its time
+        isn't counted twice.
+        """
+        if not self.enabled:
+            return
+        elapsed = time.perf_counter_ns() - start
+        self.current[phase] += elapsed
+        if parent is not None:
+            self.current[parent] -= elapsed
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        total = time.perf_counter_ns() - self.frame_start
+        self.frame_histogram.add(total)
+        for phase in PHASES:
+            self.phase_histograms[phase].add(self.current[phase])
+        if self.csv_writer is not None:
+            self.csv_writer.writerow((self.frame_index, total) + tuple(self.current[phase] for phase in PHASES))
+        self.frame_index += 1
+
+    def fps(self):
+        mean = self.frame_histogram.mean()
+        return 1e9 / mean if mean else 0.0
+
+    def slowest_phase(self):
+        """
+        Returns (phase, mean ns) for the phase that takes the most time on average.
+        """
+        return max(((phase, self.phase_histograms[phase].mean()) for phase in PHASES), key=lambda item: item[1])
+
+    def summary_lines(self):
+        phase, phase_ns = self.slowest_phase()
+        lines = [
+            f"FPS: {self.fps():.1f}",
+            f"p50: {self.frame_histogram.percentile(50) / 1e6:.2f} ms  p99: {self.frame_histogram.percentile(99) / 1e6:.2f} ms",
+            f"Slowest: {phase} {phase_ns / 1e6:.2f} ms"
+        ]
+        if self.extra_lines is not None:
+            lines.extend(self.extra_lines())
+        return lines
+
+    def draw_overlay(self, screen, text_renderer, color=(255, 255, 255), background=(0, 0, 0)):
+        """
+        Draws FPS, p50/p99 frame time and the slowest phase in the top-right
+        corner. Returns the rect it covers, or None when disabled.
+        """
+        if not self.enabled:
+            return None
+        now = time.perf_counter_ns()
+        if now - self.overlay_updated >= self.overlay_refresh_ns:
+            self.overlay_lines = self.summary_lines()
+            self.overlay_updated = now
+
+        surfaces = [text_renderer.render(line, 20, color) for line in self.overlay_lines]
+        width = max((surface.get_width() for surface in surfaces), default=0) + 8
+        height = 16 * len(surfaces) + 8
+        rect = pygame.Rect(screen.get_width() - width - 4, 4, width, height)
+        pygame.draw.rect(screen, background, rect)
+        for i, surface in enumerate(surfaces):
+            screen.blit(surface, (rect.x + 4, rect.y + 4 + i * 16))
+        return rect
+
+    def close(self):
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
+            self.csv_writer = None
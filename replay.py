@@ -0,0 +1,73 @@
+import struct
+from array import array
+
+# File layout: a header, then (tick, key) pairs of unsigned 32-bit ints.
+# The last pair is (tick count, END_OF_LOG) so a replay knows when the
+# recorded session stopped, even if nothing was pressed at the end.
+MAGIC = b"GREC"
+VERSION = 2  # 2: enemy spawns never land on walls, so version 1 seeds place them differently
+HEADER = struct.Struct("<4sHQ")  # Magic, version, RNG seed
+END_OF_LOG = 0xFFFFFFFF
+
+
+class InputRecorder:
+    """
+    Records key presses by simulation tick into a compact binary log.
+    """
+
+    def __init__(self, path, seed, flush_every=4096):
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed))
+        self.records = array("I")
+        self.flush_every = flush_every
+
+    def record(self, frame, key):
+        self.records.append(frame)
+        self.records.append(key)
+        if len(self.records) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.records.tobytes())
+        self.records = array("I")
+        self.file.flush()
+
+    def close(self, tick_count):
+        """
+        Writes the end marker with the number of ticks the session ran for.
+        """
+        self.records.append(tick_count)
+        self.records.append(END_OF_LOG)
+        self.flush()
+        self.file.close()
+
+
+class InputReplay:
+    """
+    Reads a log written by InputRecorder and hands back the keys of each tick.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as log_file:
+            data = log_file.read()
+        magic, version, self.seed = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} input log")
+
+        records = array("I")
+        if records.itemsize != 4:
+            raise ValueError("Input logs need 32-bit array items")
+        records.frombytes(data[HEADER.size:])
+
+        self.keys = {}
+        self.last_frame = 0
+        for i in range(0, len(records) - 1, 2):
+            frame, key = records[i], records[i + 1]
+            if key == END_OF_LOG:
+                self.last_frame = frame
+                break
+            self.keys.setdefault(frame, []).append(key)
+            self.last_frame = max(self.last_frame, frame)
+
+    def keys_for(self, tick):
+        return self.keys.get(tick, ())
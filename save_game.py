@@ -0,0 +1,211 @@
+import os
+import queue
+import struct
+import threading
+import zlib
+import numpy as np
+import game_engine
+from mapgen import WallGrid
+from pathfinding import occupancy_grid
+
+# File layout: a header, then a zlib-compressed body holding the player
+# struct, the enemy type names, the enemy columns and the bit-packed wall
+# bitmap (the same row layout as a mapgen map file).
+# Columns are stored as raw little-endian arrays, so loading them is a
+# decompress plus np.frombuffer, whatever the number of enemies.
+MAGIC = b"GSAV"
+VERSION = 2
+HEADER = struct.Struct("<4sHI")  # Magic, version, length of the uncompressed body
+PLAYER = struct.Struct("<HiiB9iBiBI")
+NO_ENEMY = -1
+
+# Enemy columns saved, with their on-disk dtypes
+ENEMY_COLUMNS = (("x", "<i4"), ("y", "<i4"), ("type_id", "<i1"), ("health", "<i4"))
+
+
+class Snapshot:
+    """
+    Copy of everything a save needs, taken on the main thread.
+
+    Taking one copies the player fields and the live rows of the enemy
+    columns (a few memcpys) and nothing else; packing and compressing
+    happen later, on the save thread.
+    """
+
+    def __init__(self, state):
+        enemies = state.enemies
+        self.player = (
+            state.grid_size, state.sprite_x, state.sprite_y, state.facing_right,
+            state.player_health, state.player_max_health, state.player_damage,
+            state.player_mana, state.player_max_mana,
+            state.player_xp, state.xp_needed, state.player_level, state.potions,
+            state.battle_mode, NO_ENEMY if state.current_enemy is None else state.current_enemy,
+            state.flow_field is not None
+        )
+        self.type_names = enemies.type_names
+        self.columns = [getattr(enemies, name).astype(dtype) for name, dtype in ENEMY_COLUMNS]
+        # A map's WallGrid is never modified, so it's shared instead of copied
+        walls = state.walls
+        if not isinstance(walls, WallGrid):
+            walls = WallGrid.from_occupancy(occupancy_grid(walls, state.grid_size))
+        self.walls = walls
+
+    def pack(self):
+        """
+        Returns the uncompressed body.
+        """
+        type_names = ",".join(self.type_names).encode()
+        parts = [
+            PLAYER.pack(*self.player, len(self.columns[0])),
+            struct.pack("<H", len(type_names)),
+            type_names
+        ]
+        parts.extend(column.tobytes() for column in self.columns)
+        parts.append(np.ascontiguousarray(self.walls.packed).tobytes())
+        return b"".join(parts)
+
+
+def write_snapshot(snapshot, path, level=6):
+    """
+    Packs, compresses and durably writes a snapshot to path. The old save
+    is only replaced once the new one is fully on disk.
+    """
+    body = snapshot.pack()
+    data = HEADER.pack(MAGIC, VERSION, len(body)) + zlib.compress(body, level)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as save_file:
+        save_file.write(data)
+        save_file.flush()
+        os.fsync(save_file.fileno())
+    os.replace(temp_path, path)
+
+
+def save(state, path):
+    """
+    Saves the game on the calling thread.
+    """
+    write_snapshot(Snapshot(state), path)
+
+
+def load(path):
+    """
+    Reads a save written by write_snapshot() and returns a new GameState.
+    Raises OSError if the file can't be read and ValueError if it isn't a
+    valid save (wrong format, truncated, corrupted or naming unknown enemy types).
+    """
+    with open(path, "rb") as save_file:
+        data = save_file.read()
+    try:
+        return decode(data, path)
+    except (struct.error, zlib.error, KeyError, IndexError) as e:
+        raise ValueError(f"{path} is not a valid save: {e!r}") from e
+
+
+def decode(data, path):
+    """
+    Builds a GameState from the bytes of a save file (path is only used in messages).
+    """
+    magic, version, body_length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} save")
+    body = zlib.decompress(data[HEADER.size:])
+    if len(body) != body_length:
+        raise ValueError(f"{path} is truncated")
+
+    (grid_size, sprite_x, sprite_y, facing_right,
+     health, max_health, damage, mana, max_mana,
+     xp, xp_needed, level, potions,
+     battle_mode, current_enemy, chase, enemy_count) = PLAYER.unpack_from(body)
+    offset = PLAYER.size
+    (names_length,) = struct.unpack_from("<H", body, offset)
+    offset += 2
+    type_names = body[offset:offset + names_length].decode().split(",")
+    offset += names_length
+
+    columns = {}
+    for name, dtype in ENEMY_COLUMNS:
+        columns[name] = np.frombuffer(body, dtype=dtype, count=enemy_count, offset=offset)
+        offset += columns[name].nbytes
+    row_bytes = (grid_size + 7) // 8
+    packed = np.frombuffer(body, dtype=np.uint8, count=grid_size * row_bytes, offset=offset)
+
+    state = game_engine.GameState(grid_size)
+    state.walls = WallGrid(packed.reshape(grid_size, row_bytes), grid_size, grid_size)
+    game_engine.place_player(state, sprite_x, sprite_y)
+    state.facing_right = bool(facing_right)
+    state.player_health, state.player_max_health, state.player_damage = health, max_health, damage
+    state.player_mana, state.player_max_mana = mana, max_mana
+    state.player_xp, state.xp_needed, state.player_level = xp, xp_needed, level
+    state.potions = potions
+    state.battle_mode = bool(battle_mode)
+    state.current_enemy = None if current_enemy == NO_ENEMY else current_enemy
+    if state.current_enemy is not None and not 0 <= state.current_enemy < enemy_count:
+        raise ValueError(f"{path} names enemy {state.current_enemy} in battle, but has {enemy_count} enemies")
+
+    # Type ids are remapped by name, so saves survive new enemy types
+    enemies = state.enemies
+    remap = np.array([enemies.type_ids[name] for name in type_names], dtype=np.int8)
+    enemies.assign(columns["x"], columns["y"], remap[columns["type_id"]], columns["health"])
+
+    if chase:
+        game_engine.enable_chase(state)
+    return state
+
+
+class AutoSaver:
+    """
+    Writes saves on a background thread.
+
+    save() only takes a Snapshot and queues it; packing, compression, the
+    write and the fsync happen on the worker. If saves come in faster than
+    the disk takes them, only the newest pending one is written. maybe_save()
+    is meant to be called every frame and saves every `interval` seconds.
+    """
+
+    def __init__(self, path, interval=60.0):
+        self.path = path
+        self.interval = interval
+        self.last_save = None
+        self.pending = None
+        self.lock = threading.Lock()
+        self.wake = queue.Queue()
+        self.saves_written = 0
+        self.worker = threading.Thread(target=self.save_worker, name="autosave", daemon=True)
+        self.worker.start()
+
+    def save_worker(self):
+        """
+        Writes pending snapshots until stop() is called.
+        """
+        while self.wake.get() is not None:
+            with self.lock:
+                snapshot, self.pending = self.pending, None
+            if snapshot is None:
+                continue
+            try:
+                write_snapshot(snapshot, self.path)
+                self.saves_written += 1
+            except OSError as e:
+                print(f"Could not save the game to {self.path}: {e}")
+
+    def save(self, state, now=None):
+        with self.lock:
+            self.pending = Snapshot(state)
+        self.last_save = now
+        self.wake.put(True)
+
+    def maybe_save(self, state, now):
+        """
+        Saves if `interval` seconds passed since the last save (now is in seconds).
+        """
+        if self.last_save is None:
+            self.last_save = now
+        elif now - self.last_save >= self.interval:
+            self.save(state, now)
+
+    def stop(self):
+        """
+        Finishes any pending save and stops the worker.
+        """
+        self.wake.put(None)
+        self.worker.join()
@@ -0,0 +1,449 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import numpy as np
+import game_engine
+import mapgen
+from pathfinding import occupancy_grid
+from histogram import RollingHistogram
+
+# Many play sessions in one process. Every session is a GameState driven
+# by game_engine.step(), the same rules Test.py runs: actions from the
+# client play immediately, and all sessions take a chase step together
+# every CHASE_INTERVAL seconds (ENEMY_MOVE_INTERVAL ticks at TICK_RATE in
+# Test.py). Animation and sound stay on the client.
+#
+# Protocol, newline-delimited over TCP:
+#   client -> server: "<action> [seq]" with an action of game_engine (up,
+#     basic_attack, ...), "new" for a fresh game or "stats" for this
+#     session's latency figures.
+#   server -> client: one compact JSON object per line. The first one is
+#     the full state; after that only what changed since the last update
+#     the client was sent (see DeltaEncoder). An update answering an action
+#     carries its seq as "s", so clients can measure round trips.
+
+HOST = "127.0.0.1"
+PORT = 8770
+CHASE_INTERVAL = 20 / 60  # Seconds between two chase steps
+TICK_BATCH = 100  # Sessions stepped between two chances for the event loop to handle actions
+MAX_PENDING_BYTES = 64 * 1024  # A session whose client reads slower than this skips updates until it catches up
+
+ACTIONS = {
+    game_engine.UP, game_engine.DOWN, game_engine.LEFT, game_engine.RIGHT,
+    game_engine.BASIC_ATTACK, game_engine.SPECIAL_ATTACK, game_engine.RUN_AWAY,
+    game_engine.DEFEND, game_engine.USE_ITEM
+}
+
+# (key on the wire, GameState attribute)
+PLAYER_FIELDS = (
+    ("x", "sprite_x"), ("y", "sprite_y"), ("f", "facing_right"),
+    ("hp", "player_health"), ("mhp", "player_max_health"),
+    ("mp", "player_mana"), ("mmp", "player_max_mana"),
+    ("xp", "player_xp"), ("nxp", "xp_needed"), ("lv", "player_level"), ("po", "potions"),
+    ("b", "battle_mode"), ("ce", "current_enemy"), ("go", "game_over"), ("v", "victory")
+)
+
+
+def dumps(message):
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+class DeltaEncoder:
+    """
+    Turns a session's state into updates holding only what changed since the last update sent.
+
+    Player fields are sent when their value changed. Enemies are sent as
+    "n" (the enemy count, when it changed) and "e", a list of
+    [index, type id, x, y, health] rows for every index whose row changed;
+    since removal moves the last enemy into the freed slot, a client
+    applies the rows and then truncates to n.
+    """
+
+    COLUMNS = ("type_id", "x", "y", "health")
+
+    def __init__(self):
+        self.player = None
+        self.enemies = None  # Raw bytes of the enemy columns as last sent
+        self.pending = None
+
+    def encode(self, state, full=False):
+        """
+        Returns the update as a dict (empty if nothing changed). Call commit() once it was sent.
+        """
+        player = tuple(getattr(state, name) for key, name in PLAYER_FIELDS)
+        columns = [getattr(state.enemies, name) for name in self.COLUMNS]
+        raw = [column.tobytes() for column in columns]
+        full = full or self.player is None
+
+        update = {}
+        if full:
+            update.update((key, value) for (key, name), value in zip(PLAYER_FIELDS, player))
+        else:
+            update.update((key, value) for (key, name), value, old in zip(PLAYER_FIELDS, player, self.player)
+                          if value != old)
+
+        # Most updates leave the enemies alone, which comparing a few byte strings tells
+        count = len(columns[0])
+        if full or raw != self.enemies:
+            if full:
+                changed = np.arange(count)
+            else:
+                old_count = len(self.enemies[1]) // columns[1].itemsize
+                kept = min(count, old_count)
+                differs = np.zeros(kept, dtype=bool)
+                for column, old in zip(columns, self.enemies):
+                    differs |= column[:kept] != np.frombuffer(old, dtype=column.dtype)[:kept]
+                changed = np.concatenate([np.flatnonzero(differs), np.arange(kept, count)])
+                if count != old_count:
+                    update["n"] = count
+            if full:
+                update["n"] = count
+            if len(changed):
+                update["e"] = np.column_stack([changed] + [column[changed] for column in columns]).tolist()
+        self.pending = (player, raw)
+        return update
+
+    def commit(self):
+        self.player, self.enemies = self.pending
+
+
+class ClientView:
+    """
+    A client's copy of a session, rebuilt from the server's updates.
+    """
+
+    def __init__(self):
+        self.player = {}
+        self.enemies = []  # [type id, x, y, health] per enemy
+
+    def apply(self, update):
+        for key, name in PLAYER_FIELDS:
+            if key in update:
+                self.player[key] = update[key]
+        for index, *row in update.get("e", ()):
+            if index >= len(self.enemies):
+                self.enemies.extend([None] * (index + 1 - len(self.enemies)))
+            self.enemies[index] = row
+        if "n" in update:
+            del self.enemies[update["n"]:]
+
+
+class Session:
+    """
+    One player's game on the server.
+    """
+
+    def __init__(self, session_id, server, writer):
+        self.id = session_id
+        self.server = server
+        self.writer = writer
+        self.encoder = DeltaEncoder()
+        self.tick_latency = RollingHistogram(300)    # Seconds from a scheduled chase step to its update being queued
+        self.action_latency = RollingHistogram(300)  # Seconds from an action arriving to its update being queued
+        self.actions = 0
+        self.skipped_updates = 0
+        self.new_game()
+
+    def new_game(self):
+        self.state = self.server.new_state(self.id)
+        self.games = getattr(self, "games", 0) + 1
+
+    def send(self, events=(), seq=None, full=False):
+        """
+        Sends what changed. Updates are skipped (and merged into the next one)
+        while the client is too far behind reading them.
+        """
+        if self.writer.transport.get_write_buffer_size() > MAX_PENDING_BYTES and seq is None and not full:
+            self.skipped_updates += 1
+            return
+        update = self.encoder.encode(self.state, full)
+        if events:
+            update["ev"] = events
+        if seq is not None:
+            update["s"] = seq
+        if update:
+            data = dumps(update)
+            self.writer.write(data)
+            self.server.bytes_sent += len(data)
+        self.encoder.commit()
+
+    def handle(self, line):
+        """
+        Plays one line from the client.
+        """
+        received = time.perf_counter()
+        command, _, seq = line.partition(" ")
+        seq = int(seq) if seq else None
+        if command == "stats":
+            self.writer.write(dumps({"stats": self.stats()}))
+            return
+        if command == "new":
+            self.new_game()
+            self.send(seq=seq, full=True)
+        elif command in ACTIONS:
+            self.actions += 1
+            self.send(game_engine.step(self.state, command), seq)
+        else:
+            self.writer.write(dumps({"error": f"unknown action {command!r}", "s": seq}))
+            return
+        self.action_latency.add(time.perf_counter() - received)
+
+    def tick(self, scheduled):
+        events = game_engine.step(self.state, game_engine.TICK)
+        if events:
+            self.send(events)
+        self.tick_latency.add(time.perf_counter() - scheduled)
+
+    def stats(self):
+        return {
+            "session": self.id,
+            "games": self.games,
+            "actions": self.actions,
+            "skipped_updates": self.skipped_updates,
+            "tick_p50_ms": self.tick_latency.percentile(50) * 1000,
+            "tick_p99_ms": self.tick_latency.percentile(99) * 1000,
+            "action_p50_ms": self.action_latency.percentile(50) * 1000,
+            "action_p99_ms": self.action_latency.percentile(99) * 1000
+        }
+
+
+class GameServer:
+    """
+    Accepts connections, one session each, and runs the shared chase clock.
+    """
+
+    def __init__(self, walls=None, seed=0):
+        # Every session shares one read-only wall bitmap
+        if walls is None:
+            walls = mapgen.WallGrid.from_occupancy(occupancy_grid(game_engine.build_walls(), game_engine.GRID_SIZE))
+        self.walls = walls
+        self.seed = seed
+        self.sessions = {}
+        self.next_id = 0
+        self.ticks = 0
+        self.late_ticks = 0
+        self.bytes_sent = 0
+        self.tick_duration = RollingHistogram(300)  # Seconds to step every session once
+
+    def new_state(self, session_id):
+        seed = self.seed * 1_000_003 + session_id
+        if self.walls.width == game_engine.GRID_SIZE:
+            state = game_engine.new_game(seed, chase=False)
+            state.walls = self.walls
+            game_engine.enable_chase(state)
+            return state
+        return mapgen.new_game(self.walls, seed)
+
+    async def handle_connection(self, reader, writer):
+        session = Session(self.next_id, self, writer)
+        self.next_id += 1
+        self.sessions[session.id] = session
+        try:
+            hello = {"id": session.id, "grid": session.state.grid_size,
+                     "types": list(session.state.enemies.type_names)}
+            writer.write(dumps(hello))
+            session.send(full=True)
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                session.handle(line.decode().strip())
+                await writer.drain()
+        except ConnectionError:
+            pass  # The client went away
+        except ValueError as e:
+            print(f"Session {session.id} dropped: {e}", file=sys.stderr)
+        finally:
+            del self.sessions[session.id]
+            writer.close()
+
+    async def chase_clock(self):
+        """
+        Steps every session's enemies every CHASE_INTERVAL seconds, on a fixed schedule.
+        """
+        loop = asyncio.get_running_loop()
+        scheduled = loop.time()
+        offset = time.perf_counter() - loop.time()
+        while True:
+            scheduled += CHASE_INTERVAL
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                # Behind schedule: drop the missed steps instead of bursting
+                self.late_ticks += 1
+                scheduled = loop.time()
+            busy = 0.0
+            sessions = list(self.sessions.values())
+            for first in range(0, len(sessions), TICK_BATCH):
+                batch_start = time.perf_counter()
+                for session in sessions[first:first + TICK_BATCH]:
+                    if session.id in self.sessions:
+                        session.tick(scheduled + offset)
+                busy += time.perf_counter() - batch_start
+                # Let waiting actions in between batches, so a big tick doesn't stall them
+                await asyncio.sleep(0)
+            self.tick_duration.add(busy)
+            self.ticks += 1
+
+    async def report(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            print(f"{len(self.sessions)} sessions, {self.ticks} ticks ({self.late_ticks} late), "
+                  f"step all p50 {self.tick_duration.percentile(50) * 1000:.1f} ms "
+                  f"p99 {self.tick_duration.percentile(99) * 1000:.1f} ms, "
+                  f"{self.bytes_sent / 1e6:.1f} MB sent", file=sys.stderr)
+
+    async def serve(self, host=HOST, port=PORT, stats_interval=5.0):
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=4096)
+        print(f"Game server listening on {host}:{port}", file=sys.stderr)
+        tasks = [asyncio.create_task(self.chase_clock())]
+        if stats_interval:
+            tasks.append(asyncio.create_task(self.report(stats_interval)))
+        async with server:
+            await server.serve_forever()
+
+
+def choose_action(view, rng):
+    """
+    A simulated player: wanders the overworld and mostly attacks in battle.
+    """
+    player = view.player
+    if player.get("go"):
+        return "new"
+    if player.get("b"):
+        if player.get("hp", 0) < 8 and player.get("po", 0) > 0:
+            return game_engine.USE_ITEM
+        return rng.choice((game_engine.BASIC_ATTACK, game_engine.BASIC_ATTACK, game_engine.SPECIAL_ATTACK,
+                           game_engine.DEFEND, game_engine.RUN_AWAY))
+    return rng.choice((game_engine.UP, game_engine.DOWN, game_engine.LEFT, game_engine.RIGHT))
+
+
+async def simulated_client(number, host, port, duration, rate, results):
+    """
+    Plays one session for `duration` seconds, sending about `rate` actions a second.
+    """
+    rng = random.Random(number)
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError as e:
+        results["errors"].append(str(e))
+        return
+    loop = asyncio.get_running_loop()
+    view = ClientView()
+    sent_at = {}
+    finished = asyncio.Event()
+
+    async def read_updates():
+        json.loads(await reader.readline())  # Hello
+        while line := await reader.readline():
+            update = json.loads(line)
+            results["updates"] += 1
+            results["bytes"] += len(line)
+            if "stats" in update:
+                results["sessions"].append(update["stats"])
+                finished.set()
+                continue
+            view.apply(update)
+            if "s" in update:
+                results["round_trips"].append(loop.time() - sent_at.pop(update["s"]))
+
+    reading = asyncio.create_task(read_updates())
+    seq = 0
+    end = loop.time() + duration
+    try:
+        while loop.time() < end:
+            await asyncio.sleep(rng.expovariate(rate))
+            if not view.player:
+                continue
+            seq += 1
+            sent_at[seq] = loop.time()
+            writer.write(f"{choose_action(view, rng)} {seq}\n".encode())
+            results["actions"] += 1
+            await writer.drain()
+        writer.write(b"stats\n")
+        await asyncio.wait_for(finished.wait(), 10)
+    except (OSError, asyncio.TimeoutError) as e:
+        results["errors"].append(str(e) or type(e).__name__)
+    finally:
+        reading.cancel()
+        writer.close()
+
+
+async def simulate(clients, host=HOST, port=PORT, duration=30.0, rate=2.0, ramp=2.0):
+    """
+    Runs `clients` simulated players against a server and returns a summary.
+    Connections are spread over `ramp` seconds.
+    """
+    results = {"actions": 0, "updates": 0, "bytes": 0, "round_trips": [], "sessions": [], "errors": []}
+
+    async def start(number):
+        await asyncio.sleep(ramp * number / clients)
+        await simulated_client(number, host, port, duration, rate, results)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(start(number) for number in range(clients)))
+    elapsed = time.perf_counter() - start_time
+
+    round_trips = np.array(results["round_trips"]) * 1000
+    sessions = results["sessions"]
+    return {
+        "clients": clients,
+        "connected": len(sessions),
+        "errors": len(results["errors"]),
+        "actions": results["actions"],
+        "actions_per_s": results["actions"] / elapsed,
+        "updates": results["updates"],
+        "bytes_per_update": results["bytes"] / results["updates"] if results["updates"] else 0.0,
+        "round_trip_p50_ms": float(np.percentile(round_trips, 50)) if len(round_trips) else 0.0,
+        "round_trip_p99_ms": float(np.percentile(round_trips, 99)) if len(round_trips) else 0.0,
+        "session_tick_p99_ms_max": max((s["tick_p99_ms"] for s in sessions), default=0.0),
+        "session_tick_p50_ms_median": float(np.median([s["tick_p50_ms"] for s in sessions])) if sessions else 0.0
+    }
+
+
+def raise_file_limit():
+    """
+    Thousands of sockets need more descriptors than the usual default of 1024.
+    """
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard if hard != resource.RLIM_INFINITY else 65536, hard))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host many game sessions, or load-test a server with simulated players.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--map", metavar="PATH", help="Play every session on a map file made by mapgen.py")
+    parser.add_argument("--seed", type=int, default=0, help="Session n plays the game of seed (seed, n)")
+    parser.add_argument("--stats-interval", type=float, default=5.0, help="Seconds between server reports (0: none)")
+    parser.add_argument("--simulate", type=int, metavar="CLIENTS", help="Run this many simulated players against --host/--port")
+    parser.add_argument("--duration", type=float, default=30.0, help="With --simulate: seconds each player plays")
+    parser.add_argument("--rate", type=float, default=2.0, help="With --simulate: actions per second per player")
+    parser.add_argument("--ramp", type=float, default=2.0, help="With --simulate: seconds over which players connect")
+    args = parser.parse_args(argv)
+
+    raise_file_limit()
+    if args.simulate:
+        summary = asyncio.run(simulate(args.simulate, args.host, args.port, args.duration, args.rate, args.ramp))
+        print(json.dumps(summary, indent=2))
+        return 1 if summary["errors"] else 0
+
+    server = GameServer(mapgen.load_map(args.map) if args.map else None, args.seed)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.stats_interval))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
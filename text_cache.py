@@ -0,0 +1,74 @@
+import pygame
+from collections import OrderedDict
+
+
+class TextRenderer:
+    """
+    Creates each font once and caches rendered text surfaces.
+
+    Surfaces are keyed by (font, text, color) and the least recently used
+    ones are evicted once max_entries is reached.
+    """
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+
+    def font(self, size, name=None):
+        """
+        Returns the font of the given size, loading it the first time only.
+        """
+        key = (name, size)
+        font = self.fonts.get(key)
+        if font is None:
+            font = pygame.font.Font(name, size)
+            self.fonts[key] = font
+        return font
+
+    def render(self, text, size, color, name=None):
+        """
+        Returns the rendered (antialiased) text, reusing a cached surface when possible.
+        """
+        key = ((name, size), text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            # Mark as most recently used
+            self.surfaces.move_to_end(key)
+            return surface
+
+        surface = self.font(size, name).render(text, True, color)
+        self.surfaces[key] = surface
+
+        # Evict the least recently used surfaces
+        while len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+
+class ValueText:
+    """
+    Text built from values that change often (HP, mana, ...).
+
+    It keeps only its latest surface and re-renders only when the values
+    change, so fast-changing numbers don't flood the TextRenderer cache.
+    """
+
+    def __init__(self, renderer, template, size, color, name=None):
+        self.renderer = renderer
+        self.template = template
+        self.size = size
+        self.color = color
+        self.name = name
+        self.values = None
+        self.surface = None
+
+    def render(self, *values):
+        """
+        Returns the template filled in with values, rendering it only if they changed.
+        """
+        if values != self.values:
+            font = self.renderer.font(self.size, self.name)
+            self.surface = font.render(self.template.format(*values), True, self.color)
+            self.values = values
+        return self.surface
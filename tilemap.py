@@ -0,0 +1,130 @@
+import pygame
+from collections import OrderedDict
+
+
+class Camera:
+    """
+    Viewport onto the world, in world pixel coordinates.
+    """
+
+    def __init__(self, view_width, view_height, world_width, world_height):
+        self.rect = pygame.Rect(0, 0, view_width, view_height)
+        self.world_width = world_width
+        self.world_height = world_height
+
+    def follow(self, x, y):
+        """
+        Centers the view on the world pixel (x, y), clamped to the world.
+        Returns True if the view moved.
+        """
+        left = min(max(x - self.rect.width // 2, 0), max(self.world_width - self.rect.width, 0))
+        top = min(max(y - self.rect.height // 2, 0), max(self.world_height - self.rect.height, 0))
+        if (left, top) == self.rect.topleft:
+            return False
+        self.rect.topleft = (left, top)
+        return True
+
+    def to_screen(self, rect):
+        """
+        Converts a world rect to screen coordinates.
+        """
+        return rect.move(-self.rect.x, -self.rect.y)
+
+
+class Tilemap:
+    """
+    Static map layers (ground plus walls) pre-baked into fixed-size chunks.
+
+    Each chunk is baked the first time it comes into view and then only
+    blitted, so the per-frame cost depends on how many chunks fit on the
+    screen, not on the size of the map. On very large maps the least
+    recently seen chunks are dropped once max_chunks are baked and re-baked
+    if they come back into view.
+    """
+
+    def __init__(self, grid_width, grid_height, cell_size, ground, walls, wall_surface,
+                 chunk_tiles=16, max_chunks=256):
+        self.cell_size = cell_size
+        self.chunk_size = chunk_tiles * cell_size
+        self.chunk_tiles = chunk_tiles
+        self.ground = ground
+        self.wall_surface = wall_surface
+        self.max_chunks = max_chunks
+        self.chunks = OrderedDict()
+
+        # The world covers the grid, or the ground image if that is larger (the default map)
+        self.width = max(grid_width * cell_size, ground.get_width())
+        self.height = max(grid_height * cell_size, ground.get_height())
+
+        # Walls bucketed by chunk, so baking a chunk doesn't scan every wall.
+        # A map's WallGrid answers region queries itself, so it isn't bucketed.
+        self.walls = walls
+        self.chunk_walls = None
+        if not hasattr(walls, "cells_in"):
+            self.chunk_walls = {}
+            for (wx, wy) in walls:
+                key = (wx // chunk_tiles, wy // chunk_tiles)
+                self.chunk_walls.setdefault(key, []).append((wx, wy))
+
+    def chunk(self, cx, cy):
+        """
+        Returns the baked surface of chunk (cx, cy), baking it if needed.
+        """
+        key = (cx, cy)
+        surface = self.chunks.get(key)
+        if surface is not None:
+            self.chunks.move_to_end(key)
+            return surface
+
+        surface = self.bake(cx, cy)
+        self.chunks[key] = surface
+        while len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+        return surface
+
+    def bake(self, cx, cy):
+        left = cx * self.chunk_size
+        top = cy * self.chunk_size
+        surface = pygame.Surface((self.chunk_size, self.chunk_size))
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert()
+
+        # Ground: the ground image, repeated across maps larger than it
+        ground_width, ground_height = self.ground.get_size()
+        gx = left - left % ground_width
+        while gx < left + self.chunk_size:
+            gy = top - top % ground_height
+            while gy < top + self.chunk_size:
+                surface.blit(self.ground, (gx - left, gy - top))
+                gy += ground_height
+            gx += ground_width
+
+        # Walls
+        if self.chunk_walls is None:
+            x0, y0 = cx * self.chunk_tiles, cy * self.chunk_tiles
+            walls = self.walls.cells_in(x0, y0, x0 + self.chunk_tiles, y0 + self.chunk_tiles)
+        else:
+            walls = self.chunk_walls.get((cx, cy), ())
+        for (wx, wy) in walls:
+            surface.blit(self.wall_surface, (wx * self.cell_size - left, wy * self.cell_size - top))
+        return surface
+
+    def draw(self, screen, camera, area=None):
+        """
+        Blits the chunks visible through the camera. If area (a screen rect)
+        is given, only that part of the screen is repainted.
+        """
+        view = camera.rect if area is None else camera.rect.clip(area.move(camera.rect.topleft))
+        if view.width <= 0 or view.height <= 0:
+            return
+
+        first_cx = view.left // self.chunk_size
+        first_cy = view.top // self.chunk_size
+        last_cx = min(view.right - 1, self.width - 1) // self.chunk_size
+        last_cy = min(view.bottom - 1, self.height - 1) // self.chunk_size
+        for cx in range(first_cx, last_cx + 1):
+            for cy in range(first_cy, last_cy + 1):
+                chunk_rect = pygame.Rect(cx * self.chunk_size, cy * self.chunk_size, self.chunk_size, self.chunk_size)
+                visible = chunk_rect.clip(view)
+                screen.blit(self.chunk(cx, cy), visible.move(-camera.rect.x, -camera.rect.y),
+                            visible.move(-chunk_rect.x, -chunk_rect.y))